@@ -0,0 +1,115 @@
+"""音声 API (音声→テキスト・テキスト→音声) のベンチマーク
+
+音声の長さ・テキストの長さ毎に DifyAudioUser で変換を繰り返し、同時実行数を段階的に増やしながら
+レイテンシ・実時間係数 (RTF)・最初の音声データまでの時間 (TTFA)・配信速度 (bytes/s) を記録する。
+テキスト→音声の応答は全体をバッファせず、受信しながら読み捨てる。
+
+CHATFLOW_API_KEY には音声の機能 (音声→テキスト・テキスト→音声) を有効にしたアプリを指定すること。
+
+使い方:
+    python -m benchmarks.audio_benchmark --levels 1,5,10 --durations 5,30,60 --text-lengths 50,500
+    python -m benchmarks.audio_benchmark --mock --audio-to-text-rtf 0.1 --text-to-audio-rtf 0.3
+"""
+
+import argparse
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()  # 実環境の API キーをダミー値より優先する
+
+from benchmarks.harness import MockProcess, bench_user  # noqa: E402
+
+import gevent  # noqa: E402
+from locust.env import Environment  # noqa: E402
+from locust.event import Events  # noqa: E402
+
+import locustfile  # noqa: E402
+from config import Config  # noqa: E402
+from utils.audio import AudioStats  # noqa: E402
+
+
+def run_level(host: str, users: int, duration: float) -> dict:
+    """指定した同時実行数で変換を繰り返し、エンドポイント (音声・テキストの長さ) 毎の結果を返す"""
+    user_class = bench_user(locustfile.DifyAudioUser, host)
+    env = Environment(user_classes=[user_class], events=Events())
+    audio = AudioStats(Config.AUDIO["bitrate"]).attach(env)
+    runner = env.create_local_runner()
+    runner.start(user_count=users, spawn_rate=users)
+    gevent.sleep(duration)
+    runner.quit()
+
+    results = {}
+    summary = audio.summary()
+    for entry in env.stats.entries.values():
+        if not entry.name.startswith("Audio ") or not entry.num_requests:
+            continue
+        results[entry.name] = {
+            "count": entry.num_requests,
+            "failures": entry.num_failures,
+            "p50": entry.get_response_time_percentile(0.5),
+            "p95": entry.get_response_time_percentile(0.95),
+            **{key: value for key, value in summary.get(entry.name, {}).items() if key != "requests"},
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure speech endpoints (latency, real-time factor, first byte)")
+    parser.add_argument("--levels", default="1,5,10", help="comma separated concurrent users")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per level")
+    parser.add_argument("--durations", default=",".join(f"{value:g}" for value in Config.AUDIO["durations"]))
+    parser.add_argument("--text-lengths", default=",".join(str(value) for value in Config.AUDIO["text_lengths"]))
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--mock", action="store_true", help="run against a local mock server")
+    parser.add_argument("--audio-to-text-rtf", type=float, default=0.1, help="mock transcription time per audio second")
+    parser.add_argument("--text-to-audio-rtf", type=float, default=0.3, help="mock synthesis time per audio second")
+    parser.add_argument("--first-byte-ms", type=float, default=200, help="mock delay before the first audio byte")
+    parser.add_argument("--output", default="benchmarks/results/audio.json")
+    args = parser.parse_args()
+
+    levels = [int(value) for value in args.levels.split(",")]
+    Config.AUDIO["durations"] = [float(value) for value in args.durations.split(",") if value]
+    Config.AUDIO["text_lengths"] = [int(value) for value in args.text_lengths.split(",") if value]
+
+    def run_all(host: str) -> dict:
+        results = {}
+        for users in levels:
+            results[users] = run_level(host, users, args.duration)
+            for name, row in sorted(results[users].items()):
+                first_byte = f" ttfa={row['first_byte']['p50']:.0f}ms" if "first_byte" in row else ""
+                throughput = f" {row['bytes_per_second']['p50'] / 1024:.1f}KB/s" if "bytes_per_second" in row else ""
+                rtf = f" rtf={row['rtf']['p50']:.2f}" if "rtf" in row else ""
+                print(
+                    f"users={users:<4d} {name:34s} n={row['count']:<5d} fail={row['failures']:<4d} "
+                    f"p50={row['p50']:.0f}ms p95={row['p95']:.0f}ms{rtf}{first_byte}{throughput}"
+                )
+        return results
+
+    if args.mock:
+        with MockProcess(
+            audio_to_text_rtf=args.audio_to_text_rtf,
+            text_to_audio_rtf=args.text_to_audio_rtf,
+            text_to_audio_first_byte_ms=args.first_byte_ms,
+        ) as mock:
+            results = run_all(mock.url)
+    else:
+        results = run_all(args.host)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "levels": levels,
+                "durations": Config.AUDIO["durations"],
+                "text_lengths": Config.AUDIO["text_lengths"],
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+
+if __name__ == "__main__":
+    main()
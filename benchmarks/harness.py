@@ -0,0 +1,146 @@
+"""ベンチマーク共通処理
+
+モックサーバーをサブプロセスで起動し、locust のローカルランナーで負荷生成側の性能を計測する。
+計測は負荷生成プロセス自身の CPU 時間を基準とし、1 コアあたりの RPS を算出する。
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# config.py は必須の環境変数を読み込むため、未設定の場合はダミー値を入れておく
+for _key in [
+    "CHATFLOW_API_KEY",
+    "WORKFLOW_API_KEY",
+    "KNOWLEDGE_API_KEY",
+    "SANDBOX_API_KEY",
+    "CHATFLOW_SANDBOX_API_KEY",
+]:
+    os.environ.setdefault(_key, "mock-key")
+os.environ.setdefault("API_HOST", "http://127.0.0.1:8800/v1")
+os.environ.setdefault("SANDBOX_HOST", "http://127.0.0.1:8800/v1")
+
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import gevent  # noqa: E402
+import psutil  # noqa: E402
+from locust import constant  # noqa: E402
+from locust.env import Environment  # noqa: E402
+from locust.event import Events  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockProcess:
+    """モックサーバーをサブプロセスとして起動・制御する"""
+
+    def __init__(self, port: Optional[int] = None, **config):
+        self.port = port or _free_port()
+        self.config = config
+        self.process = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __enter__(self):
+        args = [sys.executable, os.path.join(ROOT_DIR, "mock_server.py"), "--port", str(self.port)]
+        for key, value in self.config.items():
+            args += [f"--{key.replace('_', '-')}", str(value)]
+        self.process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                self.stats()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError("mock server did not start")
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.process:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+    def _call(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{self.port}{path}",
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+
+    def stats(self) -> dict:
+        return self._call("GET", "/_mock/stats")
+
+    def configure(self, **config) -> dict:
+        return self._call("POST", "/_mock/config", config)
+
+    def reset(self) -> dict:
+        return self._call("POST", "/_mock/reset", {})
+
+
+def bench_user(user_class, host: str, **attrs):
+    """待ち時間無し・モック向けのユーザークラスを派生させる"""
+    return type(f"Bench{user_class.__name__}", (user_class,), {"host": host, "wait_time": constant(0), **attrs})
+
+
+def measure(user_class, users: int, duration: float, warmup: float = 2.0) -> Dict[str, float]:
+    """指定ユーザー数での RPS と CPU 時間を計測"""
+    env = Environment(user_classes=[user_class], events=Events())
+    runner = env.create_local_runner()
+    process = psutil.Process()
+
+    runner.start(user_count=users, spawn_rate=users)
+    gevent.sleep(warmup)
+    env.stats.reset_all()
+
+    cpu_start = sum(process.cpu_times()[:2])
+    wall_start = time.time()
+    gevent.sleep(duration)
+    cpu_seconds = sum(process.cpu_times()[:2]) - cpu_start
+    wall_seconds = time.time() - wall_start
+
+    total = env.stats.total
+    result = {
+        "users": users,
+        "requests": total.num_requests,
+        "failures": total.num_failures,
+        "rps": total.num_requests / wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "cpu_utilization": cpu_seconds / wall_seconds,
+        "rps_per_core": total.num_requests / cpu_seconds if cpu_seconds else 0.0,
+        "p50": total.get_response_time_percentile(0.5),
+        "p95": total.get_response_time_percentile(0.95),
+    }
+    runner.quit()
+    return result
+
+
+def compare_with_baseline(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> list:
+    """ベースラインより tolerance 以上悪化した指標を返す (値は大きいほど良い前提)"""
+    regressions = []
+    for key, base_value in baseline.items():
+        value = results.get(key)
+        if value is None or not base_value:
+            continue
+        if value < base_value * (1 - tolerance):
+            regressions.append({"metric": key, "baseline": base_value, "current": value})
+    return regressions
@@ -0,0 +1,155 @@
+"""負荷生成側 (ハーネス) のベンチマーク
+
+モックサーバーに対して各ユーザークラスを待ち時間無しで実行し、
+1 ワーカーコアあたりの最大 RPS と最大同時ストリーム数を記録する。
+ベースラインの JSON を指定すると、悪化した指標があれば終了コード 1 を返す。
+
+使い方:
+    python -m benchmarks.harness_benchmark --output benchmarks/results/harness.json
+    python -m benchmarks.harness_benchmark --baseline benchmarks/results/harness.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.harness import ROOT_DIR, MockProcess, bench_user, compare_with_baseline, measure
+
+import gevent  # noqa: E402
+import psutil  # noqa: E402
+from locust import task  # noqa: E402
+from locust.env import Environment  # noqa: E402
+from locust.event import Events  # noqa: E402
+
+import locustfile  # noqa: E402
+from config import Config  # noqa: E402
+from tasks.api_tasks import APITasks  # noqa: E402
+from tasks.chat_tasks import ChatTasks  # noqa: E402
+
+USER_CLASSES = {
+    "chatflow": locustfile.DifyChatUser,
+    "workflow": locustfile.DifyWorkflowUser,
+    "file": locustfile.DifyFileUser,
+    "knowledge": locustfile.DifyKnowledgeUser,
+    "sandbox": locustfile.DifySandboxUser,
+    # YAML シナリオ版 (chatflow と比較してステップ解釈のオーバーヘッドを確認する)
+    "scenario_chatflow": locustfile.scenario_user_classes(os.path.join(ROOT_DIR, "scenarios", "chatflow.yml"))[0],
+}
+
+
+class StreamHoldUser(locustfile.BaseUser):
+    """ストリーミング応答だけを受信し続けるユーザー"""
+
+    abstract = True
+
+    def on_start(self):
+        self.api = APITasks(self)
+        self.chat = ChatTasks(self, Config.CHATFLOW_API_KEY)
+
+    @task(1)
+    def stream_operations(self):
+        self.chat.send_chat_message_streaming()
+
+
+def benchmark_throughput(mock: MockProcess, classes, user_counts, duration: float) -> dict:
+    """ユーザークラス毎に最大 RPS と 1 コアあたり RPS を計測"""
+    results = {}
+    for name in classes:
+        runs = []
+        for users in user_counts:
+            mock.reset()
+            runs.append(measure(bench_user(USER_CLASSES[name], mock.url), users, duration))
+        best = max(runs, key=lambda run: run["rps"])
+        results[name] = {"max_rps": best["rps"], "rps_per_core": max(run["rps_per_core"] for run in runs), "runs": runs}
+        print(f"{name:10s} max_rps={best['rps']:.1f} rps_per_core={results[name]['rps_per_core']:.1f}")
+    return results
+
+
+def benchmark_streams(mock: MockProcess, stream_counts, hold_seconds: float) -> dict:
+    """長時間ストリームを保持できる最大同時数を計測"""
+    # 立ち上げと計測の間に 1 ストリームが途切れないよう、十分長いストリームにする
+    mock.configure(token_count=int((hold_seconds + 60) * 10), token_interval_ms=100)
+    process = psutil.Process()
+    runs = []
+    max_streams = 0
+    for count in stream_counts:
+        mock.reset()
+        env = Environment(user_classes=[bench_user(StreamHoldUser, mock.url)], events=Events())
+        runner = env.create_local_runner()
+        runner.start(user_count=count, spawn_rate=count / 2.0)
+        deadline = time.time() + 30
+        while mock.stats()["active_streams"] < count and time.time() < deadline:
+            gevent.sleep(0.5)
+        gevent.sleep(hold_seconds)
+        process.cpu_percent()
+        gevent.sleep(1)
+        cpu_percent = process.cpu_percent()
+        active = mock.stats()["active_streams"]
+        runner.quit()
+        # 次の計測に前回のストリームが残らないよう、サーバー側で閉じられるのを待つ
+        deadline = time.time() + 10
+        while mock.stats()["active_streams"] > 0 and time.time() < deadline:
+            gevent.sleep(0.5)
+
+        held = active >= count * 0.95 and cpu_percent < 90
+        runs.append({"target": count, "active_streams": active, "cpu_percent": cpu_percent, "held": held})
+        print(f"streams    target={count} active={active} cpu={cpu_percent:.0f}% held={held}")
+        if not held:
+            break
+        max_streams = count
+    mock.configure(token_count=20, token_interval_ms=0)
+    return {"max_concurrent_streams": max_streams, "runs": runs}
+
+
+def _flatten(results: dict) -> dict:
+    """ベースライン比較用の指標 (大きいほど良い値のみ)"""
+    flat = {}
+    for name, result in results["throughput"].items():
+        flat[f"{name}.rps_per_core"] = result["rps_per_core"]
+        flat[f"{name}.max_rps"] = result["max_rps"]
+    if "streams" in results:
+        flat["max_concurrent_streams"] = results["streams"]["max_concurrent_streams"]
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the load generator against the local mock server")
+    parser.add_argument("--classes", default=",".join(USER_CLASSES), help="comma separated user classes")
+    parser.add_argument("--users", default="10,50,100", help="comma separated user counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per measurement")
+    parser.add_argument("--streams", default="100,500,1000,2000", help="comma separated stream counts")
+    parser.add_argument("--hold-seconds", type=float, default=5.0)
+    parser.add_argument("--skip-streams", action="store_true")
+    parser.add_argument("--output", default="benchmarks/results/harness.json")
+    parser.add_argument("--baseline", help="baseline JSON produced by a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args()
+
+    results = {}
+    with MockProcess() as mock:
+        results["throughput"] = benchmark_throughput(
+            mock, args.classes.split(","), [int(n) for n in args.users.split(",")], args.duration
+        )
+        if not args.skip_streams:
+            results["streams"] = benchmark_streams(mock, [int(n) for n in args.streams.split(",")], args.hold_seconds)
+    results["metrics"] = _flatten(results)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare_with_baseline(results["metrics"], baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']:.1f} -> {regression['current']:.1f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""HTTP クライアント比較ベンチマーク
+
+HTTP_CLIENT=requests / fasthttp それぞれでハーネスベンチマークを別プロセスとして実行し、
+1 コアあたりの RPS の差を表示する。
+
+使い方:
+    python -m benchmarks.http_client_benchmark --users 50,100 --duration 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.harness import ROOT_DIR
+
+CLIENT_TYPES = ["requests", "fasthttp"]
+
+
+def run_harness(client_type: str, args) -> dict:
+    """指定クライアントでハーネスベンチマークを実行し、結果を返す"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output = os.path.join(tmpdir, f"{client_type}.json")
+        env = {**os.environ, "HTTP_CLIENT": client_type}
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.harness_benchmark",
+            "--classes",
+            args.classes,
+            "--users",
+            args.users,
+            "--duration",
+            str(args.duration),
+            "--streams",
+            args.streams,
+            "--output",
+            output,
+        ]
+        if args.skip_streams:
+            command.append("--skip-streams")
+        subprocess.run(command, cwd=ROOT_DIR, env=env, check=True)
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare requests/sec per core between HTTP client implementations")
+    parser.add_argument("--classes", default="chatflow,workflow,file,knowledge,sandbox")
+    parser.add_argument("--users", default="10,50,100")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--streams", default="100,500,1000,2000")
+    parser.add_argument("--skip-streams", action="store_true")
+    parser.add_argument("--output", default="benchmarks/results/http_client.json")
+    args = parser.parse_args()
+
+    results = {client_type: run_harness(client_type, args) for client_type in CLIENT_TYPES}
+
+    print(f"{'metric':32s} {'requests':>10s} {'fasthttp':>10s} {'gain':>8s}")
+    for metric, base in results["requests"]["metrics"].items():
+        fast = results["fasthttp"]["metrics"].get(metric, 0)
+        gain = fast / base if base else 0
+        print(f"{metric:32s} {base:10.1f} {fast:10.1f} {gain:7.2f}x")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
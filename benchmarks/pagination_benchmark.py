@@ -0,0 +1,260 @@
+"""一覧 API の深いページングのベンチマーク
+
+メッセージ・会話・ドキュメント・ワークフロー実行を大量に作成した後、
+/messages (first_id), /conversations (last_id), /datasets/:id/documents (page), /workflows/logs (page) を
+最後のページまで順に辿り、ページの深さ毎のレイテンシを記録する。
+
+作成したデータは結果 JSON の "seed" に保存されるため、--seed-file で再利用できる (作成済みの種類は再作成しない)。
+
+使い方:
+    python -m benchmarks.pagination_benchmark --messages 2000 --conversations 2000 --documents 2000 --workflow-runs 2000
+    python -m benchmarks.pagination_benchmark --seed-file benchmarks/results/pagination.json --walks 5
+    python -m benchmarks.pagination_benchmark --mock --messages 5000
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()  # 実環境の API キーをダミー値より優先する
+
+from benchmarks.harness import MockProcess  # noqa: E402
+
+import numpy as np  # noqa: E402
+import requests  # noqa: E402
+from gevent.pool import Pool  # noqa: E402
+
+from config import Config  # noqa: E402
+
+ENDPOINTS = ["messages", "conversations", "documents", "workflow_logs"]
+
+
+def _headers(api_key: str) -> dict:
+    return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+
+def depth_bucket(page: int) -> str:
+    """ページ番号 (1 始まり) を 2 の累乗毎の区間に分ける (1, 2, 3-4, 5-8, ...)"""
+    if page <= 2:
+        return str(page)
+    upper = 1 << (page - 1).bit_length()
+    return f"{upper // 2 + 1}-{upper}"
+
+
+class Seeder:
+    """ベンチマーク用のデータを並列に作成する"""
+
+    def __init__(self, session: requests.Session, host: str, concurrency: int):
+        self.session = session
+        self.host = host
+        self.concurrency = concurrency
+
+    def _post(self, path: str, api_key: str, payload: dict) -> dict:
+        response = self.session.post(f"{self.host}{path}", json=payload, headers=_headers(api_key), timeout=300)
+        response.raise_for_status()
+        return response.json()
+
+    def _repeat(self, label: str, count: int, func: Callable[[int], None]):
+        started = time.time()
+        pool = Pool(self.concurrency)
+        for index in range(count):
+            pool.spawn(func, index)
+        pool.join(raise_error=True)
+        print(f"seeded {count} {label} in {time.time() - started:.1f}s")
+
+    def _message(self, user: str, conversation_id: Optional[str], query: str) -> dict:
+        payload = {
+            "inputs": {},
+            "query": query,
+            "response_mode": "blocking",
+            "conversation_id": conversation_id,
+            "user": user,
+            "files": [],
+        }
+        return self._post("/chat-messages", Config.CHATFLOW_API_KEY, payload)
+
+    def messages(self, user: str, count: int) -> str:
+        """1つの会話に count 件のメッセージを作成し、会話 ID を返す"""
+        conversation_id = self._message(user, None, "Pagination seed 0")["conversation_id"]
+        # 同じ会話へのメッセージは順に処理されるため、並列度は上げない
+        for index in range(1, count):
+            self._message(user, conversation_id, f"Pagination seed {index}")
+        print(f"seeded {count} messages in conversation {conversation_id}")
+        return conversation_id
+
+    def conversations(self, user: str, count: int):
+        self._repeat("conversations", count, lambda index: self._message(user, None, f"Conversation seed {index}"))
+
+    def documents(self, count: int) -> str:
+        """ナレッジベースを作成して count 件のドキュメントを追加し、ナレッジベース ID を返す"""
+        dataset = {"name": f"pagination-{uuid.uuid4()}", "indexing_technique": "economy", "permission": "only_me"}
+        dataset_id = self._post("/datasets", Config.KNOWLEDGE_API_KEY, dataset)["id"]
+
+        def create(index: int):
+            payload = {
+                "name": f"pagination_{index}.txt",
+                "text": f"Pagination benchmark document {index}.",
+                "indexing_technique": "economy",
+                "process_rule": {"mode": "automatic"},
+            }
+            self._post(f"/datasets/{dataset_id}/document/create-by-text", Config.KNOWLEDGE_API_KEY, payload)
+
+        self._repeat("documents", count, create)
+        return dataset_id
+
+    def workflow_runs(self, user: str, count: int):
+        payload = {"inputs": {"query": "Pagination seed"}, "response_mode": "blocking", "user": user}
+        self._repeat(
+            "workflow runs", count, lambda index: self._post("/workflows/run", Config.WORKFLOW_API_KEY, payload)
+        )
+
+
+class Walker:
+    """一覧 API を最後のページまで辿り、ページ毎のレイテンシ (ms) を記録する"""
+
+    def __init__(self, session: requests.Session, host: str, limit: int, max_pages: int):
+        self.session = session
+        self.host = host
+        self.limit = limit
+        self.max_pages = max_pages
+
+    def _get(self, path: str, api_key: str, params: dict) -> Tuple[float, dict]:
+        started = time.perf_counter()
+        response = self.session.get(f"{self.host}{path}", params=params, headers=_headers(api_key), timeout=300)
+        elapsed = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+        return elapsed, response.json()
+
+    def _walk(self, fetch: Callable[[int, Optional[str]], tuple], next_cursor: Callable[[dict], Optional[str]]):
+        latencies = []
+        cursor = None
+        for page in range(1, self.max_pages + 1):
+            elapsed, data = fetch(page, cursor)
+            latencies.append(elapsed)
+            cursor = next_cursor(data)
+            if not data.get("has_more") or not data.get("data"):
+                break
+        return latencies
+
+    def messages(self, user: str, conversation_id: str) -> List[float]:
+        # first_id より古いメッセージを返すため、各ページの先頭 (最も古い) メッセージを次のカーソルにする
+        def fetch(page, cursor):
+            params = {"user": user, "conversation_id": conversation_id, "first_id": cursor, "limit": self.limit}
+            return self._get("/messages", Config.CHATFLOW_API_KEY, params)
+
+        return self._walk(fetch, lambda data: data["data"][0]["id"] if data.get("data") else None)
+
+    def conversations(self, user: str) -> List[float]:
+        def fetch(page, cursor):
+            params = {"user": user, "last_id": cursor, "limit": self.limit}
+            return self._get("/conversations", Config.CHATFLOW_API_KEY, params)
+
+        return self._walk(fetch, lambda data: data["data"][-1]["id"] if data.get("data") else None)
+
+    def documents(self, dataset_id: str) -> List[float]:
+        def fetch(page, cursor):
+            params = {"page": page, "limit": self.limit, "keyword": ""}
+            return self._get(f"/datasets/{dataset_id}/documents", Config.KNOWLEDGE_API_KEY, params)
+
+        return self._walk(fetch, lambda data: None)
+
+    def workflow_logs(self) -> List[float]:
+        def fetch(page, cursor):
+            params = {"page": page, "limit": self.limit, "keyword": ""}
+            return self._get("/workflows/logs", Config.WORKFLOW_API_KEY, params)
+
+        return self._walk(fetch, lambda data: None)
+
+
+def summarize(walks: List[List[float]]) -> Dict[str, dict]:
+    """ページの深さの区間毎に p50 / p95 / 件数を集計"""
+    buckets: Dict[str, List[float]] = {}
+    for latencies in walks:
+        for page, latency in enumerate(latencies, start=1):
+            buckets.setdefault(depth_bucket(page), []).append(latency)
+    return {
+        bucket: {
+            "count": len(values),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+        }
+        for bucket, values in buckets.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure list endpoint latency by pagination depth")
+    parser.add_argument("--messages", type=int, default=2000, help="messages in one conversation")
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--workflow-runs", type=int, default=2000)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma separated endpoints to walk")
+    parser.add_argument("--concurrency", type=int, default=10, help="parallel requests while seeding")
+    parser.add_argument("--limit", type=int, default=20, help="page size")
+    parser.add_argument("--max-pages", type=int, default=1000)
+    parser.add_argument("--walks", type=int, default=3, help="walks per endpoint")
+    parser.add_argument("--seed-file", help="reuse the seed of a previous result JSON")
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--mock", action="store_true", help="run against a local mock server")
+    parser.add_argument("--output", default="benchmarks/results/pagination.json")
+    args = parser.parse_args()
+
+    endpoints = args.endpoints.split(",")
+    seed = {}
+    if args.seed_file:
+        with open(args.seed_file, encoding="utf-8") as f:
+            seed = json.load(f)["seed"]
+
+    def run(host: str) -> dict:
+        session = requests.Session()
+        seeder = Seeder(session, host, args.concurrency)
+        walker = Walker(session, host, args.limit, args.max_pages)
+        user = seed.setdefault("user", f"pagination-{uuid.uuid4()}")
+
+        walks = {}
+        if "messages" in endpoints:
+            if "conversation_id" not in seed:
+                seed["conversation_id"] = seeder.messages(user, args.messages)
+            walks["messages"] = lambda: walker.messages(user, seed["conversation_id"])
+        if "conversations" in endpoints:
+            if not seed.get("conversations"):
+                seeder.conversations(user, args.conversations)
+                seed["conversations"] = args.conversations
+            walks["conversations"] = lambda: walker.conversations(user)
+        if "documents" in endpoints:
+            if "dataset_id" not in seed:
+                seed["dataset_id"] = seeder.documents(args.documents)
+            walks["documents"] = lambda: walker.documents(seed["dataset_id"])
+        if "workflow_logs" in endpoints:
+            if not seed.get("workflow_runs"):
+                seeder.workflow_runs(user, args.workflow_runs)
+                seed["workflow_runs"] = args.workflow_runs
+            walks["workflow_logs"] = walker.workflow_logs
+
+        results = {}
+        for name, walk in walks.items():
+            results[name] = summarize([walk() for _ in range(args.walks)])
+            print(f"\n{name} (limit={args.limit})")
+            print(f"{'pages':>10s} {'count':>7s} {'p50 (ms)':>10s} {'p95 (ms)':>10s}")
+            for bucket, row in results[name].items():
+                print(f"{bucket:>10s} {row['count']:7d} {row['p50']:10.1f} {row['p95']:10.1f}")
+        return results
+
+    if args.mock:
+        with MockProcess(token_interval_ms=0, latency_ms=0) as mock:
+            results = run(mock.url)
+    else:
+        results = run(args.host)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"limit": args.limit, "seed": seed, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
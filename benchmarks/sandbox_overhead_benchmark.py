@@ -0,0 +1,158 @@
+"""チャットフロー経由の Sandbox と Sandbox 直接呼び出しの比較 (オーバーヘッドの分解)
+
+同時実行数毎に、チャットフローのコードノードと同じコードを /sandbox/run へ直接送る段階と、
+コードノードを含むチャットフロー (locust-chatflow-sandbox.yml) を実行する段階を順に行い、
+チャットフローの応答時間を次の要素に分解して記録する。
+    direct sandbox      /sandbox/run を直接呼び出した時間
+    chatflow total      チャットフローの応答時間 (ストリームの終了まで)
+    api overhead        total - ワークフローの実行時間 (API の受付・SSE の配信など)
+    orchestration       ワークフローの実行時間 - コードノードの実行時間 (ノードの実行制御)
+    code node           コードノードの実行時間
+    code node - direct  コードノードと直接呼び出しの差 (Dify から Sandbox への呼び出しのオーバーヘッド)
+ワークフローとノードの実行時間はストリーミングのイベント (workflow_finished / node_finished) の elapsed_time を使う。
+
+使い方:
+    python -m benchmarks.sandbox_overhead_benchmark --levels 1,5,10 --duration 60
+    python -m benchmarks.sandbox_overhead_benchmark --mock --sandbox-latency-ms 50 --node-overhead-ms 20
+"""
+
+import argparse
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()  # 実環境の API キーをダミー値より優先する
+
+from benchmarks.harness import MockProcess, bench_user  # noqa: E402
+
+import gevent  # noqa: E402
+from locust import task  # noqa: E402
+from locust.env import Environment  # noqa: E402
+from locust.event import Events  # noqa: E402
+
+import locustfile  # noqa: E402
+from config import Config  # noqa: E402
+from tasks.api_tasks import APITasks  # noqa: E402
+from tasks.chatflow_sandbox_tasks import ChatflowSandboxTasks  # noqa: E402
+from tasks.sandbox_tasks import CHATFLOW_SANDBOX_DSL, SandboxTasks, code_node_payload  # noqa: E402
+
+DIRECT_NAME = "Sandbox /sandbox/run_code_node"
+# OVERHEAD イベント名 -> 結果の要素名
+COMPONENTS = {
+    "chatflow total": "chatflow total",
+    "chatflow api overhead": "api overhead",
+    "chatflow orchestration": "orchestration",
+    "chatflow code node": "code node",
+}
+
+
+class DirectSandboxUser(locustfile.BaseUser):
+    """コードノードと同じコードを /sandbox/run で直接実行するユーザー"""
+
+    abstract = True
+    payload = None
+
+    def on_start(self):
+        self.sandbox = SandboxTasks(self, Config.SANDBOX_API_KEY)
+
+    @task(1)
+    def sandbox_operations(self):
+        self.sandbox.execute_payload(self.payload, "code_node")
+
+
+class TracedChatflowUser(locustfile.BaseUser):
+    """コードノードを含むチャットフローを実行し、応答時間を分解するユーザー"""
+
+    abstract = True
+
+    def on_start(self):
+        self.api = APITasks(self)
+        self.chatflow = ChatflowSandboxTasks(self, Config.CHATFLOW_SANDBOX_API_KEY)
+
+    @task(1)
+    def chat_operations(self):
+        self.chatflow.send_traced_message()
+
+
+def run_phase(user_class, users: int, duration: float) -> dict:
+    """指定した同時実行数でユーザーを実行し、リクエスト名毎の件数・失敗数・p50 / p95 を返す"""
+    env = Environment(user_classes=[user_class], events=Events())
+    runner = env.create_local_runner()
+    runner.start(user_count=users, spawn_rate=users)
+    gevent.sleep(duration)
+    runner.quit()
+    return {
+        entry.name: {
+            "count": entry.num_requests,
+            "failures": entry.num_failures,
+            "p50": entry.get_response_time_percentile(0.5),
+            "p95": entry.get_response_time_percentile(0.95),
+        }
+        for entry in env.stats.entries.values()
+        if entry.num_requests
+    }
+
+
+def run_level(api_host: str, sandbox_host: str, payload: dict, users: int, duration: float) -> dict:
+    """直接呼び出し → チャットフローの順に実行し、要素毎の p50 / p95 を返す"""
+    direct = run_phase(bench_user(DirectSandboxUser, sandbox_host, payload=payload), users, duration)
+    chatflow = run_phase(bench_user(TracedChatflowUser, api_host), users, duration)
+
+    result = {"direct sandbox": direct.get(DIRECT_NAME)}
+    for event_name, name in COMPONENTS.items():
+        result[name] = chatflow.get(event_name)
+    code_node, direct_row = result.get("code node"), result["direct sandbox"]
+    if code_node and direct_row:
+        result["code node - direct"] = {
+            "p50": code_node["p50"] - direct_row["p50"],
+            "p95": code_node["p95"] - direct_row["p95"],
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decompose chatflow code node latency against direct sandbox calls")
+    parser.add_argument("--levels", default="1,5,10", help="comma separated concurrent users")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per phase (direct and chatflow)")
+    parser.add_argument("--dsl", default=CHATFLOW_SANDBOX_DSL, help="chatflow DSL whose code node is run directly")
+    parser.add_argument("--api-host", default=Config.API_HOST)
+    parser.add_argument("--sandbox-host", default=Config.SANDBOX_HOST)
+    parser.add_argument("--mock", action="store_true", help="run against a local mock server")
+    parser.add_argument("--sandbox-latency-ms", type=float, default=50, help="mock sandbox execution time")
+    parser.add_argument("--node-overhead-ms", type=float, default=20, help="mock orchestration time per node")
+    parser.add_argument("--output", default="benchmarks/results/sandbox_overhead.json")
+    args = parser.parse_args()
+
+    levels = [int(value) for value in args.levels.split(",")]
+    payload = code_node_payload(args.dsl)
+
+    def run_all(api_host: str, sandbox_host: str) -> dict:
+        results = {}
+        for users in levels:
+            results[users] = run_level(api_host, sandbox_host, payload, users, args.duration)
+            for name, row in results[users].items():
+                if row is None:
+                    print(f"users={users:<4d} {name:20s} no data")
+                    continue
+                count = f"n={row['count']:<5d} fail={row['failures']:<4d} " if "count" in row else ""
+                print(f"users={users:<4d} {name:20s} {count}p50={row['p50']:.0f}ms p95={row['p95']:.0f}ms")
+        return results
+
+    if args.mock:
+        with MockProcess(
+            node_events=True,
+            sandbox_latency_ms=args.sandbox_latency_ms,
+            node_overhead_ms=args.node_overhead_ms,
+        ) as mock:
+            results = run_all(mock.url, mock.url)
+    else:
+        results = run_all(args.api_host, args.sandbox_host)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"levels": levels, "dsl": args.dsl, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""仮想ユーザー1人あたりのメモリと、1 ワーカープロセスで保持できる同時ストリーム数のベンチマーク
+
+モックサーバーのストリーミング応答を長い間隔でトークンを送るアイドル状態にし、
+StreamHoldUser を段階的に増やしながら、接続中のストリーム数・負荷生成プロセスの RSS・CPU 使用率を記録する。
+1人あたりのメモリは (RSS - ユーザー起動前の RSS) / 接続中のストリーム数 とする。
+全員が接続し、CPU 使用率と RSS が上限以内だった最大のユーザー数を最大同時ストリーム数とする。
+
+使い方:
+    python -m benchmarks.user_memory_benchmark --streams 1000,5000,10000,20000
+    HTTP_CLIENT=fasthttp python -m benchmarks.user_memory_benchmark --memory-limit 4096 --output benchmarks/results/user_memory_fasthttp.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import resource
+import time
+
+from benchmarks.harness import MockProcess, bench_user
+
+import gevent  # noqa: E402
+import psutil  # noqa: E402
+from locust.env import Environment  # noqa: E402
+from locust.event import Events  # noqa: E402
+
+from benchmarks.harness_benchmark import StreamHoldUser  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def raise_file_limit() -> int:
+    """同時接続数が上限にならないよう、ファイルディスクリプタの上限を引き上げる (モックのプロセスにも継承される)"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        target = hard if hard != resource.RLIM_INFINITY else 1048576
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return soft
+
+
+def wait_for_streams(mock: MockProcess, count: int, timeout: float) -> int:
+    deadline = time.time() + timeout
+    active = mock.stats()["active_streams"]
+    while active < count and time.time() < deadline:
+        gevent.sleep(0.5)
+        active = mock.stats()["active_streams"]
+    return active
+
+
+def benchmark_memory(
+    mock: MockProcess,
+    stream_counts,
+    spawn_rate: float,
+    hold_seconds: float,
+    token_interval: float,
+    cpu_limit: float,
+    memory_limit: float,
+) -> dict:
+    """ユーザーを段階的に増やし、各段階の RSS と接続中のストリーム数を記録"""
+    # 計測中にストリームが終わらないよう、十分長くアイドルに近いストリームにする
+    total_seconds = sum(stream_counts) / spawn_rate + (hold_seconds + 30) * len(stream_counts)
+    mock.configure(token_count=int(total_seconds / token_interval) + 10, token_interval_ms=token_interval * 1000)
+    mock.reset()
+
+    process = psutil.Process()
+    env = Environment(user_classes=[bench_user(StreamHoldUser, mock.url)], events=Events())
+    runner = env.create_local_runner()
+    gc.collect()
+    baseline_rss = process.memory_info().rss
+
+    runs = []
+    max_streams = 0
+    for count in stream_counts:
+        runner.start(user_count=count, spawn_rate=spawn_rate)
+        active = wait_for_streams(mock, count, timeout=count / spawn_rate + 60)
+        gevent.sleep(hold_seconds)
+        process.cpu_percent()
+        gevent.sleep(1)
+        cpu_percent = process.cpu_percent()
+        active = mock.stats()["active_streams"]
+        rss = process.memory_info().rss
+        bytes_per_user = (rss - baseline_rss) / active if active else 0.0
+
+        held = active >= count * 0.95 and cpu_percent < cpu_limit and (not memory_limit or rss < memory_limit)
+        runs.append(
+            {
+                "target": count,
+                "active_streams": active,
+                "rss_mb": rss / 2**20,
+                "bytes_per_user": bytes_per_user,
+                "cpu_percent": cpu_percent,
+                "held": held,
+            }
+        )
+        print(
+            f"streams target={count} active={active} rss={rss / 2**20:.0f}MB "
+            f"per_user={bytes_per_user / 1024:.1f}KB cpu={cpu_percent:.0f}% held={held}"
+        )
+        if not held:
+            break
+        max_streams = count
+
+    runner.quit()
+    mock.configure(token_count=20, token_interval_ms=0)
+    held_runs = [run for run in runs if run["held"]]
+    result = {
+        "http_client": Config.HTTP_CLIENT,
+        "baseline_rss_mb": baseline_rss / 2**20,
+        "max_concurrent_streams": max_streams,
+        "bytes_per_user": held_runs[-1]["bytes_per_user"] if held_runs else None,
+        "runs": runs,
+    }
+    # メモリの上限を指定した場合、1人あたりのメモリから上限までに保持できるユーザー数を見積もる
+    if memory_limit and result["bytes_per_user"]:
+        result["estimated_streams_at_memory_limit"] = int((memory_limit - baseline_rss) / result["bytes_per_user"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per virtual user and concurrent streams per process")
+    parser.add_argument("--streams", default="1000,2000,5000,10000", help="comma separated user counts (ascending)")
+    parser.add_argument("--spawn-rate", type=float, default=500)
+    parser.add_argument("--hold-seconds", type=float, default=5.0, help="seconds to hold each level before measuring")
+    parser.add_argument("--token-interval", type=float, default=5.0, help="seconds between tokens of an idle stream")
+    parser.add_argument("--cpu-limit", type=float, default=90, help="CPU percent above which a level is not held")
+    parser.add_argument("--memory-limit", type=float, default=0, help="RSS limit in MB (0: no limit)")
+    parser.add_argument("--output", default="benchmarks/results/user_memory.json")
+    args = parser.parse_args()
+
+    file_limit = raise_file_limit()
+    counts = [int(n) for n in args.streams.split(",")]
+    if counts[-1] * 2 > file_limit:
+        print(f"warning: open file limit {file_limit} may cap the number of streams")
+
+    with MockProcess() as mock:
+        result = benchmark_memory(
+            mock,
+            counts,
+            args.spawn_rate,
+            args.hold_seconds,
+            args.token_interval,
+            args.cpu_limit,
+            args.memory_limit * 2**20,
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    per_user = f"{result['bytes_per_user'] / 1024:.1f}KB" if result["bytes_per_user"] else "-"
+    print(f"max_concurrent_streams={result['max_concurrent_streams']} bytes_per_user={per_user}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""ワークフロー停止レイテンシのベンチマーク
+
+長時間のストリーミング実行を開始し、指定した秒数後に /workflows/tasks/:task_id/stop を送信する。
+同時実行数を段階的に増やしながら、停止要求から「ストリームが閉じるまで」と
+「実行状態が stopped になるまで」の時間を計測する。
+
+WORKFLOW_API_KEY には停止までに十分時間がかかるワークフローを指定すること。
+
+使い方:
+    python -m benchmarks.workflow_cancel_benchmark --levels 1,5,10,25 --duration 60
+    python -m benchmarks.workflow_cancel_benchmark --mock --stop-latency-ms 200
+"""
+
+import argparse
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()  # 実環境の API キーをダミー値より優先する
+
+from benchmarks.harness import MockProcess, bench_user  # noqa: E402
+
+import gevent  # noqa: E402
+from locust.env import Environment  # noqa: E402
+from locust.event import Events  # noqa: E402
+
+import locustfile  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def run_level(host: str, users: int, duration: float, offsets, timeout: float) -> dict:
+    """指定した同時実行数で停止の計測を行い、指標毎の結果を返す"""
+    user_class = bench_user(locustfile.DifyWorkflowCancelUser, host)
+    Config.WORKFLOW_CANCEL["offsets"] = offsets
+    Config.WORKFLOW_CANCEL["timeout"] = timeout
+    env = Environment(user_classes=[user_class], events=Events())
+    runner = env.create_local_runner()
+    runner.start(user_count=users, spawn_rate=users)
+    gevent.sleep(duration)
+    runner.quit()
+
+    results = {}
+    for entry in env.stats.entries.values():
+        if entry.method != "CANCEL" or not entry.num_requests:
+            continue
+        results[entry.name] = {
+            "count": entry.num_requests,
+            "failures": entry.num_failures,
+            "p50": entry.get_response_time_percentile(0.5),
+            "p95": entry.get_response_time_percentile(0.95),
+            "max": entry.max_response_time,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure workflow stop latency under increasing concurrency")
+    parser.add_argument("--levels", default="1,5,10,25,50", help="comma separated concurrent runs")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per level")
+    parser.add_argument("--offsets", default=",".join(f"{offset:g}" for offset in Config.WORKFLOW_CANCEL["offsets"]))
+    parser.add_argument("--timeout", type=float, default=Config.WORKFLOW_CANCEL["timeout"])
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--mock", action="store_true", help="run against a local mock server")
+    parser.add_argument("--run-duration-ms", type=float, default=60000, help="mock workflow run duration")
+    parser.add_argument("--stop-latency-ms", type=float, default=0, help="mock delay before a stop takes effect")
+    parser.add_argument("--output", default="benchmarks/results/workflow_cancel.json")
+    args = parser.parse_args()
+
+    levels = [int(value) for value in args.levels.split(",")]
+    offsets = [float(value) for value in args.offsets.split(",")]
+
+    def run_all(host: str) -> dict:
+        results = {}
+        for users in levels:
+            results[users] = run_level(host, users, args.duration, offsets, args.timeout)
+            for name, row in sorted(results[users].items()):
+                print(
+                    f"users={users:<4d} {name:28s} n={row['count']:<5d} fail={row['failures']:<4d} "
+                    f"p50={row['p50']:.0f}ms p95={row['p95']:.0f}ms max={row['max']:.0f}ms"
+                )
+        return results
+
+    if args.mock:
+        with MockProcess(run_duration_ms=args.run_duration_ms, stop_latency_ms=args.stop_latency_ms) as mock:
+            results = run_all(mock.url)
+    else:
+        results = run_all(args.host)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"levels": levels, "offsets": offsets, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,8 +16,175 @@ class Config:
     SANDBOX_API_KEY = os.environ["SANDBOX_API_KEY"]
     CHATFLOW_SANDBOX_API_KEY = os.environ["CHATFLOW_SANDBOX_API_KEY"]
 
+    # HTTPクライアント設定
+    HTTP_CLIENT = {
+        "type": os.environ.get("HTTP_CLIENT", "requests"),  # requests or fasthttp
+        "pool_size": int(os.environ.get("HTTP_POOL_SIZE", "10")),  # 1ユーザー(共有時は全体)あたりの接続数
+        "shared_pool": os.environ.get("HTTP_SHARED_POOL", "false").lower() == "true",
+        "keep_alive": os.environ.get("HTTP_KEEP_ALIVE", "true").lower() == "true",
+        "connect_timeout": float(os.environ.get("HTTP_CONNECT_TIMEOUT", "60")),  # seconds
+        "network_timeout": float(os.environ.get("HTTP_NETWORK_TIMEOUT", "60")),  # seconds
+    }
+
+    # 過負荷 (429 / 503) 時の振る舞い (fail_fast, retry_after, backoff)
+    OVERLOAD = {
+        "policy": os.environ.get("OVERLOAD_POLICY", "fail_fast"),
+        "max_retries": int(os.environ.get("OVERLOAD_MAX_RETRIES", "3")),
+        "base_delay": float(os.environ.get("OVERLOAD_BASE_DELAY", "0.5")),  # seconds
+        "max_delay": float(os.environ.get("OVERLOAD_MAX_DELAY", "30")),  # seconds
+    }
+
+    # プロセス間で共有する状態 (local: プロセス内のみ, redis: 全ワーカーで共有)
+    COORDINATION = {
+        "backend": os.environ.get("COORDINATION", "local"),
+        "url": os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+        "prefix": os.environ.get("COORDINATION_PREFIX", "dify-locust"),  # Redis のキーの接頭辞
+    }
+
+    # 全プロセス合計の送信レートの上限 (再試行を含む、0 は無制限)
+    GLOBAL_RATE_LIMIT = {
+        "rate": float(os.environ.get("GLOBAL_RATE_LIMIT_RPS", "0")),  # requests per second
+        "burst": float(os.environ.get("GLOBAL_RATE_LIMIT_BURST", "10")),
+    }
+
+    # リクエスト単位の結果ログ
+    RESULT_LOG = {
+        "enabled": os.environ.get("RESULT_LOG", "false").lower() == "true",
+        "path": os.environ.get("RESULT_LOG_DIR", "results"),
+        "batch_size": int(os.environ.get("RESULT_LOG_BATCH_SIZE", "4096")),  # 1回の書き込みレコード数
+        "max_pending": int(os.environ.get("RESULT_LOG_MAX_PENDING", "16")),  # 書き込み待ちバッチの上限
+        "schema_interval": float(os.environ.get("RESULT_LOG_SCHEMA_INTERVAL", "10")),  # スキーマを更新する間隔 (秒)
+        "max_strings": int(os.environ.get("RESULT_LOG_MAX_STRINGS", "50000")),  # ユーザー・会話 ID の種類の上限
+    }
+
+    # 相関 ID のヘッダー名 (サーバー側のログ・トレースと結合する)
+    CORRELATION_HEADER = os.environ.get("CORRELATION_HEADER", "X-Request-ID")
+
+    # Prometheus / OpenMetrics エクスポーター
+    METRICS_EXPORTER = {
+        "enabled": os.environ.get("METRICS_EXPORTER", "false").lower() == "true",
+        "host": os.environ.get("METRICS_EXPORTER_HOST", "0.0.0.0"),
+        "port": int(os.environ.get("METRICS_EXPORTER_PORT", "9646")),
+    }
+
+    # ウォームアップ (off: 除外しない, fixed: 起動完了から指定秒数, auto: 定常状態を自動検出)
+    WARMUP = {
+        "mode": os.environ.get("WARMUP_MODE", "off"),
+        "seconds": float(os.environ.get("WARMUP_SECONDS", "60")),  # fixed の場合のウォームアップ秒数
+        "window": float(os.environ.get("WARMUP_WINDOW", "10")),  # auto の判定間隔 (秒)
+        "windows": int(os.environ.get("WARMUP_WINDOWS", "3")),  # 連続して安定している必要がある区間数
+        "rps_cv": float(os.environ.get("WARMUP_RPS_CV", "0.1")),  # RPS の変動係数の閾値
+        "latency_cv": float(os.environ.get("WARMUP_LATENCY_CV", "0.2")),  # 中央値レイテンシの変動係数の閾値
+        "max_seconds": float(os.environ.get("WARMUP_MAX_SECONDS", "600")),  # auto の打ち切り秒数
+    }
+
+    # コンテナ毎のリソース (cgroup v2)
+    CGROUP_METRICS = {
+        "enabled": os.environ.get("CGROUP_METRICS", "false").lower() == "true",
+        "root": os.environ.get("CGROUP_ROOT", "/sys/fs/cgroup"),
+        # "api=system.slice/docker-<id>.scope,..." の形式 (空の場合は docker compose のサービスを自動検出)
+        "services": dict(
+            item.split("=", 1) for item in os.environ.get("CGROUP_SERVICES", "").split(",") if "=" in item
+        ),
+        "project": os.environ.get("COMPOSE_PROJECT_NAME", ""),
+        "interval": float(os.environ.get("CGROUP_INTERVAL", "5")),  # seconds
+        "path": os.environ.get("CGROUP_PATH", "results/containers.json"),
+    }
+
+    # ワークフロー実行の完了監視 (ワーカー内で共有し、未完了の実行をまとめて確認する)
+    COMPLETION_POLLER = {
+        "initial_interval": float(os.environ.get("COMPLETION_POLL_INITIAL_INTERVAL", "0.5")),  # seconds
+        "max_interval": float(os.environ.get("COMPLETION_POLL_MAX_INTERVAL", "5")),  # seconds
+        "backoff": float(os.environ.get("COMPLETION_POLL_BACKOFF", "1.5")),  # 確認毎に間隔を伸ばす倍率
+        "concurrency": int(os.environ.get("COMPLETION_POLL_CONCURRENCY", "4")),  # 同時に送る確認の上限
+        "max_age": float(os.environ.get("COMPLETION_POLL_MAX_AGE", "300")),  # この秒数で監視を打ち切る
+    }
+
+    # ワークフロー停止の計測 (ストリーミング開始から停止要求までの秒数を順に使う)
+    WORKFLOW_CANCEL = {
+        "offsets": [float(value) for value in os.environ.get("WORKFLOW_CANCEL_OFFSETS", "0.5,1,2,5").split(",")],
+        "timeout": float(os.environ.get("WORKFLOW_CANCEL_TIMEOUT", "60")),  # seconds
+    }
+
+    # タスク内のエラーの集計 (種類毎の件数と直近のメッセージ)
+    ERROR_LOG = {
+        "path": os.environ.get("ERROR_LOG_PATH", "results/errors.json"),
+        "sample_size": int(os.environ.get("ERROR_LOG_SAMPLES", "5")),  # 種類毎に保持するメッセージ数
+        "flush_interval": float(os.environ.get("ERROR_LOG_FLUSH_INTERVAL", "10")),  # seconds
+        "max_groups": int(os.environ.get("ERROR_LOG_MAX_GROUPS", "500")),  # 超過分はタスク・型毎にまとめる
+    }
+
+    # チャンクの一括追加・更新・削除 (DifySegmentUser)
+    SEGMENTS = {
+        "batch_size": int(os.environ.get("SEGMENT_BATCH_SIZE", "20")),
+        "content_length": int(os.environ.get("SEGMENT_CONTENT_LENGTH", "500")),  # 1チャンクの文字数
+        "document_size": int(os.environ.get("SEGMENT_DOCUMENT_SIZE", "1000000")),  # 対象のドキュメントの文字数
+        "retrieval_timeout": float(os.environ.get("SEGMENT_RETRIEVAL_TIMEOUT", "60")),  # seconds
+        "poll_interval": float(os.environ.get("SEGMENT_POLL_INTERVAL", "0.5")),  # seconds
+    }
+
+    # 音声 API のベンチマーク (DifyAudioUser)
+    AUDIO = {
+        "durations": [float(value) for value in os.environ.get("AUDIO_DURATIONS", "5,15,30,60").split(",")],  # seconds
+        "text_lengths": [int(value) for value in os.environ.get("AUDIO_TEXT_LENGTHS", "50,200,1000").split(",")],
+        "bitrate": int(os.environ.get("AUDIO_BITRATE", "128000")),  # MP3 のヘッダーから判定できない場合の bps
+    }
+
+    # アップロードしたファイルを添付するチャット・ワークフロー (DifyMultimodalUser)
+    MULTIMODAL = {
+        "file_types": [
+            value for value in os.environ.get("MULTIMODAL_FILE_TYPES", "document,image,audio").split(",") if value
+        ],
+        "workflow_input": os.environ.get(
+            "MULTIMODAL_WORKFLOW_INPUT", ""
+        ),  # ファイルを渡す入力変数名 (空の場合は sys.files)
+    }
+
+    # クエリの分布 (fixed: 固定 / unique: 毎回異なる / uniform: プールから一様 / zipf: プールから Zipf 分布)
+    QUERY_MIX = {
+        "mode": os.environ.get("QUERY_MIX", "fixed"),
+        "pool_size": int(os.environ.get("QUERY_POOL_SIZE", "1000")),
+        "zipf_s": float(os.environ.get("QUERY_ZIPF_S", "1.1")),
+        "salt": os.environ.get("QUERY_SALT", ""),  # 実行毎に変えるとサーバー側のキャッシュも初回になる
+    }
+    QUERY_MIX_PATH = os.environ.get("QUERY_MIX_PATH", "results/query_mix.json")
+
+    # YAML シナリオ
+    SCENARIO_DIR = os.environ.get("SCENARIO_DIR", "scenarios")
+    SCENARIOS = os.environ.get("SCENARIOS", "")  # locust コマンドで使うシナリオのファイルまたはディレクトリ
+
     # テスト設定
-    LOAD_TEST = {"users": {"api": 100, "sandbox": 50}, "spawn_rate": 10, "duration": "30m"}
+    LOAD_TEST = {
+        "users": int(os.environ.get("LOAD_TEST_USERS", "100")),
+        "spawn_rate": float(os.environ.get("LOAD_TEST_SPAWN_RATE", "10")),
+        "duration": os.environ.get("LOAD_TEST_DURATION", "30m"),  # 30s, 10m, 12h など (空の場合は停止しない)
+    }
+
+    # 長時間試験 (一定間隔で統計とリソースを記録し、終了時に増加傾向を判定する)
+    SOAK = {
+        "enabled": os.environ.get("SOAK", "false").lower() == "true",
+        "path": os.environ.get("SOAK_PATH", "results/soak.csv"),
+        "interval": float(os.environ.get("SOAK_INTERVAL", "60")),  # seconds
+        "metrics": os.environ.get("SOAK_METRICS", "p50,p95,error_rate,memory_percent").split(","),
+        "alpha": float(os.environ.get("SOAK_ALPHA", "0.01")),  # 傾きの有意水準
+        "min_change": float(os.environ.get("SOAK_MIN_CHANGE", "0.1")),  # 期間全体での増加率の下限
+        "fail_on_drift": os.environ.get("SOAK_FAIL_ON_DRIFT", "false").lower() == "true",
+    }
+
+    # 信頼区間と目標精度での停止 (一定間隔のバッチからエンドポイント毎の RPS・パーセンタイルの区間を求める)
+    PRECISION = {
+        "enabled": os.environ.get("PRECISION", "false").lower() == "true",
+        "adaptive": os.environ.get("PRECISION_ADAPTIVE", "false").lower() == "true",  # 目標精度に達したら停止
+        "path": os.environ.get("PRECISION_PATH", "results/precision.json"),
+        "interval": float(os.environ.get("PRECISION_INTERVAL", "10")),  # バッチの長さ (seconds)
+        "target": float(os.environ.get("PRECISION_TARGET", "0.05")),  # 区間の半幅 / 推定値の上限
+        "confidence": float(os.environ.get("PRECISION_CONFIDENCE", "0.95")),
+        "percentiles": [float(value) for value in os.environ.get("PRECISION_PERCENTILES", "50,95,99").split(",")],
+        "endpoints": [name for name in os.environ.get("PRECISION_ENDPOINTS", "").split(",") if name],  # 空の場合は全て
+        "min_batches": int(os.environ.get("PRECISION_MIN_BATCHES", "10")),
+        "min_requests": int(os.environ.get("PRECISION_MIN_REQUESTS", "100")),  # 対象とするエンドポイントの件数の下限
+        "bootstrap": int(os.environ.get("PRECISION_BOOTSTRAP", "1000")),  # ブートストラップの反復回数
+    }
 
     # パフォーマンス要件
     PERFORMANCE = {
@@ -0,0 +1,101 @@
+"""クライアント側の計測とサーバー側のログ・トレースの結合
+
+リクエスト単位の結果ログ (RESULT_LOG=true) に記録した相関 ID (X-Request-ID) で、
+サーバー側のログまたはトレース (OTLP JSON, Jaeger JSON, 1行1イベントの JSON ログ) と結合し、
+遅いリクエストをサーバー側のフェーズ (API, Celery, サンドボックスなど) に分解する。
+
+使い方:
+    python join_traces.py results traces.json --name "/chat-messages" --top 20
+    python join_traces.py results nginx-access.json --duration-field request_time --duration-unit s --output join.md
+"""
+
+import argparse
+import csv
+
+from utils.traces import endpoint_breakdown, join_requests, load_server_phases
+
+DURATION_SCALES = {"ms": 1.0, "s": 1000.0, "us": 0.001}
+
+
+def render(joined: list, top: int) -> str:
+    lines = ["## Endpoints", ""]
+    lines.append("| Name | requests | matched | client (ms) | server (ms) | outside (ms) | phases (mean ms) |")
+    lines.append("|---|---|---|---|---|---|---|")
+    for name, row in endpoint_breakdown(joined).items():
+        server = f"{row['server_ms']:.0f}" if row["server_ms"] is not None else "-"
+        outside = f"{row['outside_ms']:.0f}" if row["outside_ms"] is not None else "-"
+        phases = ", ".join(f"{phase}={value:.0f}" for phase, value in row["phases"].items())
+        lines.append(
+            f"| {name} | {row['requests']} | {row['matched']} | {row['client_ms']:.0f} | {server} | {outside} | {phases} |"
+        )
+
+    lines += ["", f"## Slowest {top} matched requests", ""]
+    lines.append("| Request ID | Name | status | client (ms) | server (ms) | outside (ms) | phases (ms) |")
+    lines.append("|---|---|---|---|---|---|---|")
+    slowest = sorted((row for row in joined if row["matched"]), key=lambda row: -row["client_ms"])[:top]
+    for row in slowest:
+        phases = ", ".join(f"{phase}={value:.0f}" for phase, value in row["phases"].items())
+        lines.append(
+            f"| {row['request_id']} | {row['name']} | {row['status']} | {row['client_ms']:.0f} | "
+            f"{row['server_ms']:.0f} | {row['outside_ms']:.0f} | {phases} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Join client-side timings with server logs by correlation ID")
+    parser.add_argument("result_log", help="result log directory or file (RESULT_LOG_DIR)")
+    parser.add_argument("server_log", help="OTLP JSON, Jaeger JSON or JSON lines log")
+    parser.add_argument("--name", default="", help="only requests whose name contains this text")
+    parser.add_argument("--top", type=int, default=20, help="number of slowest requests to list")
+    parser.add_argument("--id-field", help="correlation ID field of JSON lines logs (auto-detected by default)")
+    parser.add_argument("--phase-field", help="phase name field of JSON lines logs")
+    parser.add_argument("--duration-field", help="duration field of JSON lines logs")
+    parser.add_argument("--duration-unit", choices=sorted(DURATION_SCALES), default="ms")
+    parser.add_argument("--output", help="write the Markdown report to a file instead of stdout")
+    parser.add_argument("--csv", help="write one row per joined request")
+    args = parser.parse_args()
+
+    phases = load_server_phases(
+        args.server_log,
+        id_field=args.id_field,
+        phase_field=args.phase_field,
+        duration_field=args.duration_field,
+        duration_scale=DURATION_SCALES[args.duration_unit],
+    )
+    joined = join_requests(args.result_log, phases, args.name)
+    matched = sum(row["matched"] for row in joined)
+    print(f"{matched} of {len(joined)} requests matched {len(phases)} server-side request IDs")
+
+    content = render(joined, args.top)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(content)
+        print(f"Report written to {args.output}")
+    else:
+        print(content)
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["request_id", "timestamp", "name", "status", "client_ms", "server_ms", "outside_ms", "phases"]
+            )
+            for row in joined:
+                phases_text = ";".join(f"{phase}={value:.1f}" for phase, value in row.get("phases", {}).items())
+                writer.writerow(
+                    [
+                        row["request_id"],
+                        row["timestamp"],
+                        row["name"],
+                        row["status"],
+                        row["client_ms"],
+                        row.get("server_ms", ""),
+                        row.get("outside_ms", ""),
+                        phases_text,
+                    ]
+                )
+
+
+if __name__ == "__main__":
+    main()
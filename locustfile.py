@@ -1,20 +1,141 @@
-from locust import HttpUser, task, between, events
+import itertools
+import os
+
+from locust import task, between, events
+from locust.runners import MasterRunner, WorkerRunner
 from tasks.api_tasks import APITasks
 from tasks.chat_tasks import ChatTasks
 from tasks.knowledge_tasks import KnowledgeTasks
 from tasks.workflow_tasks import WorkflowTasks
 from tasks.sandbox_tasks import SandboxTasks
+from tasks.segment_tasks import SegmentTasks
 from tasks.file_tasks import FileTasks
+from tasks.multimodal_tasks import MultimodalTasks
 from config import Config
-
-
-class BaseUser(HttpUser):
+from utils.audio import AudioStats, make_text, make_wav
+from utils.cgroup import CgroupCollector
+from utils.completion import CompletionTracker
+from utils.coordination import LocalCoordinator, RateLimitedClient, create_coordinator
+from utils.correlation import CorrelatedClient
+from utils.errors import ErrorAggregator
+from utils.http_client import select_http_user
+from utils.overload import OverloadAwareClient, OverloadPolicy, OverloadStats
+from utils.precision import PrecisionMonitor
+from utils.prometheus import PrometheusExporter
+from utils.queries import QueryMix, QueryStats
+from utils.result_log import ResultLog, new_run_id
+from utils.scenario import SCENARIO_SUFFIXES, load_scenarios
+from utils.soak import SoakMonitor
+from utils.warmup import WarmupMonitor
+
+
+@events.init.add_listener
+def on_init(environment, **kwargs):
+    """計測機能の初期化"""
+    runner = environment.runner
+
+    # 統計は Master (単体実行時は自身) で集計されるため、ウォームアップの判定もそこで行う
+    warmup = None
+    if Config.WARMUP["mode"] != "off" and not isinstance(runner, WorkerRunner):
+        warmup = WarmupMonitor(**Config.WARMUP).attach(environment)
+        if isinstance(runner, MasterRunner):
+            warmup.listeners.append(lambda warmup_end: runner.send_message("warmup_end", warmup_end))
+
+    # 長時間試験の時系列とドリフト検出 (統計が集計されるプロセスで記録)
+    soak = None
+    if Config.SOAK["enabled"] and not isinstance(runner, WorkerRunner):
+        soak = SoakMonitor(**{key: value for key, value in Config.SOAK.items() if key != "enabled"}).attach(environment)
+        # ウォームアップ終了時の統計のリセットに合わせて区間の基準をリセット
+        if warmup is not None:
+            warmup.listeners.append(lambda warmup_end: soak.reset())
+
+    # エンドポイント毎の信頼区間 (PRECISION_ADAPTIVE=true の場合は目標精度に達した時点で停止)
+    if Config.PRECISION["enabled"] and not isinstance(runner, WorkerRunner):
+        precision = PrecisionMonitor(
+            **{key: value for key, value in Config.PRECISION.items() if key != "enabled"}
+        ).attach(environment)
+        if warmup is not None:
+            warmup.listeners.append(lambda warmup_end: precision.reset())
+
+    # コンテナ毎のリソース (負荷対象と同じホストで動く Master / 単体実行のプロセスで収集)
+    if Config.CGROUP_METRICS["enabled"] and not isinstance(runner, WorkerRunner):
+        options = {key: value for key, value in Config.CGROUP_METRICS.items() if key != "enabled"}
+        cgroups = CgroupCollector(**options).attach(environment)
+        if soak is not None:
+            soak.samplers.append(cgroups.flat_sample)
+
+    # タスク内のエラーを種類毎に集計 (ワーカーの集計は Master に送られる)
+    ErrorAggregator(**Config.ERROR_LOG).attach(environment, kwargs.get("web_ui"))
+
+    # 拒否率・再試行による増幅・グッドプット (リクエストイベントが発生するプロセスで集計)
+    if not isinstance(runner, MasterRunner):
+        OverloadStats().attach(environment)
+        # フィクスチャ・送信レート・完了通知をプロセス間で共有 (COORDINATION=redis の場合)
+        coordinator = create_coordinator(**Config.COORDINATION).attach(environment)
+        # ワークフロー実行の完了をワーカー内の全ユーザーで共有して監視し、他のプロセスにも通知する
+        completions = CompletionTracker(
+            **Config.COMPLETION_POLLER,
+            client_factory=lambda host: wrap_client(BaseUser.create_session(environment, host), environment),
+        ).attach(environment)
+        completions.listeners.append(
+            lambda run_id, status: coordinator.publish("workflow_completed", {"run_id": run_id, "status": status})
+        )
+        coordinator.subscribe("workflow_completed", completions.on_remote_completion)
+        # クエリの分布 (初回・繰り返しの判定はプロセス間で共有)
+        QueryMix(**Config.QUERY_MIX).attach(environment)
+
+    # 初回・繰り返しのクエリ毎のレイテンシ (キャッシュの効果)
+    if Config.QUERY_MIX["mode"] != "fixed":
+        QueryStats(Config.QUERY_MIX_PATH).attach(environment)
+
+    # 音声 API の実時間係数・最初の音声データまでの時間・配信速度 (プロセス毎に集計)
+    if not isinstance(runner, MasterRunner):
+        AudioStats(Config.AUDIO["bitrate"]).attach(environment)
+
+    if Config.METRICS_EXPORTER["enabled"]:
+        PrometheusExporter(Config.METRICS_EXPORTER["host"], Config.METRICS_EXPORTER["port"]).attach(environment)
+
+    if Config.RESULT_LOG["enabled"] and not isinstance(runner, MasterRunner):
+        result_log = ResultLog(
+            Config.RESULT_LOG["path"],
+            batch_size=Config.RESULT_LOG["batch_size"],
+            max_pending=Config.RESULT_LOG["max_pending"],
+            schema_interval=Config.RESULT_LOG["schema_interval"],
+            max_strings=Config.RESULT_LOG["max_strings"],
+        ).attach(environment)
+        # ウォームアップ終了時刻を記録し、レポートでは以降のリクエストのみを集計する
+        if warmup is not None:
+            warmup.listeners.append(lambda warmup_end: result_log.metadata.update(warmup_end=warmup_end))
+        if isinstance(runner, WorkerRunner):
+            runner.register_message("warmup_end", lambda msg, **kwargs: result_log.metadata.update(warmup_end=msg.data))
+            # 全ワーカーのファイルを Master の実行 ID のディレクトリにまとめる
+            runner.register_message("result_log_run", lambda msg, **kwargs: setattr(result_log, "run_id", msg.data))
+    elif Config.RESULT_LOG["enabled"]:
+        run_id = new_run_id()
+        environment.events.test_start.add_listener(lambda **kwargs: runner.send_message("result_log_run", run_id))
+
+
+OVERLOAD_POLICY = OverloadPolicy(**Config.OVERLOAD)
+
+
+def wrap_client(client, environment, user=None):
+    """全ての送信に共通の処理を HTTP クライアントに追加 (ユーザーと共有の完了監視で同じものを使う)"""
+    # 各試行に相関 ID を付けた上で、429 / 503 を過負荷ポリシーに従って再試行する
+    if Config.GLOBAL_RATE_LIMIT["rate"] > 0:
+        coordinator = LocalCoordinator.of(environment)
+        client = RateLimitedClient(client, coordinator, **Config.GLOBAL_RATE_LIMIT)
+    client = CorrelatedClient(client, user, Config.CORRELATION_HEADER)
+    return OverloadAwareClient(client, OVERLOAD_POLICY)
+
+
+class BaseUser(select_http_user(Config.HTTP_CLIENT)):
     """基本ユーザークラス"""
 
     abstract = True  # これは直接インスタンス化されないクラス
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.client = wrap_client(self.client, self.environment, self)
         self.api = None  # APITasksのインスタンスを保持
 
 
@@ -52,6 +173,27 @@ class DifyWorkflowUser(BaseUser):
         self.workflow.perform_workflow_tasks()
 
 
+class DifyWorkflowCancelUser(BaseUser):
+    """Dify Workflow 停止の計測用ユーザークラス"""
+
+    host = Config.API_HOST
+    wait_time = between(1, 2)
+
+    def on_start(self):
+        """初期化処理"""
+        self.api = APITasks(self)
+        self.workflow = WorkflowTasks(self, Config.WORKFLOW_API_KEY)
+        self.offsets = itertools.cycle(Config.WORKFLOW_CANCEL["offsets"])
+
+    @task(1)
+    def cancel_operations(self):
+        """ストリーミング実行の停止までの時間を計測"""
+        try:
+            self.workflow.run_and_stop_workflow(next(self.offsets), Config.WORKFLOW_CANCEL["timeout"])
+        except Exception as e:
+            self.api.log_error("workflow_cancel", e)
+
+
 class DifyFileUser(BaseUser):
     """Dify File テスト用ユーザークラス"""
 
@@ -69,6 +211,50 @@ class DifyFileUser(BaseUser):
         self.file.perform_file_tasks()
 
 
+class DifyAudioUser(BaseUser):
+    """音声 API (音声→テキスト・テキスト→音声) のベンチマーク用ユーザークラス"""
+
+    host = Config.API_HOST
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        """初期化処理 (音声の長さ・テキストの長さの組み合わせを順に使う)"""
+        self.api = APITasks(self)
+        self.file = FileTasks(self, Config.CHATFLOW_API_KEY)
+        cases = [("audio_to_text", seconds) for seconds in Config.AUDIO["durations"]]
+        cases += [("text_to_audio", length) for length in Config.AUDIO["text_lengths"]]
+        self.audio_cases = itertools.cycle(cases)
+
+    @task(1)
+    def audio_operations(self):
+        """音声の長さ・テキストの長さ毎の変換"""
+        kind, size = next(self.audio_cases)
+        try:
+            if kind == "audio_to_text":
+                self.file.audio_to_text(make_wav(size), f"audio-{size:g}s.wav", "audio/wav", size, f"{size:g}s")
+            else:
+                self.file.text_to_audio(make_text(size), f"{size} chars")
+        except Exception as e:
+            self.api.log_error(kind, e)
+
+
+class DifyMultimodalUser(BaseUser):
+    """ファイルをアップロードして添付するチャット・ワークフローのテスト用ユーザークラス"""
+
+    host = Config.API_HOST
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        """初期化処理"""
+        self.api = APITasks(self)
+        self.multimodal = MultimodalTasks(self, Config.CHATFLOW_API_KEY, Config.WORKFLOW_API_KEY, **Config.MULTIMODAL)
+
+    @task(1)
+    def multimodal_operations(self):
+        """アップロードから添付付きのチャット・ワークフローまでのテスト"""
+        self.multimodal.perform_multimodal_tasks()
+
+
 class DifyKnowledgeUser(BaseUser):
     """Dify Knowledge テスト用ユーザークラス"""
 
@@ -80,12 +266,37 @@ class DifyKnowledgeUser(BaseUser):
         self.api = APITasks(self)
         self.knowledge = KnowledgeTasks(self, Config.KNOWLEDGE_API_KEY)
 
+    def on_stop(self):
+        """使っていたナレッジベースを他のユーザーが使えるようプールに戻す"""
+        self.knowledge.release_fixtures()
+
     @task(1)
     def knowledge_operations(self):
         """ナレッジベース機能のテスト"""
         self.knowledge.perform_knowledge_tasks()
 
 
+class DifySegmentUser(BaseUser):
+    """ドキュメントのチャンクの一括追加・更新・削除のテスト用ユーザークラス"""
+
+    host = Config.API_HOST
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        """初期化処理"""
+        self.api = APITasks(self)
+        self.segments = SegmentTasks(self, Config.KNOWLEDGE_API_KEY, **Config.SEGMENTS)
+
+    def on_stop(self):
+        """使っていたナレッジベースを他のユーザーが使えるようプールに戻す"""
+        self.segments.release_fixtures()
+
+    @task(1)
+    def segment_operations(self):
+        """チャンクの追加・更新・削除と検索への反映"""
+        self.segments.perform_segment_tasks()
+
+
 class DifySandboxUser(BaseUser):
     """Sandbox テスト用ユーザークラス"""
 
@@ -119,41 +330,117 @@ class DifyChatflowSandboxUser(BaseUser):
         self.chat.perform_only_chat_message()
 
 
-def run_test(testcase="all"):
-    """テストの実行"""
+class ScenarioUser(BaseUser):
+    """YAML シナリオを実行するユーザークラス (シナリオ毎にサブクラスを生成する)"""
+
+    abstract = True
+    scenario = None
+
+    def on_start(self):
+        """初期化処理"""
+        self.api = APITasks(self)
+        self.vars = self.scenario.new_variables(user=self.api.user_id)
+        try:
+            self.scenario.start(self)
+        except Exception as e:
+            self.api.log_error(f"scenario_{self.scenario.name}", e)
+
+    @task(1)
+    def scenario_operations(self):
+        """シナリオのステップを順に実行"""
+        try:
+            self.scenario.run(self)
+        except Exception as e:
+            self.api.log_error(f"scenario_{self.scenario.name}", e)
+
+
+def scenario_user_classes(path: str) -> list:
+    """シナリオファイル (またはディレクトリ) からユーザークラスを生成"""
+    user_classes = []
+    for scenario in load_scenarios(path, Config):
+        class_name = "Scenario" + "".join(part.capitalize() for part in scenario.name.replace("-", "_").split("_"))
+        attrs = {
+            "scenario": scenario,
+            "host": scenario.host,
+            "weight": scenario.weight,
+            "wait_time": between(*scenario.wait_time),
+            "__module__": __name__,
+        }
+        user_classes.append(type(class_name, (ScenarioUser,), attrs))
+    return user_classes
+
+
+# SCENARIOS を指定した場合は locust コマンドからも選択できるよう登録する
+if Config.SCENARIOS:
+    globals().update({user_class.__name__: user_class for user_class in scenario_user_classes(Config.SCENARIOS)})
+
+
+TESTCASES = {
+    "chatflow": [DifyChatUser],
+    "workflow": [DifyWorkflowUser],
+    "file": [DifyFileUser],
+    "knowledge": [DifyKnowledgeUser],
+    "sandbox": [DifySandboxUser],
+    "chatflow_sandbox": [DifyChatflowSandboxUser],
+    "workflow_cancel": [DifyWorkflowCancelUser],
+    "multimodal": [DifyMultimodalUser],
+    "audio": [DifyAudioUser],
+    "segments": [DifySegmentUser],
+    "all": [DifyChatUser, DifyWorkflowUser, DifyFileUser, DifyKnowledgeUser, DifySandboxUser],
+}
+
+
+def resolve_user_classes(testcase: str) -> list:
+    """テストケース名、シナリオ名 (scenarios/<name>.yml)、またはシナリオのパスからユーザークラスを返す"""
+    if testcase in TESTCASES:
+        return TESTCASES[testcase]
+    if os.path.exists(testcase):
+        return scenario_user_classes(testcase)
+    for suffix in SCENARIO_SUFFIXES:
+        path = os.path.join(Config.SCENARIO_DIR, testcase + suffix)
+        if os.path.exists(path):
+            return scenario_user_classes(path)
+    raise ValueError(f"Unknown test case: {testcase} (expected one of {sorted(TESTCASES)} or a scenario)")
+
+
+def run_test(testcase="all", host=None, users=None, spawn_rate=None, duration=None):
+    """テストの実行 (引数を省略した項目は LOAD_TEST の設定を使い、終了後の Environment を返す)"""
     from locust.env import Environment
+    from locust.event import Events
+    from locust.log import setup_logging
+    from locust.util.timespan import parse_timespan
+    import gevent
     import logging
 
+    setup_logging("INFO")
+
     # テストケースに応じてユーザークラスを選択
-    if testcase == "chatflow":
-        user_classes = [DifyChatUser]
-    elif testcase == "workflow":
-        user_classes = [DifyWorkflowUser]
-    elif testcase == "file":
-        user_classes = [DifyFileUser]
-    elif testcase == "knowledge":
-        user_classes = [DifyKnowledgeUser]
-    elif testcase == "sandbox":
-        user_classes = [DifySandboxUser]
-    elif testcase == "chatflow_sandbox":
-        user_classes = [DifyChatflowSandboxUser]
-    else:
-        user_classes = [DifyChatUser, DifyWorkflowUser, DifyFileUser, DifyKnowledgeUser, DifySandboxUser]
-
-    # 環境設定
-    env = Environment(user_classes=user_classes, events=events)
+    user_classes = resolve_user_classes(testcase)
+
+    # 環境設定 (同じプロセスで繰り返し実行してもリスナーが重複しないよう、実行毎にイベントを作る)
+    test_events = Events()
+    test_events.init.add_listener(on_init)
+    env = Environment(user_classes=user_classes, events=test_events, host=host)
 
     # 統計情報の設定
     env.create_local_runner()
+    env.events.init.fire(environment=env, runner=env.runner, web_ui=None)
 
-    # テスト実行
+    # テスト実行 (duration 経過後に停止)
+    users = users or Config.LOAD_TEST["users"]
+    spawn_rate = spawn_rate or Config.LOAD_TEST["spawn_rate"]
+    duration = duration or Config.LOAD_TEST["duration"]
     try:
-        env.runner.start(user_count=Config.LOAD_TEST["users"], spawn_rate=Config.LOAD_TEST["spawn_rate"])
+        env.runner.start(user_count=users, spawn_rate=spawn_rate)
+        if duration:
+            gevent.spawn_later(parse_timespan(duration), env.runner.quit)
         env.runner.greenlet.join()
     except KeyboardInterrupt:
         logging.info("Test interrupted by user")
     finally:
         env.runner.quit()
+        env.events.quitting.fire(environment=env, reverse=True)
+    return env
 
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+"""docker-compose の設定のマトリクス実行
+
+SERVER_WORKER_AMOUNT などの設定の全ての組み合わせについて、起動処理 (docker compose / モック) でスタックを作り直し、
+run_test で同じテストケースを実行して、スループットとレイテンシの順位表を出力する。
+
+使い方:
+    python matrix.py chatflow --param SERVER_WORKER_AMOUNT=1,2,4 --param SERVER_WORKER_CLASS=gevent,sync -t 5m
+    python matrix.py workflow --grid matrix.yml --users 50 --output results/matrix.md
+    python matrix.py chatflow --launcher mock --param SQLALCHEMY_POOL_SIZE=10,30 -t 30s
+"""
+
+import argparse
+import json
+import logging
+import os
+
+from locust.log import setup_logging
+
+from config import Config
+from locustfile import resolve_user_classes, run_test
+from utils.matrix import LAUNCHERS, expand_grid, parse_grid, rank_results, render_table, summarize_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a test case for every combination of deployment settings")
+    parser.add_argument("testcase", help="run_test test case or scenario")
+    parser.add_argument("--param", action="append", default=[], help="NAME=v1,v2 (repeatable)")
+    parser.add_argument("--grid", help="YAML file mapping NAME to a list of values")
+    parser.add_argument("--launcher", choices=sorted(LAUNCHERS), default="docker")
+    parser.add_argument("--compose-file", default="dify/docker-compose.yaml")
+    parser.add_argument("--project", default=os.environ.get("COMPOSE_PROJECT_NAME", ""))
+    parser.add_argument("--ready-timeout", type=float, default=300, help="seconds to wait for the API after launch")
+    parser.add_argument("--down", action="store_true", help="docker compose down after each combination")
+    parser.add_argument("-u", "--users", type=int, default=Config.LOAD_TEST["users"])
+    parser.add_argument("-r", "--spawn-rate", type=float, default=Config.LOAD_TEST["spawn_rate"])
+    parser.add_argument("-t", "--duration", default=Config.LOAD_TEST["duration"])
+    parser.add_argument(
+        "--output", default="results/matrix.md", help="ranked table (Markdown); raw results go to .json"
+    )
+    args = parser.parse_args()
+    setup_logging("INFO")
+
+    resolve_user_classes(args.testcase)  # 全ての組み合わせが失敗する前にテストケース名を確認
+    grid = parse_grid(args.param, args.grid)
+    combinations = expand_grid(grid)
+    if args.launcher == "docker":
+        launcher = LAUNCHERS["docker"](args.compose_file, args.project, Config.API_HOST, args.ready_timeout, args.down)
+    else:
+        launcher = LAUNCHERS["mock"]()
+
+    results = []
+    for index, params in enumerate(combinations, start=1):
+        logging.info(f"[{index}/{len(combinations)}] {params}")
+        try:
+            host = launcher.start(params)
+            env = run_test(args.testcase, host, args.users, args.spawn_rate, args.duration)
+            row = summarize_stats(env.stats, Config.PERFORMANCE["error_rate"], Config.PERFORMANCE["response_time_95"])
+        except Exception as e:
+            logging.error(f"Combination {params} failed: {e}")
+            row = {"error": str(e)}
+        finally:
+            launcher.stop()
+        results.append({"params": params, **row})
+
+    completed = [row for row in results if "error" not in row]
+    ranked = rank_results(completed)
+    table = render_table(ranked, list(grid))
+    print(table)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(f"# {args.testcase} ({args.users} users, {args.duration})\n\n{table}")
+    with open(os.path.splitext(args.output)[0] + ".json", "w", encoding="utf-8") as f:
+        json.dump({"testcase": args.testcase, "grid": grid, "ranked": ranked, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
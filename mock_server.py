@@ -0,0 +1,824 @@
+"""Dify API / Sandbox のローカルモックサーバー
+
+docker-compose のフルスタック無しで負荷生成側 (locustfile) 自体の性能を測るための軽量サーバー。
+タスクが呼び出すエンドポイント (/chat-messages の SSE, /workflows/run, /datasets/*, /files/upload,
+/sandbox/run など) を実装し、レイテンシ・トークン配信レート・エラー注入を設定できる。
+
+使い方:
+    python mock_server.py --port 8800 --latency-ms 20 --token-interval-ms 10 --error-rate 0.01
+
+locust 側は API_HOST / SANDBOX_HOST を http://localhost:8800/v1 に向ける。
+実行中の設定変更は POST /_mock/config、統計取得は GET /_mock/stats で行う。
+"""
+
+import argparse
+import json
+import random
+import re
+import socket
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import gevent
+from gevent.pywsgi import WSGIServer
+
+DEFAULT_CONFIG = {
+    "latency_ms": 0.0,  # 全レスポンス共通の基本レイテンシ
+    "latency_jitter_ms": 0.0,  # 基本レイテンシに加える一様乱数の幅
+    "token_count": 20,  # ストリーミング応答で返すトークン数
+    "token_interval_ms": 0.0,  # トークン間の送出間隔 (配信レート)
+    "run_duration_ms": 0.0,  # ワークフロー実行の所要時間
+    "sandbox_latency_ms": 0.0,  # /sandbox/run の追加レイテンシ
+    "node_events": False,  # チャットのストリーミングでノードのイベント (開始・コード・回答) を返す
+    "node_overhead_ms": 0.0,  # ノード毎の実行制御の時間 (コードノードは sandbox_latency_ms も加える)
+    "stop_latency_ms": 0.0,  # ワークフロー停止要求が反映されるまでの時間
+    "error_rate": 0.0,  # エラーを注入する確率 (0.0 - 1.0)
+    "error_status": 500,  # 注入するエラーのステータスコード
+    "retry_after": 1,  # 429/503 注入時の Retry-After (秒)
+    "rate_limit_rps": 0.0,  # 1 秒あたりの受付上限 (超過分は 429 で拒否、0 は無制限)
+    "attachment_latency_ms": 0.0,  # 添付ファイル1件毎に加えるレイテンシ (チャット・ワークフロー、最初のトークンより前)
+    "segment_index_delay_ms": 0.0,  # チャンクの追加・更新・削除が検索 (/retrieve) に反映されるまでの時間
+    "audio_to_text_rtf": 0.0,  # 音声→テキストの処理時間 / 音声の長さ (16kHz 16bit モノラルの WAV として長さを求める)
+    "text_to_audio_first_byte_ms": 0.0,  # テキスト→音声の最初の音声データまでの時間
+    "text_to_audio_rtf": 0.0,  # テキスト→音声の生成時間 / 音声の長さ (最初のデータ以降の配信間隔)
+    "text_to_audio_seconds_per_char": 0.06,  # 1文字あたりの音声の長さ
+    "cache_miss_ms": 0.0,  # 初めて受けたクエリ (チャット・ワークフロー・検索) に加えるレイテンシ (キャッシュの模擬)
+    "trace_log": "",  # X-Request-ID 毎の処理時間を JSON Lines で追記するファイル (空の場合は記録しない)
+}
+
+# MPEG1 Layer III 128kbps 44.1kHz のフレーム (ヘッダー + 無音の代わりのゼロ埋め、1フレーム 417 バイト ≒ 26ms)
+MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+MP3_FRAMES_PER_SECOND = 38
+AUDIO_BYTES_PER_SECOND = 32000  # 16kHz 16bit モノラルの WAV
+
+JSON_HEADERS = [("Content-Type", "application/json")]
+SSE_HEADERS = [("Content-Type", "text/event-stream"), ("Cache-Control", "no-cache")]
+
+STATUS_TEXT = {
+    200: "200 OK",
+    201: "201 Created",
+    204: "204 No Content",
+    400: "400 Bad Request",
+    401: "401 Unauthorized",
+    404: "404 Not Found",
+    429: "429 Too Many Requests",
+    500: "500 Internal Server Error",
+    503: "503 Service Unavailable",
+}
+
+
+def _now() -> int:
+    return int(time.time())
+
+
+def _new_id() -> str:
+    return str(uuid.uuid4())
+
+
+def _sse(data: dict) -> bytes:
+    return b"data: " + json.dumps(data).encode("utf-8") + b"\n\n"
+
+
+class MockState:
+    """モックサーバーが保持するアプリケーション状態"""
+
+    def __init__(self):
+        self.conversations: Dict[str, dict] = {}
+        self.messages: Dict[str, List[dict]] = {}
+        self.workflow_runs: Dict[str, dict] = {}
+        self.tasks: Dict[str, str] = {}  # task_id -> workflow_run_id
+        self.datasets: Dict[str, dict] = {}
+        self.documents: Dict[str, List[dict]] = {}
+        self.segments: Dict[str, List[dict]] = {}
+        self.files: Dict[str, dict] = {}
+        self.keywords: Dict[str, List[dict]] = {}  # キーワード -> チャンク (/retrieve 用)
+        self.queries = set()  # 受けたことのあるクエリ (cache_miss_ms 用)
+
+
+class MockStats:
+    """モックサーバー側の計測値"""
+
+    def __init__(self):
+        self.active_streams = 0
+        self.reset()
+
+    def reset(self):
+        # active_streams は現在値 (ゲージ) なのでリセットしない
+        self.requests: Dict[str, int] = {}
+        self.errors = 0
+        self.shed = 0
+        self.max_active_streams = self.active_streams
+        self.started_at = time.time()
+
+    def stream_opened(self):
+        self.active_streams += 1
+        if self.active_streams > self.max_active_streams:
+            self.max_active_streams = self.active_streams
+
+    def stream_closed(self):
+        self.active_streams -= 1
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "total_requests": sum(self.requests.values()),
+            "errors": self.errors,
+            "shed": self.shed,
+            "active_streams": self.active_streams,
+            "max_active_streams": self.max_active_streams,
+            "elapsed": time.time() - self.started_at,
+        }
+
+
+class MockDifyApp:
+    """Dify API / Sandbox を模した WSGI アプリケーション"""
+
+    def __init__(self, config: Optional[dict] = None, prefix: str = "/v1"):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.prefix = prefix
+        self.state = MockState()
+        self.stats = MockStats()
+        self._window = (0, 0)  # (秒, 受付数) レート制限用
+        self.routes = [
+            ("GET", r"/", self.health),
+            ("POST", r"/chat-messages", self.chat_messages),
+            ("GET", r"/messages", self.list_messages),
+            ("GET", r"/messages/(?P<message_id>[^/]+)/suggested", self.suggested),
+            ("POST", r"/messages/(?P<message_id>[^/]+)/feedbacks", self.result_success),
+            ("GET", r"/conversations", self.list_conversations),
+            ("POST", r"/conversations/(?P<conversation_id>[^/]+)/name", self.rename_conversation),
+            ("DELETE", r"/conversations/(?P<conversation_id>[^/]+)", self.delete_conversation),
+            ("GET", r"/parameters", self.parameters),
+            ("GET", r"/meta", self.meta),
+            ("POST", r"/workflows/run", self.run_workflow),
+            ("GET", r"/workflows/run/(?P<run_id>[^/]+)", self.get_workflow_run),
+            ("POST", r"/workflows/tasks/(?P<task_id>[^/]+)/stop", self.stop_workflow),
+            ("GET", r"/workflows/logs", self.workflow_logs),
+            ("POST", r"/datasets", self.create_dataset),
+            ("DELETE", r"/datasets/(?P<dataset_id>[^/]+)", self.delete_dataset),
+            ("POST", r"/datasets/(?P<dataset_id>[^/]+)/document/create-by-text", self.create_document),
+            ("POST", r"/datasets/(?P<dataset_id>[^/]+)/document/create-by-file", self.create_document),
+            ("GET", r"/datasets/(?P<dataset_id>[^/]+)/documents", self.list_documents),
+            ("GET", r"/datasets/(?P<dataset_id>[^/]+)/documents/(?P<batch>[^/]+)/indexing-status", self.indexing),
+            ("DELETE", r"/datasets/(?P<dataset_id>[^/]+)/documents/(?P<document_id>[^/]+)", self.result_success),
+            ("POST", r"/datasets/(?P<dataset_id>[^/]+)/documents/(?P<document_id>[^/]+)/segments", self.segments),
+            (
+                "POST",
+                r"/datasets/(?P<dataset_id>[^/]+)/documents/(?P<document_id>[^/]+)/segments/(?P<segment_id>[^/]+)",
+                self.update_segment,
+            ),
+            (
+                "DELETE",
+                r"/datasets/(?P<dataset_id>[^/]+)/documents/(?P<document_id>[^/]+)/segments/(?P<segment_id>[^/]+)",
+                self.delete_segment,
+            ),
+            ("POST", r"/datasets/(?P<dataset_id>[^/]+)/retrieve", self.retrieve),
+            ("POST", r"/files/upload", self.upload_file),
+            ("POST", r"/audio-to-text", self.audio_to_text),
+            ("POST", r"/text-to-audio", self.text_to_audio),
+            ("POST", r"/sandbox/run", self.sandbox_run),
+        ]
+        self.compiled_routes = [
+            (method, re.compile("^" + re.escape(prefix) + (pattern if pattern != "/" else "/?") + "$"), handler)
+            for method, pattern, handler in self.routes
+        ]
+
+    # WSGI エントリポイント
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        path = environ.get("PATH_INFO", "")
+
+        if path.startswith("/_mock/"):
+            return self._control(method, path, environ, start_response)
+
+        for route_method, pattern, handler in self.compiled_routes:
+            if route_method != method:
+                continue
+            match = pattern.match(path)
+            if match:
+                key = f"{method} {pattern.pattern}"
+                self.stats.requests[key] = self.stats.requests.get(key, 0) + 1
+                if self._rate_limited():
+                    return self._reject(start_response, 429)
+                started = time.time()
+                self._apply_latency()
+                latency_done = time.time()
+                injected = self._inject_error(start_response)
+                if injected is not None:
+                    return injected
+                request = {
+                    "length": _content_length(environ),
+                    "query": _parse_query(environ.get("QUERY_STRING", "")),
+                    "body": _read_body(environ),
+                    "params": match.groupdict(),
+                }
+                result = handler(request, start_response)
+                if self.config["trace_log"]:
+                    phases = {"latency": latency_done - started, handler.__name__: time.time() - latency_done}
+                    self._trace(environ.get("HTTP_X_REQUEST_ID"), phases)
+                return result
+
+        return self._json(start_response, 404, {"code": "not_found", "message": path})
+
+    def _trace(self, request_id: Optional[str], phases: dict):
+        """サーバー側のトレースの代わりに、フェーズ毎の処理時間を記録する (ストリーミングは応答開始まで)"""
+        if not request_id:
+            return
+        with open(self.config["trace_log"], "a", encoding="utf-8") as f:
+            for phase, seconds in phases.items():
+                record = {"request_id": request_id, "service": "mock", "phase": phase, "duration_ms": seconds * 1000}
+                f.write(json.dumps(record) + "\n")
+
+    def _apply_latency(self):
+        delay = self.config["latency_ms"]
+        if self.config["latency_jitter_ms"]:
+            delay += random.uniform(0, self.config["latency_jitter_ms"])
+        if delay > 0:
+            gevent.sleep(delay / 1000.0)
+
+    def _query_latency(self, query: str):
+        """初めて受けたクエリのみ cache_miss_ms だけ遅らせる"""
+        if self.config["cache_miss_ms"] > 0 and query not in self.state.queries:
+            self.state.queries.add(query)
+            gevent.sleep(self.config["cache_miss_ms"] / 1000.0)
+
+    def _process_attachments(self, body: dict, start_response):
+        """添付ファイル (files と inputs 内のファイル) を検証し、1件毎に attachment_latency_ms だけ遅らせる
+
+        アップロードされていないファイルの場合は 400 の応答を返す (問題無ければ None)。
+        """
+        files = list(body.get("files") or [])
+        for value in (body.get("inputs") or {}).values():
+            if isinstance(value, dict):
+                files.append(value)
+            elif isinstance(value, list):
+                files.extend(item for item in value if isinstance(item, dict))
+        file_ids = [item["upload_file_id"] for item in files if item.get("upload_file_id")]
+        unknown = [file_id for file_id in file_ids if file_id not in self.state.files]
+        if unknown:
+            return self._json(
+                start_response, 400, {"code": "invalid_param", "message": f"File not found: {unknown[0]}"}
+            )
+        if file_ids and self.config["attachment_latency_ms"] > 0:
+            gevent.sleep(len(file_ids) * self.config["attachment_latency_ms"] / 1000.0)
+        return None
+
+    def _rate_limited(self) -> bool:
+        """1 秒単位の固定ウィンドウで受付数を制限"""
+        limit = self.config["rate_limit_rps"]
+        if limit <= 0:
+            return False
+        second = int(time.time())
+        window, count = self._window
+        count = count + 1 if window == second else 1
+        self._window = (second, count)
+        if count <= limit:
+            return False
+        self.stats.shed += 1
+        return True
+
+    def _reject(self, start_response, status: int):
+        headers = [("Retry-After", str(self.config["retry_after"]))]
+        body = json.dumps({"code": "too_many_requests", "message": "rate limited", "status": status}).encode("utf-8")
+        start_response(STATUS_TEXT[status], JSON_HEADERS + headers + [("Content-Length", str(len(body)))])
+        return [body]
+
+    def _inject_error(self, start_response):
+        rate = self.config["error_rate"]
+        if rate <= 0 or random.random() >= rate:
+            return None
+        self.stats.errors += 1
+        status = int(self.config["error_status"])
+        headers = list(JSON_HEADERS)
+        if status in (429, 503):
+            headers.append(("Retry-After", str(self.config["retry_after"])))
+        body = json.dumps({"code": "mock_error", "message": "injected error", "status": status}).encode("utf-8")
+        start_response(STATUS_TEXT.get(status, f"{status} Error"), headers + [("Content-Length", str(len(body)))])
+        return [body]
+
+    def _control(self, method, path, environ, start_response):
+        """モックサーバーの制御用エンドポイント"""
+        if path == "/_mock/stats" and method == "GET":
+            return self._json(start_response, 200, self.stats.to_dict())
+        if path == "/_mock/config" and method == "GET":
+            return self._json(start_response, 200, self.config)
+        if path == "/_mock/config" and method == "POST":
+            self.config.update(_read_body(environ) or {})
+            return self._json(start_response, 200, self.config)
+        if path == "/_mock/reset" and method == "POST":
+            self.stats.reset()
+            return self._json(start_response, 200, {"result": "success"})
+        return self._json(start_response, 404, {"code": "not_found", "message": path})
+
+    def _json(self, start_response, status: int, data: Optional[dict]):
+        if status == 204:
+            start_response(STATUS_TEXT[204], [])
+            return [b""]
+        body = json.dumps(data).encode("utf-8")
+        start_response(STATUS_TEXT.get(status, f"{status} Error"), JSON_HEADERS + [("Content-Length", str(len(body)))])
+        return [body]
+
+    def _stream(self, start_response, events):
+        """SSE ストリームの返却 (同時ストリーム数を計測)"""
+        start_response(STATUS_TEXT[200], SSE_HEADERS)
+        return self._counted(events)
+
+    def _counted(self, events):
+        self.stats.stream_opened()
+        try:
+            for event in events:
+                yield _sse(event)
+        finally:
+            self.stats.stream_closed()
+
+    def _token_pause(self):
+        interval = self.config["token_interval_ms"]
+        if interval > 0:
+            gevent.sleep(interval / 1000.0)
+        else:
+            gevent.sleep(0)
+
+    # 共通
+    def health(self, request, start_response):
+        return self._json(start_response, 200, {"welcome": "Dify OpenAPI", "api_version": "v1"})
+
+    def result_success(self, request, start_response):
+        return self._json(start_response, 200, {"result": "success"})
+
+    def parameters(self, request, start_response):
+        return self._json(
+            start_response,
+            200,
+            {
+                "opening_statement": "",
+                "suggested_questions": [],
+                "user_input_form": [],
+                "file_upload": {"image": {"enabled": False}},
+                "system_parameters": {"file_size_limit": 15, "image_file_size_limit": 10},
+            },
+        )
+
+    def meta(self, request, start_response):
+        return self._json(start_response, 200, {"tool_icons": {}})
+
+    # チャット
+    def chat_messages(self, request, start_response):
+        body = request["body"] or {}
+        conversation_id = body.get("conversation_id") or _new_id()
+        message_id = _new_id()
+        task_id = _new_id()
+        query = body.get("query", "")
+        self._query_latency(query)
+        rejected = self._process_attachments(body, start_response)
+        if rejected is not None:
+            return rejected
+        answer_tokens = [f"token{i} " for i in range(int(self.config["token_count"]))]
+
+        self.state.conversations.setdefault(
+            conversation_id, {"id": conversation_id, "name": "New conversation", "created_at": _now()}
+        )
+        message = {
+            "id": message_id,
+            "conversation_id": conversation_id,
+            "query": query,
+            "answer": "".join(answer_tokens),
+            "created_at": _now(),
+        }
+        self.state.messages.setdefault(conversation_id, []).append(message)
+
+        if body.get("response_mode") != "streaming":
+            for _ in answer_tokens:
+                self._token_pause()
+            return self._json(
+                start_response,
+                200,
+                {
+                    "event": "message",
+                    "task_id": task_id,
+                    "id": message_id,
+                    "message_id": message_id,
+                    "conversation_id": conversation_id,
+                    "mode": "advanced-chat",
+                    "answer": message["answer"],
+                    "metadata": {"usage": {"completion_tokens": len(answer_tokens)}},
+                    "created_at": message["created_at"],
+                },
+            )
+
+        def events():
+            run_id = _new_id()
+            common = {"conversation_id": conversation_id, "message_id": message_id, "task_id": task_id}
+            started = time.time()
+            yield {"event": "workflow_started", "workflow_run_id": run_id, **common, "data": {"id": run_id}}
+            if self.config["node_events"]:
+                yield from self._node_events(run_id, common)
+            for token in answer_tokens:
+                self._token_pause()
+                yield {"event": "message", "id": message_id, "answer": token, **common}
+            finished = {"status": "succeeded", "elapsed_time": time.time() - started}
+            yield {"event": "workflow_finished", "workflow_run_id": run_id, **common, "data": finished}
+            yield {"event": "message_end", "id": message_id, **common, "metadata": {}}
+
+        return self._stream(start_response, events())
+
+    def _node_events(self, run_id: str, common: dict):
+        """locust-chatflow-sandbox.yml と同じ 開始 → コード → 回答 のノードのイベント"""
+        for node_type in ("start", "code", "answer"):
+            node_id = _new_id()
+            started = time.time()
+            yield {"event": "node_started", "workflow_run_id": run_id, **common, "data": {"node_type": node_type}}
+            delay = self.config["node_overhead_ms"] + (self.config["sandbox_latency_ms"] if node_type == "code" else 0)
+            if delay > 0:
+                gevent.sleep(delay / 1000.0)
+            data = {"id": node_id, "node_type": node_type, "status": "succeeded", "elapsed_time": time.time() - started}
+            yield {"event": "node_finished", "workflow_run_id": run_id, **common, "data": data}
+
+    def list_messages(self, request, start_response):
+        query = request["query"]
+        messages = self.state.messages.get(query.get("conversation_id"), [])
+        limit = int(query.get("limit") or 20)
+        first_id = query.get("first_id")
+        # first_id より古いメッセージを新しい順に返す
+        end = len(messages)
+        if first_id:
+            for index, message in enumerate(messages):
+                if message["id"] == first_id:
+                    end = index
+                    break
+        start = max(0, end - limit)
+        return self._json(start_response, 200, {"limit": limit, "has_more": start > 0, "data": messages[start:end]})
+
+    def suggested(self, request, start_response):
+        return self._json(start_response, 200, {"result": "success", "data": ["a", "b", "c"]})
+
+    def list_conversations(self, request, start_response):
+        query = request["query"]
+        conversations = list(self.state.conversations.values())
+        limit = int(query.get("limit") or 20)
+        last_id = query.get("last_id")
+        start = 0
+        if last_id:
+            for index, conversation in enumerate(conversations):
+                if conversation["id"] == last_id:
+                    start = index + 1
+                    break
+        data = conversations[start : start + limit]
+        return self._json(
+            start_response, 200, {"limit": limit, "has_more": start + limit < len(conversations), "data": data}
+        )
+
+    def rename_conversation(self, request, start_response):
+        conversation = self.state.conversations.get(request["params"]["conversation_id"])
+        if conversation is None:
+            return self._json(start_response, 404, {"code": "not_found", "message": "Conversation Not Exists."})
+        conversation["name"] = (request["body"] or {}).get("name", conversation["name"])
+        return self._json(start_response, 200, conversation)
+
+    def delete_conversation(self, request, start_response):
+        conversation_id = request["params"]["conversation_id"]
+        self.state.conversations.pop(conversation_id, None)
+        self.state.messages.pop(conversation_id, None)
+        return self._json(start_response, 200, {"result": "success"})
+
+    # ワークフロー
+    def _finish_run(self, run: dict, status: str):
+        if run["status"] == "running":
+            run["status"] = status
+            run["finished_at"] = _now()
+            run["elapsed_time"] = time.time() - run["started"]
+
+    def _refresh_run(self, run: dict):
+        duration = self.config["run_duration_ms"] / 1000.0
+        if run["status"] == "running" and time.time() - run["started"] >= duration:
+            self._finish_run(run, "succeeded")
+
+    def run_workflow(self, request, start_response):
+        body = request["body"] or {}
+        self._query_latency((body.get("inputs") or {}).get("query", ""))
+        rejected = self._process_attachments(body, start_response)
+        if rejected is not None:
+            return rejected
+        run_id = _new_id()
+        task_id = _new_id()
+        run = {
+            "id": run_id,
+            "workflow_id": "mock-workflow",
+            "task_id": task_id,
+            "status": "running",
+            "inputs": body.get("inputs", {}),
+            "outputs": {"result": (body.get("inputs") or {}).get("query", "")},
+            "error": None,
+            "total_steps": 2,
+            "total_tokens": 0,
+            "created_at": _now(),
+            "finished_at": None,
+            "elapsed_time": 0,
+            "started": time.time(),
+        }
+        self.state.workflow_runs[run_id] = run
+        self.state.tasks[task_id] = run_id
+        duration = self.config["run_duration_ms"] / 1000.0
+
+        if body.get("response_mode") != "streaming":
+            if duration > 0:
+                gevent.sleep(duration)
+            self._finish_run(run, "succeeded")
+            return self._json(
+                start_response,
+                200,
+                {"workflow_run_id": run_id, "task_id": task_id, "data": _public_run(run)},
+            )
+
+        def events():
+            common = {"task_id": task_id, "workflow_run_id": run_id}
+            yield {"event": "workflow_started", **common, "data": {"id": run_id, "created_at": run["created_at"]}}
+            yield {"event": "node_started", **common, "data": {"node_id": "start", "node_type": "start"}}
+            # 実行時間をトークン配信と同じ刻みで消化し、停止要求を反映できるようにする
+            deadline = run["started"] + duration
+            while run["status"] == "running" and time.time() < deadline:
+                gevent.sleep(min(0.05, max(0.0, deadline - time.time())))
+            self._finish_run(run, "succeeded")
+            yield {"event": "node_finished", **common, "data": {"node_id": "end", "status": run["status"]}}
+            yield {"event": "workflow_finished", **common, "data": _public_run(run)}
+
+        return self._stream(start_response, events())
+
+    def get_workflow_run(self, request, start_response):
+        run = self.state.workflow_runs.get(request["params"]["run_id"])
+        if run is None:
+            return self._json(start_response, 404, {"code": "not_found", "message": "Workflow run not found"})
+        self._refresh_run(run)
+        return self._json(start_response, 200, _public_run(run))
+
+    def stop_workflow(self, request, start_response):
+        run_id = self.state.tasks.get(request["params"]["task_id"])
+        run = self.state.workflow_runs.get(run_id) if run_id else None
+        if run is not None:
+            delay = self.config["stop_latency_ms"] / 1000.0
+            if delay > 0:
+                gevent.spawn_later(delay, self._finish_run, run, "stopped")
+            else:
+                self._finish_run(run, "stopped")
+        return self._json(start_response, 200, {"result": "success"})
+
+    def workflow_logs(self, request, start_response):
+        query = request["query"]
+        page = int(query.get("page") or 1)
+        limit = int(query.get("limit") or 20)
+        runs = list(self.state.workflow_runs.values())
+        data = [{"id": run["id"], "workflow_run": _public_run(run)} for run in runs[(page - 1) * limit : page * limit]]
+        return self._json(
+            start_response,
+            200,
+            {"page": page, "limit": limit, "total": len(runs), "has_more": page * limit < len(runs), "data": data},
+        )
+
+    # ナレッジ
+    def create_dataset(self, request, start_response):
+        body = request["body"] or {}
+        dataset_id = _new_id()
+        self.state.datasets[dataset_id] = {"id": dataset_id, "name": body.get("name", dataset_id), "created_at": _now()}
+        self.state.documents[dataset_id] = []
+        return self._json(start_response, 200, self.state.datasets[dataset_id])
+
+    def delete_dataset(self, request, start_response):
+        dataset_id = request["params"]["dataset_id"]
+        self.state.datasets.pop(dataset_id, None)
+        self.state.documents.pop(dataset_id, None)
+        return self._json(start_response, 204, None)
+
+    def create_document(self, request, start_response):
+        dataset_id = request["params"]["dataset_id"]
+        if dataset_id not in self.state.datasets:
+            return self._json(start_response, 404, {"code": "not_found", "message": "Dataset not found"})
+        body = request["body"] or {}
+        document = {
+            "id": _new_id(),
+            "name": body.get("name", "upload.txt"),
+            "indexing_status": "completed",
+            "created_at": _now(),
+        }
+        self.state.documents[dataset_id].append(document)
+        self.state.segments[document["id"]] = []
+        return self._json(start_response, 200, {"document": document, "batch": _new_id()})
+
+    def list_documents(self, request, start_response):
+        query = request["query"]
+        page = int(query.get("page") or 1)
+        limit = int(query.get("limit") or 20)
+        documents = self.state.documents.get(request["params"]["dataset_id"], [])
+        data = documents[(page - 1) * limit : page * limit]
+        return self._json(
+            start_response,
+            200,
+            {
+                "data": data,
+                "has_more": page * limit < len(documents),
+                "limit": limit,
+                "total": len(documents),
+                "page": page,
+            },
+        )
+
+    def indexing(self, request, start_response):
+        return self._json(
+            start_response,
+            200,
+            {"data": [{"id": request["params"]["batch"], "indexing_status": "completed"}]},
+        )
+
+    def _index_segment(self, segment: dict, content: Optional[str]):
+        """検索に反映される内容を segment_index_delay_ms 後に content に切り替える (None は削除)
+
+        検索はキーワードの完全一致のみで、キーワード毎にチャンクを引けるようにしておく。
+        """
+        visible_from = time.time() + self.config["segment_index_delay_ms"] / 1000.0
+        segment.setdefault("index", []).append((visible_from, content))
+        for keyword in segment["keywords"]:
+            matches = self.state.keywords.setdefault(keyword, [])
+            if segment not in matches:
+                matches.append(segment)
+
+    def segments(self, request, start_response):
+        segments = self.state.segments.setdefault(request["params"]["document_id"], [])
+        created = []
+        for segment in (request["body"] or {}).get("segments", []):
+            created.append(
+                {
+                    "id": _new_id(),
+                    "dataset_id": request["params"]["dataset_id"],
+                    "content": segment.get("content", ""),
+                    "keywords": segment.get("keywords", []),
+                }
+            )
+            self._index_segment(created[-1], created[-1]["content"])
+        segments.extend(created)
+        data = [_public_segment(segment) for segment in created]
+        return self._json(start_response, 200, {"data": data, "doc_form": "text_model"})
+
+    def _find_segment(self, request) -> Optional[dict]:
+        segments = self.state.segments.get(request["params"]["document_id"], [])
+        return next((segment for segment in segments if segment["id"] == request["params"]["segment_id"]), None)
+
+    def update_segment(self, request, start_response):
+        segment = self._find_segment(request)
+        if segment is None or segment.get("deleted"):
+            return self._json(start_response, 404, {"code": "not_found", "message": "Segment not found"})
+        update = (request["body"] or {}).get("segment") or {}
+        segment["content"] = update.get("content", segment["content"])
+        segment["keywords"] = update.get("keywords", segment["keywords"])
+        self._index_segment(segment, segment["content"])
+        return self._json(start_response, 200, {"data": _public_segment(segment), "doc_form": "text_model"})
+
+    def delete_segment(self, request, start_response):
+        segment = self._find_segment(request)
+        if segment is None or segment.get("deleted"):
+            return self._json(start_response, 404, {"code": "not_found", "message": "Segment not found"})
+        segment["deleted"] = True
+        self._index_segment(segment, None)
+        return self._json(start_response, 204, None)
+
+    def retrieve(self, request, start_response):
+        query = (request["body"] or {}).get("query", "")
+        self._query_latency(query)
+        now = time.time()
+        records = []
+        for segment in self.state.keywords.get(query, []):
+            if segment["dataset_id"] != request["params"]["dataset_id"]:
+                continue
+            # 反映済みの最新の内容 (削除済みの場合は None) で検索する
+            visible = [content for visible_from, content in segment["index"] if visible_from <= now]
+            if visible and visible[-1] is not None and query in visible[-1]:
+                records.append({"segment": {"id": segment["id"], "content": visible[-1]}, "score": 1.0})
+        return self._json(start_response, 200, {"query": {"content": query}, "records": records})
+
+    # ファイル
+    def upload_file(self, request, start_response):
+        file_id = _new_id()
+        self.state.files[file_id] = {"id": file_id, "created_at": _now()}
+        return self._json(
+            start_response,
+            201,
+            {"id": file_id, "name": "upload", "size": 0, "extension": "", "mime_type": "", "created_at": _now()},
+        )
+
+    # 音声
+    def audio_to_text(self, request, start_response):
+        seconds = request["length"] / AUDIO_BYTES_PER_SECOND
+        if self.config["audio_to_text_rtf"] > 0:
+            gevent.sleep(seconds * self.config["audio_to_text_rtf"])
+        return self._json(start_response, 200, {"text": f"mock transcription of {seconds:.1f} seconds"})
+
+    def text_to_audio(self, request, start_response):
+        """MP3 (128kbps) のフレームを、生成時間に合わせた間隔で1秒分ずつ返す"""
+        text = (request["body"] or {}).get("text", "")
+        seconds = len(text) * self.config["text_to_audio_seconds_per_char"]
+        frames = max(1, int(seconds * MP3_FRAMES_PER_SECOND))
+        if self.config["text_to_audio_first_byte_ms"] > 0:
+            gevent.sleep(self.config["text_to_audio_first_byte_ms"] / 1000.0)
+
+        def chunks():
+            self.stats.stream_opened()
+            try:
+                for start in range(0, frames, MP3_FRAMES_PER_SECOND):
+                    count = min(MP3_FRAMES_PER_SECOND, frames - start)
+                    yield MP3_FRAME * count
+                    if self.config["text_to_audio_rtf"] > 0 and start + count < frames:
+                        gevent.sleep(count / MP3_FRAMES_PER_SECOND * self.config["text_to_audio_rtf"])
+            finally:
+                self.stats.stream_closed()
+
+        start_response(STATUS_TEXT[200], [("Content-Type", "audio/mpeg")])
+        return chunks()
+
+    # Sandbox
+    def sandbox_run(self, request, start_response):
+        if self.config["sandbox_latency_ms"] > 0:
+            gevent.sleep(self.config["sandbox_latency_ms"] / 1000.0)
+        return self._json(
+            start_response, 200, {"code": 0, "message": "success", "data": {"error": "", "stdout": "{}\n"}}
+        )
+
+
+def _public_segment(segment: dict) -> dict:
+    return {key: segment[key] for key in ("id", "content", "keywords")}
+
+
+def _public_run(run: dict) -> dict:
+    return {key: value for key, value in run.items() if key != "started"}
+
+
+def _parse_query(query_string: str) -> dict:
+    from urllib.parse import parse_qsl
+
+    return dict(parse_qsl(query_string))
+
+
+def _content_length(environ) -> int:
+    try:
+        return int(environ.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return 0
+
+
+def _read_body(environ) -> Optional[dict]:
+    """JSON ボディの読み込み (multipart 等は読み捨てる)"""
+    length = _content_length(environ)
+    raw = environ["wsgi.input"].read(length) if length else environ["wsgi.input"].read()
+    if not raw or not environ.get("CONTENT_TYPE", "").startswith("application/json"):
+        return None
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+
+
+class _NoDelayWSGIServer(WSGIServer):
+    """応答のヘッダーと本文が別セグメントになっても遅延 ACK で待たされないよう Nagle を無効化"""
+
+    def handle(self, sock, address):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().handle(sock, address)
+
+
+class MockDifyServer:
+    """モックアプリケーションを gevent の WSGI サーバーで起動する"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8800, config: Optional[dict] = None):
+        self.app = MockDifyApp(config)
+        self.server = _NoDelayWSGIServer((host, port), self.app, log=None, error_log=None)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.address[:2]
+        return f"http://{host}:{port}{self.app.prefix}"
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.stop()
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Dify API / Sandbox mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    for key, value in DEFAULT_CONFIG.items():
+        # bool("False") は True になるため、真偽値は文字列で判定する
+        kind = (lambda text: text.lower() in ("1", "true", "yes")) if isinstance(value, bool) else type(value)
+        parser.add_argument(f"--{key.replace('_', '-')}", type=kind, default=value)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    server = MockDifyServer(args.host, args.port, config)
+    print(f"Mock Dify server listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,47 @@
+"""テスト結果の比較レポート生成
+
+2 つ以上の結果 (Locust の --csv 出力またはリクエスト単位ログ) を比較し、
+エンドポイント毎のパーセンタイル・スループットの差分と有意差を単一の HTML / Markdown に出力する。
+先頭の結果がベースラインとなる。
+
+使い方:
+    python report.py dify-0.11.2=results/old dify-0.12.0=results/new --output report.html
+    python report.py old=csv/run_a new=csv/run_b --format markdown --output report.md
+"""
+
+import argparse
+import os
+
+from utils.report import load_results, render_html, render_markdown
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare load test result sets")
+    parser.add_argument("results", nargs="+", help="label=path (Locust CSV prefix/directory or result log directory)")
+    parser.add_argument("--output", default="report.html")
+    parser.add_argument("--format", choices=["html", "markdown"], help="defaults to the output file extension")
+    parser.add_argument("--bin-seconds", type=float, default=10.0, help="time bucket for result logs")
+    parser.add_argument("--alpha", type=float, default=0.05, help="significance level")
+    parser.add_argument("--include-warmup", action="store_true", help="keep requests recorded before warm-up ended")
+    args = parser.parse_args()
+
+    if len(args.results) < 2:
+        parser.error("at least two result sets are required")
+
+    result_sets = [load_results(spec, args.bin_seconds, args.include_warmup) for spec in args.results]
+    output_format = args.format or ("markdown" if args.output.endswith(".md") else "html")
+
+    if output_format == "markdown":
+        chart_dir = os.path.dirname(os.path.abspath(args.output))
+        prefix = os.path.splitext(os.path.basename(args.output))[0]
+        content = render_markdown(result_sets, args.alpha, chart_dir, prefix)
+    else:
+        content = render_html(result_sets, args.alpha)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(content)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
-from locust import TaskSet, task
 import json
 import os
 from typing import Optional
+from tasks.base import UserTasks
+from utils.errors import ErrorAggregator
+from utils.overload import SHED_STATUS_CODES, RequestShed
 
 
-class APITasks(TaskSet):
+class APITasks(UserTasks):
     """API共通処理とユーティリティ機能を提供するクラス"""
 
+    __slots__ = ("user_id",)
+
     def __init__(self, parent):
         super().__init__(parent)
         self.user_id = f"test_user_{parent.host}"
@@ -23,13 +27,17 @@ class APITasks(TaskSet):
                 response.failure(f"Invalid JSON response in {task_name}")
                 return None
 
+        # 過負荷による拒否はエラーと区別して集計する
+        if status_code in SHED_STATUS_CODES:
+            response.failure(RequestShed(status_code))
+            return None
+
         # エラーレスポンスの処理
         error_messages = {
             400: "Bad Request",
             401: "Unauthorized",
             403: "Forbidden",
             404: "Not Found",
-            429: "Too Many Requests",
             500: "Internal Server Error",
         }
 
@@ -38,23 +46,10 @@ class APITasks(TaskSet):
         return None
 
     def log_error(self, task_name: str, error: Exception):
-        """エラーログの記録"""
-        error_message = f"{task_name} error: {str(error)}"
-        print(error_message)
-
-        # エラーメトリクスの記録
-        self.user.environment.events.request.fire(
-            request_type="ERROR",
-            name=task_name,
-            response_time=0,
-            response_length=0,
-            exception=error,
-            context={},  # 追加のコンテキスト情報が必要な場合
-            user=self.user,
-        )
-
-    @task(1)
+        """エラーの記録 (種類毎に集計し、ログへの出力はまとめて行う)"""
+        ErrorAggregator.of(self.user.environment).record(task_name, error)
+
     def health_check(self):
         """API健全性チェック"""
-        with self.client.get("/", name="/health-check") as response:
+        with self.client.get("/", name="/health-check", catch_response=True) as response:
             self.handle_response(response, "health_check")
@@ -0,0 +1,39 @@
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping, Tuple
+
+_shared_headers: Dict[Tuple[Tuple[str, str], ...], Mapping[str, str]] = {}
+
+
+def shared_headers(headers: Dict[str, str]) -> Mapping[str, str]:
+    """同じ内容のヘッダーを全ユーザーで共有する読み取り専用の dict として返す"""
+    key = tuple(sorted(headers.items()))
+    shared = _shared_headers.get(key)
+    if shared is None:
+        shared = _shared_headers[key] = MappingProxyType(dict(headers))
+    return shared
+
+
+@lru_cache(maxsize=None)
+def bearer_headers(api_key: str) -> Mapping[str, str]:
+    """Dify API の認証ヘッダー (API キー毎に1つ)"""
+    return shared_headers({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+
+
+class UserTasks:
+    """ユーザーが保持する機能毎の処理の基底クラス
+
+    locust の TaskSet はスケジューラのキューや待ち時間の設定をインスタンス毎に持つが、
+    各機能はユーザーのタスクから直接呼び出すため、ユーザーへの参照のみを持つ。
+    実行の比率は locustfile.py のユーザークラスの @task で指定し、ここでは重みを持たない。
+    サブクラスも __slots__ で状態を宣言し、インスタンス毎の __dict__ を持たない。
+    """
+
+    __slots__ = ("user",)
+
+    def __init__(self, parent):
+        self.user = parent.user if isinstance(parent, UserTasks) else parent
+
+    @property
+    def client(self):
+        return self.user.client
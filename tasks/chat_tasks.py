@@ -1,38 +1,48 @@
-from locust import TaskSet, task
-import json
 import time
-from typing import Optional
+from typing import List, Optional
+from tasks.base import UserTasks, bearer_headers
+from utils.queries import QueryMix
+from utils.streaming import iter_sse_events
 
 
-class ChatTasks(TaskSet):
+class ChatTasks(UserTasks):
     """チャット関連APIのテストタスク"""
 
+    __slots__ = ("api", "headers", "conversation_id", "message_id", "turn")
+
     def __init__(self, parent, api_key):
         super().__init__(parent)
         self.api = parent.api  # APITasksのインスタンス
-        self.api_key = api_key
-        self.headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        self.headers = bearer_headers(api_key)
         self.conversation_id = None
         self.message_id = None
+        self.turn = 0  # 現在の会話でのメッセージ数
 
-    def _send_chat_message(self, response_mode: str):
-        """チャットメッセージの送信テスト"""
+    def _send_chat_message(self, response_mode: str, files: Optional[List[dict]] = None):
+        """チャットメッセージの送信テスト (files: 添付するアップロード済みファイル、統計は添付無しと分ける)"""
         assert response_mode in ["streaming", "blocking"]
+        self.turn = self.turn + 1 if self.conversation_id else 1
+        query, kind = QueryMix.of(self.user.environment).query("chat", "What time is it now?")
+        context = {"mode": response_mode, "turn": self.turn}
+        if kind:
+            context["query"] = kind
         payload = {
             "inputs": {},
-            "query": "What time is it now?",
+            "query": query,
             "response_mode": response_mode,  # blocking or streaming
             "conversation_id": self.conversation_id,
             "user": self.api.user_id,
-            "files": [],  # ファイル添付がある場合に使用
+            "files": files or [],
         }
 
         with self.client.post(
             "/chat-messages",
             json=payload,
             headers=self.headers,
-            name="Chatflow /chat-messages",
+            name="Chatflow /chat-messages (files)" if files else "Chatflow /chat-messages",
             stream=(response_mode == "streaming"),
+            context=context,
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 if response_mode == "streaming":
@@ -43,35 +53,28 @@ class ChatTasks(TaskSet):
                         self.conversation_id = data["conversation_id"]
                     if data.get("message_id"):
                         self.message_id = data["message_id"]
+        return response
 
     def _stream_processor(self, response) -> dict:
         """ストリーミングレスポンスの処理"""
         conversation_id = None
         message_id = None
 
-        for line in response.iter_lines():
-            if line:
-                try:
-                    data = json.loads(line.decode("utf-8").replace("data: ", ""))
-                    if data.get("event") == "message_end":
-                        break
-                    if data.get("event") == "message":
-                        conversation_id = data["conversation_id"]
-                        message_id = data["message_id"]
-                except json.JSONDecodeError:
-                    continue
+        for data in iter_sse_events(response):
+            if data.get("event") == "message_end":
+                break
+            if data.get("event") == "message":
+                conversation_id = data["conversation_id"]
+                message_id = data["message_id"]
 
         return conversation_id, message_id
 
-    @task(3)
     def send_chat_message_streaming(self):
         return self._send_chat_message("streaming")
 
-    @task(2)
     def send_chat_message_blocking(self):
         return self._send_chat_message("blocking")
 
-    @task(2)
     def get_chat_history(self):
         """チャット履歴の取得テスト"""
         if not self.conversation_id:
@@ -79,10 +82,11 @@ class ChatTasks(TaskSet):
 
         params = {"user": self.api.user_id, "conversation_id": self.conversation_id, "first_id": None, "limit": 20}
 
-        with self.client.get("/messages", params=params, headers=self.headers, name="Chatflow /messages") as response:
+        with self.client.get(
+            "/messages", params=params, headers=self.headers, name="Chatflow /messages", catch_response=True
+        ) as response:
             self.api.handle_response(response, "get_chat_history")
 
-    @task(2)
     def get_suggested_questions(self):
         """推奨質問の取得テスト"""
         if not self.message_id:
@@ -95,10 +99,10 @@ class ChatTasks(TaskSet):
             params=params,
             headers=self.headers,
             name="Chatflow /messages/:message_id/suggested",
+            catch_response=True,
         ) as response:
             self.api.handle_response(response, "get_suggested_questions")
 
-    @task(1)
     def send_message_feedback(self):
         """メッセージフィードバックのテスト"""
         if not self.message_id:
@@ -111,10 +115,10 @@ class ChatTasks(TaskSet):
             json=payload,
             headers=self.headers,
             name="Chatflow /messages/:message_id/feedbacks",
+            catch_response=True,
         ) as response:
             self.api.handle_response(response, "send_message_feedback")
 
-    @task(2)
     def get_conversation_history(self):
         """会話履歴の取得テスト"""
         if not self.conversation_id:
@@ -123,11 +127,10 @@ class ChatTasks(TaskSet):
         params = {"user": self.api.user_id, "last_id": None, "limit": 20}
 
         with self.client.get(
-            "/conversations", params=params, headers=self.headers, name="/messages/history"
+            "/conversations", params=params, headers=self.headers, name="/messages/history", catch_response=True
         ) as response:
             self.api.handle_response(response, "get_conversation_history")
 
-    @task(1)
     def rename_conversation(self):
         """会話名の変更テスト"""
         if not self.conversation_id:
@@ -140,10 +143,10 @@ class ChatTasks(TaskSet):
             json=payload,
             headers=self.headers,
             name="Chatflow /conversations/:conversation_id/name",
+            catch_response=True,
         ) as response:
             self.api.handle_response(response, "rename_conversation")
 
-    @task(1)
     def delete_conversation(self):
         """会話の削除テスト"""
         if not self.conversation_id:
@@ -156,26 +159,30 @@ class ChatTasks(TaskSet):
             json=payload,
             headers=self.headers,
             name="Chatflow /conversations/:conversation_id",
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 self.conversation_id = None
                 self.message_id = None
+                self.turn = 0
 
-    @task(1)
     def get_parameters(self) -> Optional[dict]:
         """アプリケーション情報を取得"""
         with self.client.get(
-            "/parameters", headers=self.headers, name="Chatflow /parameters", params={"user": self.api.user_id}
+            "/parameters",
+            headers=self.headers,
+            name="Chatflow /parameters",
+            params={"user": self.api.user_id},
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 return response.json()
             return None
 
-    @task(1)
     def get_meta(self) -> Optional[dict]:
         """アプリケーションのメタ情報を取得"""
         with self.client.get(
-            "/meta", headers=self.headers, name="Chatflow /meta", params={"user": self.api.user_id}
+            "/meta", headers=self.headers, name="Chatflow /meta", params={"user": self.api.user_id}, catch_response=True
         ) as response:
             if response.status_code == 200:
                 return response.json()
@@ -0,0 +1,77 @@
+import time
+from tasks.base import UserTasks, bearer_headers
+from utils.streaming import iter_sse_events
+
+
+class ChatflowSandboxTasks(UserTasks):
+    """コードノードを含むチャットフローの応答時間の分解
+
+    ストリーミングのノードのイベント (node_finished / workflow_finished の elapsed_time) から、
+    応答時間を次の要素に分けて request_type="OVERHEAD" のイベントとして記録する。
+        chatflow total          リクエストの送信からストリームの終了まで
+        chatflow api overhead   total - ワークフローの実行時間 (API の受付・SSE の配信など)
+        chatflow orchestration  ワークフローの実行時間 - コードノードの実行時間 (ノードの実行制御)
+        chatflow code node      コードノードの実行時間 (Sandbox の実行と Dify から Sandbox への呼び出し)
+    イベントに実行時間が含まれない場合は total のみ記録する。
+    """
+
+    __slots__ = ("api", "headers")
+
+    def __init__(self, parent, api_key):
+        super().__init__(parent)
+        self.api = parent.api
+        self.headers = bearer_headers(api_key)
+
+    def send_traced_message(self):
+        """新しい会話でメッセージを送信し、応答時間を分解して記録"""
+        payload = {
+            "inputs": {},
+            "query": "sandbox overhead",
+            "response_mode": "streaming",
+            "conversation_id": None,
+            "user": self.api.user_id,
+            "files": [],
+        }
+        workflow_elapsed = None
+        code_elapsed = None
+        started = time.time()
+        with self.client.post(
+            "/chat-messages",
+            json=payload,
+            headers=self.headers,
+            name="Chatflow /chat-messages (sandbox trace)",
+            stream=True,
+            catch_response=True,
+        ) as response:
+            if response.status_code != 200:
+                return
+            for data in iter_sse_events(response):
+                event = data.get("event")
+                details = data.get("data") or {}
+                if event == "node_finished" and details.get("node_type") == "code":
+                    code_elapsed = (code_elapsed or 0.0) + float(details.get("elapsed_time") or 0.0)
+                elif event == "workflow_finished":
+                    workflow_elapsed = details.get("elapsed_time")
+                elif event == "message_end":
+                    break
+        total = time.time() - started
+
+        self._fire("chatflow total", total)
+        if workflow_elapsed is None:
+            return
+        workflow_elapsed = float(workflow_elapsed)
+        self._fire("chatflow api overhead", total - workflow_elapsed)
+        if code_elapsed is not None:
+            self._fire("chatflow orchestration", workflow_elapsed - code_elapsed)
+            self._fire("chatflow code node", code_elapsed)
+
+    def _fire(self, name: str, seconds: float):
+        self.user.environment.events.request.fire(
+            request_type="OVERHEAD",
+            name=name,
+            response_time=max(seconds, 0.0) * 1000,
+            response_length=0,
+            exception=None,
+            context={},
+            user=self.user,
+        )
@@ -1,70 +1,95 @@
-from locust import TaskSet, task
 import os
 from mimetypes import guess_type
+from typing import List, Optional
+from tasks.base import UserTasks, bearer_headers
+from utils.audio import iter_audio_chunks
 
+TEST_FILES = {
+    "document": {"path": "test_files/sample.txt", "type": "document", "mime_type": "text/plain"},
+    "image": {"path": "test_files/sample.jpg", "type": "image", "mime_type": "image/jpeg"},
+    "audio": {"path": "test_files/sample.mp3", "type": "audio", "mime_type": "audio/mpeg"},
+}
 
-class FileTasks(TaskSet):
+
+class FileTasks(UserTasks):
     """ファイル操作関連APIのテストタスク"""
 
+    __slots__ = ("api", "headers", "uploaded_file_ids")
+    test_files = TEST_FILES  # 全ユーザーで共有
+
     def __init__(self, parent, api_key):
         super().__init__(parent)
         self.api = parent.api
-        self.api_key = api_key
-        self.headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
-        self.test_files = {
-            "document": {"path": "test_files/sample.txt", "type": "document", "mime_type": "text/plain"},
-            "image": {"path": "test_files/sample.jpg", "type": "image", "mime_type": "image/jpeg"},
-            "audio": {"path": "test_files/sample.mp3", "type": "audio", "mime_type": "audio/mpeg"},
-        }
+        self.headers = bearer_headers(api_key)
         self.uploaded_file_ids = {}
 
-    @task(3)
     def upload_document(self):
         """ドキュメントファイルのアップロード"""
         self._upload_file("document")
 
-    @task(2)
     def upload_image(self):
         """画像ファイルのアップロード"""
         self._upload_file("image")
 
-    @task(1)
     def upload_audio(self):
         """音声ファイルのアップロード"""
         self._upload_file("audio")
 
-    # @task(2)
-    # def audio_to_text(self):
-    #     """音声からテキストへの変換テスト"""
-    #     if not self.test_files["audio"]["path"]:
-    #         return
-
-    #     with open(self.test_files["audio"]["path"], "rb") as f:
-    #         files = {"file": ("audio.mp3", f, "audio/mpeg")}
-    #         data = {"user": self.api.user_id}
-
-    #         with self.client.post(
-    #             "/audio-to-text",
-    #             files=files,
-    #             data=data,
-    #             headers={"Authorization": self.headers["Authorization"]},
-    #             name="/audio-to-text",
-    #         ) as response:
-    #             self.api.handle_response(response, "audio_to_text")
-
-    # @task(2)
-    # def text_to_audio(self):
-    #     """テキストから音声への変換テスト"""
-    #     payload = {"text": "Hello, this is a test message for text to speech conversion.", "user": self.api.user_id}
-
-    #     with self.client.post("/text-to-audio", json=payload, headers=self.headers, name="/text-to-audio") as response:
-    #         self.api.handle_response(response, "text_to_audio")
-
-    def _upload_file(self, file_type: str):
-        """ファイルアップロードの共通処理"""
+    def audio_to_text(self, audio: bytes, filename: str, mime_type: str, audio_seconds: float, label: str = ""):
+        """音声からテキストへの変換 (audio_seconds: 音声の長さ、実時間係数の算出に使う)"""
+        files = {"file": (filename, audio, mime_type)}
+        data = {"user": self.api.user_id}
+
+        with self.client.post(
+            "/audio-to-text",
+            files=files,
+            data=data,
+            headers={"Authorization": self.headers["Authorization"]},
+            name=f"Audio /audio-to-text {label}".rstrip(),
+            context={"audio_seconds": audio_seconds},
+            catch_response=True,
+        ) as response:
+            self.api.handle_response(response, "audio_to_text")
+
+    def text_to_audio(self, text: str, label: str = ""):
+        """テキストから音声への変換 (応答の音声は全体をメモリに保持せず、受信しながら読み捨てる)"""
+        payload = {"text": text, "user": self.api.user_id, "streaming": True}
+
+        with self.client.post(
+            "/text-to-audio",
+            json=payload,
+            headers=self.headers,
+            name=f"Audio /text-to-audio {label}".rstrip(),
+            stream=True,
+            context={"chars": len(text)},
+            catch_response=True,
+        ) as response:
+            if response.status_code == 200:
+                for _ in iter_audio_chunks(response):
+                    pass
+            else:
+                self.api.handle_response(response, "text_to_audio")
+
+    def upload_attachments(self, file_types: List[str]) -> List[dict]:
+        """ファイルをアップロードし、チャット・ワークフローに添付する形式で返す (失敗したファイルは含めない)"""
+        attachments = []
+        for file_type in file_types:
+            file_id = self._upload_file(file_type)
+            if file_id:
+                attachments.append(
+                    {
+                        "type": self.test_files[file_type]["type"],
+                        "transfer_method": "local_file",
+                        "upload_file_id": file_id,
+                    }
+                )
+        return attachments
+
+    def _upload_file(self, file_type: str) -> Optional[str]:
+        """ファイルアップロードの共通処理 (アップロードしたファイルの ID を返す)"""
         file_info = self.test_files.get(file_type)
         if not file_info or not os.path.exists(file_info["path"]):
-            return
+            return None
 
         with open(file_info["path"], "rb") as f:
             files = {"file": (os.path.basename(file_info["path"]), f, file_info["mime_type"])}
@@ -76,13 +101,16 @@ class FileTasks(TaskSet):
                 data=data,
                 headers={"Authorization": self.headers["Authorization"]},
                 name=f"Files /files/upload-{file_type}",
+                context={"file_type": file_type},
+                catch_response=True,
             ) as response:
                 if response.status_code == 201:
                     file_id = response.json().get("id")
                     if file_id:
                         self.uploaded_file_ids[file_type] = file_id
-                else:
-                    self.api.log_error(f"file_upload_{file_type}", Exception(f"Upload failed: {response.status_code}"))
+                    return file_id
+                self.api.log_error(f"file_upload_{file_type}", Exception(f"Upload failed: {response.status_code}"))
+                return None
 
     def _validate_file_size(self, file_path: str) -> bool:
         """ファイルサイズの検証"""
@@ -112,13 +140,8 @@ class FileTasks(TaskSet):
             # 画像アップロード
             self.upload_image()
 
-            # 音声ファイルの処理
+            # 音声ファイルの処理 (音声→テキスト・テキスト→音声の変換は DifyAudioUser で計測する)
             self.upload_audio()
-            # if self.uploaded_file_ids.get("audio"):
-            #     self.audio_to_text()
-
-            # テキスト→音声変換
-            # self.text_to_audio()
 
         except Exception as e:
             self.api.log_error("file_tasks", e)
@@ -1,23 +1,43 @@
 import uuid
 import time
-from locust import TaskSet, task
 import json
+from typing import Optional
+from tasks.base import UserTasks, bearer_headers
+from utils.coordination import LocalCoordinator
+from utils.queries import QueryMix
 
+DATASET_POOL = "datasets"
 
-class KnowledgeTasks(TaskSet):
+
+class KnowledgeTasks(UserTasks):
     """ナレッジベース関連APIのテストタスク"""
 
+    __slots__ = ("api", "headers", "dataset_id", "document_id", "segment_id", "batch_id")
+
     def __init__(self, parent, api_key):
         super().__init__(parent)
         self.api = parent.api
-        self.api_key = api_key
-        self.headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        self.headers = bearer_headers(api_key)
         self.dataset_id = None
         self.document_id = None
         self.segment_id = None
         self.batch_id = None
 
-    @task(3)
+    def acquire_knowledge_base(self):
+        """他のユーザーが使い終わったナレッジベースがあれば引き継ぎ、無ければ作成する"""
+        self.dataset_id = LocalCoordinator.of(self.user.environment).take(DATASET_POOL)
+        if not self.dataset_id:
+            self.create_knowledge_base()
+
+    def release_fixtures(self):
+        """使用中のナレッジベースをプールに戻す (全プロセスのユーザーで重複して作成しない)"""
+        if self.dataset_id:
+            LocalCoordinator.of(self.user.environment).release(DATASET_POOL, self.dataset_id)
+            self.dataset_id = None
+            self.document_id = None
+            self.segment_id = None
+            self.batch_id = None
+
     def create_knowledge_base(self):
         """空のナレッジベースを作成"""
         payload = {
@@ -28,20 +48,21 @@ class KnowledgeTasks(TaskSet):
             "provider": "vendor",
         }
 
-        with self.client.post("/datasets", json=payload, headers=self.headers, name="Knowledge /datasets") as response:
+        with self.client.post(
+            "/datasets", json=payload, headers=self.headers, name="Knowledge /datasets", catch_response=True
+        ) as response:
             if response.status_code == 200:
                 data = response.json()
                 self.dataset_id = data.get("id")
 
-    @task(3)
-    def create_document_by_text(self):
-        """テキストからドキュメントを作成"""
+    def create_document_by_text(self, text: Optional[str] = None):
+        """テキストからドキュメントを作成 (text を指定しない場合は短い固定の文章)"""
         if not self.dataset_id:
             return
 
         payload = {
             "name": "test_document.txt",
-            "text": "This is a test document content for load testing purposes.",
+            "text": text or "This is a test document content for load testing purposes.",
             "indexing_technique": "economy",
             "process_rule": {"mode": "automatic"},
         }
@@ -51,13 +72,13 @@ class KnowledgeTasks(TaskSet):
             json=payload,
             headers=self.headers,
             name="Knowledge /datasets/:dataset_id/document/create-by-text",
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 data = response.json()
                 self.document_id = data.get("document", {}).get("id")
                 self.batch_id = data.get("batch")
 
-    @task(2)
     def create_document_by_file(self):
         """ファイルからドキュメントを作成"""
         if not self.dataset_id:
@@ -76,13 +97,13 @@ class KnowledgeTasks(TaskSet):
             files=files,
             headers={"Authorization": self.headers["Authorization"]},
             name="Knowledge /datasets/:dataset_id/document/create-by-file",
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 data = response.json()
                 self.document_id = data.get("document", {}).get("id")
                 self.batch_id = data.get("batch")
 
-    @task(2)
     def get_documents(self):
         """ドキュメント一覧の取得"""
         if not self.dataset_id:
@@ -95,10 +116,10 @@ class KnowledgeTasks(TaskSet):
             params=params,
             headers=self.headers,
             name="Knowledge /datasets/:dataset_id/documents",
+            catch_response=True,
         ) as response:
             self.api.handle_response(response, "get_documents")
 
-    @task(2)
     def check_indexing_status(self):
         """ドキュメントのインデックス状態確認"""
         if not all([self.dataset_id, self.batch_id]):
@@ -108,36 +129,37 @@ class KnowledgeTasks(TaskSet):
             f"/datasets/{self.dataset_id}/documents/{self.batch_id}/indexing-status",
             headers=self.headers,
             name="Knowledge /datasets/:dataset_id/documents/:batch_id/indexing-status",
+            catch_response=True,
         ) as response:
             self.api.handle_response(response, "check_indexing_status")
 
-    def wait_for_indexing_complete(self):
+    def wait_for_indexing_complete(self, timeout: float = 1):
+        """インデックスの完了を1秒毎に確認し、timeout 秒を過ぎても完了しない場合は False"""
         if not all([self.dataset_id, self.batch_id]):
             return True
 
-        counter = 10
+        deadline = time.time() + timeout
         while True:
             with self.client.get(
                 f"/datasets/{self.dataset_id}/documents/{self.batch_id}/indexing-status",
                 headers=self.headers,
                 name="Knowledge /datasets/:dataset_id/documents/:batch_id/indexing-status",
+                catch_response=True,
             ) as response:
                 if response.json()["data"][0]["indexing_status"] == "completed":
                     return True
-                if counter > 10:
+                if time.time() >= deadline:
                     return False
-                else:
-                    counter += 1
-                    time.sleep(1)
+                time.sleep(1)
 
-    @task(3)
     def retrieve_knowledge(self):
         """ナレッジベースからの情報検索"""
         if not self.dataset_id:
             return
 
+        query, kind = QueryMix.of(self.user.environment).query("retrieve", "test")
         payload = {
-            "query": "test",
+            "query": query,
             "retrieval_model": {
                 "search_method": "keyword_search",
                 "reranking_enable": False,
@@ -152,10 +174,11 @@ class KnowledgeTasks(TaskSet):
             json=payload,
             headers=self.headers,
             name="Knowledge /datasets/:dataset_id/retrieve",
+            context={"query": kind} if kind else {},
+            catch_response=True,
         ) as response:
             self.api.handle_response(response, "retrieve_knowledge")
 
-    @task(1)
     def add_segments(self):
         """ドキュメントにチャンクを追加"""
         if not all([self.dataset_id, self.document_id]):
@@ -168,13 +191,13 @@ class KnowledgeTasks(TaskSet):
             json=payload,
             headers=self.headers,
             name="Knowledge /datasets/:dataset_id/documents/:document_id/segments",
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 data = response.json()
                 if data.get("data"):
                     self.segment_id = data["data"][0].get("id")
 
-    @task(1)
     def delete_document(self):
         """ドキュメントの削除"""
         if not all([self.dataset_id, self.document_id]):
@@ -184,19 +207,22 @@ class KnowledgeTasks(TaskSet):
             f"/datasets/{self.dataset_id}/documents/{self.document_id}",
             headers=self.headers,
             name="Knowledge /datasets/:dataset_id/documents/:document_id",
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 self.document_id = None
                 self.segment_id = None
 
-    @task(1)
     def delete_knowledge_base(self):
         """ナレッジベースの削除"""
         if not self.dataset_id:
             return
 
         with self.client.delete(
-            f"/datasets/{self.dataset_id}", headers=self.headers, name="Knowledge /datasets/:dataset_id"
+            f"/datasets/{self.dataset_id}",
+            headers=self.headers,
+            name="Knowledge /datasets/:dataset_id",
+            catch_response=True,
         ) as response:
             if response.status_code == 204:
                 self.dataset_id = None
@@ -208,7 +234,7 @@ class KnowledgeTasks(TaskSet):
         try:
             # ナレッジベース作成
             if not self.dataset_id:
-                self.create_knowledge_base()
+                self.acquire_knowledge_base()
 
             if self.dataset_id:
                 # ドキュメント作成
@@ -0,0 +1,94 @@
+import time
+from typing import List
+from tasks.base import UserTasks
+from tasks.chat_tasks import ChatTasks
+from tasks.file_tasks import FileTasks
+from tasks.workflow_tasks import WorkflowTasks
+
+
+class MultimodalTasks(UserTasks):
+    """ファイルをアップロードし、そのファイルを添付してチャット・ワークフローを実行するパイプライン
+
+    添付ファイルの処理による遅延を分離するため、段階毎の時間を request_type="PIPELINE" のイベントとして記録する。
+        upload       添付する全ファイルのアップロード
+        first token  添付付きリクエストの送信から最初のトークンまで
+        completion   添付付きリクエストの送信から応答の完了まで
+    アップロードしたファイルはアプリ毎に使うため、チャットとワークフローでそれぞれのアプリの API キーでアップロードする。
+    """
+
+    __slots__ = ("api", "chat", "workflow", "chat_files", "workflow_files", "file_types", "workflow_input")
+
+    def __init__(
+        self,
+        parent,
+        chat_api_key: str,
+        workflow_api_key: str,
+        file_types: List[str] = ("document", "image", "audio"),
+        workflow_input: str = "",
+    ):
+        super().__init__(parent)
+        self.api = parent.api
+        self.chat = ChatTasks(parent, chat_api_key)
+        self.workflow = WorkflowTasks(parent, workflow_api_key)
+        self.chat_files = FileTasks(parent, chat_api_key)
+        self.workflow_files = FileTasks(parent, workflow_api_key)
+        self.file_types = list(file_types)
+        self.workflow_input = workflow_input  # ファイルを渡すワークフローの入力変数名 (空の場合は sys.files)
+
+    def chat_with_attachments(self):
+        """ファイルをアップロードし、添付して新しい会話でメッセージを送信"""
+        started = time.time()
+        files = self.chat_files.upload_attachments(self.file_types)
+        if not files:
+            return
+        self._fire_stage("Multimodal chat upload", time.time() - started, len(files))
+
+        self.chat.conversation_id = None
+        response = self.chat._send_chat_message("streaming", files)
+        self._fire_response_stages("Multimodal chat", response, len(files))
+
+    def workflow_with_attachments(self):
+        """ファイルをアップロードし、添付してワークフローを実行"""
+        started = time.time()
+        files = self.workflow_files.upload_attachments(self.file_types)
+        if not files:
+            return
+        self._fire_stage("Multimodal workflow upload", time.time() - started, len(files))
+
+        response = self.workflow.run_workflow_streaming(files, self.workflow_input)
+        self._fire_response_stages("Multimodal workflow", response, len(files))
+
+    def _fire_response_stages(self, prefix: str, response, file_count: int):
+        """添付付きリクエストの最初のトークンまでと完了までの時間 (失敗した場合は記録しない)
+
+        ストリーミングの response_time は応答ヘッダーまでの時間のため、完了はストリームを読み終えた時刻から求める。
+        """
+        completed = time.time()
+        request_meta = getattr(response, "request_meta", None)
+        if not request_meta or request_meta.get("exception") or response.status_code != 200:
+            return
+        if request_meta.get("ttft") is not None:
+            self._fire_stage(f"{prefix} first token", request_meta["ttft"] / 1000, file_count)
+        self._fire_stage(f"{prefix} completion", completed - request_meta["start_time"], file_count)
+
+    def _fire_stage(self, name: str, seconds: float, file_count: int):
+        self.user.environment.events.request.fire(
+            request_type="PIPELINE",
+            name=name,
+            response_time=seconds * 1000,
+            response_length=0,
+            exception=None,
+            context={"files": file_count},
+            user=self.user,
+        )
+
+    def perform_multimodal_tasks(self):
+        """アップロードから添付付きのチャット・ワークフローまでの一連の実行"""
+        try:
+            self.chat_with_attachments()
+        except Exception as e:
+            self.api.log_error("multimodal_chat", e)
+        try:
+            self.workflow_with_attachments()
+        except Exception as e:
+            self.api.log_error("multimodal_workflow", e)
@@ -1,33 +1,22 @@
-from locust import TaskSet, task
-from typing import Dict, Any
+import yaml
+from tasks.base import UserTasks, shared_headers
+from utils.errors import ErrorAggregator
+from utils.overload import SHED_STATUS_CODES
 
+CHATFLOW_SANDBOX_DSL = "dify/dsl/locust-chatflow-sandbox.yml"
 
-class SandboxTasks(TaskSet):
-    """Sandbox関連APIのテストタスク"""
-
-    def __init__(self, parent, api_key):
-        super().__init__(parent)
-        self.api_key = api_key
-        self.headers = {
-            "Content-Type": "application/json",
-            "X-Api-Key": self.api_key,
-        }
-        self.test_codes = self._initialize_test_codes()
-
-    def _initialize_test_codes(self) -> Dict[str, Dict[str, Any]]:
-        """テストコードの初期化"""
-        return {
-            "simple": {
-                "code": """
+TEST_CODES = {
+    "simple": {
+        "code": """
 def main() -> dict:
    return {"result": "Hello World"}
 print(main())
-               """,
-                "name": "simple_execution",
-                "enable_network": False,
-            },
-            "cpu_intensive": {
-                "code": """
+       """,
+        "name": "simple_execution",
+        "enable_network": False,
+    },
+    "cpu_intensive": {
+        "code": """
 def main() -> dict:
    # CPU負荷のかかる処理
    result = 0
@@ -35,68 +24,96 @@ def main() -> dict:
        result += i
    return {"result": str(result)}
 print(main())
-               """,
-                "name": "cpu_intensive",
-                "enable_network": False,
-            },
-            "memory_intensive": {
-                "code": """
+       """,
+        "name": "cpu_intensive",
+        "enable_network": False,
+    },
+    "memory_intensive": {
+        "code": """
 def main() -> dict:
    # メモリを大量に使用する処理
    large_list = list(range(1000))
    return {"result": str(len(large_list))}
 print(main())
-               """,
-                "name": "memory_intensive",
-                "enable_network": False,
-            },
-            "network_operation": {
-                "code": """
+       """,
+        "name": "memory_intensive",
+        "enable_network": False,
+    },
+    "network_operation": {
+        "code": """
 import json
 def main() -> dict:
    data = {"test": "data"}
    return json.dumps(data)
 print(main())
-               """,
-                "name": "network_operation",
-                "enable_network": True,
-            },
-        }
+       """,
+        "name": "network_operation",
+        "enable_network": True,
+    },
+}
+
+# リクエストのペイロードはテストコード毎に1つだけ作り、全ユーザーで共有する (preload は送らない)
+PAYLOADS = {
+    key: {"language": "python3", "code": case["code"].strip(), "enable_network": case["enable_network"]}
+    for key, case in TEST_CODES.items()
+}
+
+
+def code_node_payload(path: str = CHATFLOW_SANDBOX_DSL) -> dict:
+    """DSL の最初のコードノードと同じコードを /sandbox/run で直接実行するペイロード
+
+    Dify はコードノードのコードを main() を呼び出して結果を出力するテンプレートで包んで実行するため、同様に main() の結果を出力する。
+    """
+    with open(path, encoding="utf-8") as f:
+        dsl = yaml.safe_load(f)
+    for node in dsl["workflow"]["graph"]["nodes"]:
+        data = node.get("data") or {}
+        if data.get("type") == "code":
+            code = data["code"].rstrip() + "\nprint(main())"
+            return {"language": data.get("code_language", "python3"), "code": code, "enable_network": False}
+    raise ValueError(f"No code node in {path}")
+
+
+class SandboxTasks(UserTasks):
+    """Sandbox関連APIのテストタスク"""
+
+    __slots__ = ("headers",)
+    test_codes = TEST_CODES  # 全ユーザーで共有
+
+    def __init__(self, parent, api_key):
+        super().__init__(parent)
+        self.headers = shared_headers({"Content-Type": "application/json", "X-Api-Key": api_key})
 
-    @task(3)
     def execute_simple_code(self):
         """シンプルなコード実行のテスト"""
-        self._execute_code(self.test_codes["simple"])
+        self._execute_code("simple")
 
-    @task(2)
     def execute_cpu_intensive_code(self):
         """CPU負荷の高いコード実行のテスト"""
-        self._execute_code(self.test_codes["cpu_intensive"])
+        self._execute_code("cpu_intensive")
 
-    @task(2)
     def execute_memory_intensive_code(self):
         """メモリ使用量の多いコード実行のテスト"""
-        self._execute_code(self.test_codes["memory_intensive"])
+        self._execute_code("memory_intensive")
 
-    @task(1)
     def execute_network_code(self):
         """ネットワークアクセスを伴うコード実行のテスト"""
-        self._execute_code(self.test_codes["network_operation"])
+        self._execute_code("network_operation")
+
+    def execute_payload(self, payload: dict, name: str):
+        """任意のペイロードのコード実行 (チャットフローのコードノードとの比較などに使う)"""
+        self._run(payload, f"Sandbox /sandbox/run_{name}")
 
-    def _execute_code(self, test_case: Dict[str, Any]):
+    def _execute_code(self, key: str):
         """コード実行の共通処理"""
-        payload = {
-            "language": "python3",
-            "code": test_case["code"].strip(),
-            # "preload": test_case.get("preload", ""),
-            "enable_network": test_case["enable_network"],
-        }
+        self._run(PAYLOADS[key], f"Sandbox /sandbox/run_{self.test_codes[key]['name']}")
 
+    def _run(self, payload: dict, name: str):
         with self.client.post(
             "/sandbox/run",
             json=payload,
             headers=self.headers,
-            name=f"Sandbox /sandbox/run_{test_case['name']}",
+            name=name,
             catch_response=True,
         ) as response:
             if response.status_code == 200:
@@ -113,7 +130,7 @@ print(main())
                     response.failure(f"Execution error: {result['data']['error']}")
                     return
 
-            else:
+            elif response.status_code not in SHED_STATUS_CODES:  # 拒否はクライアント側で RequestShed として計上される
                 response.failure(f"Request failed: {response.status_code}")
 
     def perform_sandbox_tasks(self):
@@ -130,4 +147,4 @@ print(main())
             self.execute_network_code()
 
         except Exception as e:
-            print(f"Sandbox task error: {str(e)}")
+            ErrorAggregator.of(self.user.environment).record("sandbox_tasks", e)
@@ -0,0 +1,210 @@
+import gevent
+import time
+import uuid
+from typing import List, Optional, Tuple
+from tasks.base import UserTasks
+from tasks.knowledge_tasks import KnowledgeTasks
+
+FILLER = "Segment benchmark filler text for measuring write amplification on re-indexing. "
+
+
+def _content(marker: str, length: int) -> str:
+    """marker で始まる length 文字のチャンク (marker は検索で反映を確認するための一意な語)"""
+    filler = FILLER * (length // len(FILLER) + 1)
+    return f"{marker} {filler}"[:length]
+
+
+class SegmentTasks(UserTasks):
+    """大きなドキュメントのチャンク (セグメント) の一括追加・更新・削除と、検索に反映されるまでの時間の計測
+
+    1回の実行で batch_size 件のチャンクを追加 (1リクエスト) し、同じチャンクを更新・削除 (1件1リクエスト) する。
+    段階毎の時間は request_type="SEGMENT" のイベントとして記録する。
+        <操作> batch         batch_size 件の追加・更新・削除の合計
+        <操作> per segment   batch をチャンク数で割った時間
+        <操作> retrievable   操作の完了から /retrieve の結果に反映される (削除は返されなくなる) まで
+    反映の確認は、チャンク毎に一意な語 (marker) をキーワードとして持たせ、その語で検索する。
+    """
+
+    __slots__ = (
+        "api",
+        "knowledge",
+        "batch_size",
+        "content_length",
+        "document_size",
+        "retrieval_timeout",
+        "poll_interval",
+    )
+
+    def __init__(
+        self,
+        parent,
+        api_key: str,
+        batch_size: int = 20,
+        content_length: int = 500,
+        document_size: int = 1000000,
+        retrieval_timeout: float = 60,
+        poll_interval: float = 0.5,
+    ):
+        super().__init__(parent)
+        self.api = parent.api
+        self.knowledge = KnowledgeTasks(parent, api_key)
+        self.batch_size = batch_size
+        self.content_length = content_length
+        self.document_size = document_size  # 負荷対象のドキュメントの文字数
+        self.retrieval_timeout = retrieval_timeout
+        self.poll_interval = poll_interval
+
+    @property
+    def segments_path(self) -> str:
+        return f"/datasets/{self.knowledge.dataset_id}/documents/{self.knowledge.document_id}/segments"
+
+    def prepare_document(self) -> bool:
+        """ナレッジベースと大きなドキュメントを用意する (ユーザー毎に1回)"""
+        if not self.knowledge.dataset_id:
+            self.knowledge.acquire_knowledge_base()
+        if self.knowledge.dataset_id and not self.knowledge.document_id:
+            self.knowledge.create_document_by_text(_content("document", self.document_size))
+            self.knowledge.wait_for_indexing_complete(self.retrieval_timeout)
+        return bool(self.knowledge.dataset_id and self.knowledge.document_id)
+
+    def add_segment_batch(self) -> List[Tuple[str, str]]:
+        """batch_size 件のチャンクを1リクエストで追加し、(チャンクの ID, marker) の一覧を返す"""
+        markers = [f"seg{uuid.uuid4().hex[:16]}" for _ in range(self.batch_size)]
+        payload = {
+            "segments": [{"content": _content(marker, self.content_length), "keywords": [marker]} for marker in markers]
+        }
+
+        started = time.time()
+        with self.client.post(
+            self.segments_path,
+            json=payload,
+            headers=self.knowledge.headers,
+            name="Knowledge /datasets/:dataset_id/documents/:document_id/segments (batch)",
+            context={"segments": self.batch_size},
+            catch_response=True,
+        ) as response:
+            data = self.api.handle_response(response, "add_segment_batch")
+        if not data:
+            return []
+        self._fire_batch("add", time.time() - started, self.batch_size)
+        return [(segment["id"], marker) for segment, marker in zip(data.get("data", []), markers)]
+
+    def update_segment_batch(self, segments: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """各チャンクの内容を新しい marker で書き換え、更新できた (チャンクの ID, 新しい marker) の一覧を返す"""
+        started = time.time()
+        updated = []
+        for segment_id, _ in segments:
+            marker = f"seg{uuid.uuid4().hex[:16]}"
+            payload = {"segment": {"content": _content(marker, self.content_length), "keywords": [marker]}}
+            with self.client.post(
+                f"{self.segments_path}/{segment_id}",
+                json=payload,
+                headers=self.knowledge.headers,
+                name="Knowledge /datasets/:dataset_id/documents/:document_id/segments/:segment_id",
+                catch_response=True,
+            ) as response:
+                if self.api.handle_response(response, "update_segment") is not None:
+                    updated.append((segment_id, marker))
+        if updated:
+            self._fire_batch("update", time.time() - started, len(segments))
+        return updated
+
+    def delete_segment_batch(self, segments: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """チャンクを1件ずつ削除し、削除できた一覧を返す"""
+        started = time.time()
+        deleted = []
+        for segment_id, marker in segments:
+            with self.client.delete(
+                f"{self.segments_path}/{segment_id}",
+                headers=self.knowledge.headers,
+                name="Knowledge /datasets/:dataset_id/documents/:document_id/segments/:segment_id",
+                catch_response=True,
+            ) as response:
+                if 200 <= response.status_code < 300:
+                    deleted.append((segment_id, marker))
+                else:
+                    self.api.handle_response(response, "delete_segment")
+        if deleted:
+            self._fire_batch("delete", time.time() - started, len(segments))
+        return deleted
+
+    def _retrieved(self, marker: str) -> Optional[bool]:
+        """marker で検索し、marker を含むチャンクが返されたか (検索に失敗した場合は None)"""
+        payload = {
+            "query": marker,
+            "retrieval_model": {
+                "search_method": "keyword_search",
+                "reranking_enable": False,
+                "reranking_model": None,
+                "top_k": 3,
+                "score_threshold_enabled": False,
+            },
+        }
+        with self.client.post(
+            f"/datasets/{self.knowledge.dataset_id}/retrieve",
+            json=payload,
+            headers=self.knowledge.headers,
+            name="Knowledge /datasets/:dataset_id/retrieve (segment poll)",
+            catch_response=True,
+        ) as response:
+            data = self.api.handle_response(response, "retrieve_segment")
+        if data is None:
+            return None
+        return any(marker in (record.get("segment") or {}).get("content", "") for record in data.get("records", []))
+
+    def wait_until_retrievable(self, operation: str, marker: str, expected: bool = True):
+        """検索結果に marker が含まれる (expected=False の場合は含まれなくなる) までの時間を記録"""
+        started = time.time()
+        deadline = started + self.retrieval_timeout
+        while True:
+            if self._retrieved(marker) == expected:
+                self._fire(f"{operation} retrievable", time.time() - started)
+                return
+            if time.time() >= deadline:
+                self._fire(
+                    f"{operation} retrievable",
+                    time.time() - started,
+                    exception=TimeoutError(f"Segment {operation} not reflected in {self.retrieval_timeout:g}s"),
+                )
+                return
+            gevent.sleep(self.poll_interval)
+
+    def _fire_batch(self, operation: str, seconds: float, count: int):
+        self._fire(f"{operation} batch", seconds, count)
+        self._fire(f"{operation} per segment", seconds / count, count)
+
+    def _fire(self, name: str, seconds: float, count: Optional[int] = None, exception: Optional[Exception] = None):
+        self.user.environment.events.request.fire(
+            request_type="SEGMENT",
+            name=name,
+            response_time=seconds * 1000,
+            response_length=0,
+            exception=exception,
+            context={"segments": count or self.batch_size},
+            user=self.user,
+        )
+
+    def release_fixtures(self):
+        self.knowledge.release_fixtures()
+
+    def perform_segment_tasks(self):
+        """チャンクの追加・更新・削除と、それぞれが検索に反映されるまでの一連の実行"""
+        try:
+            if not self.prepare_document():
+                return
+
+            segments = self.add_segment_batch()
+            if not segments:
+                return
+            self.wait_until_retrievable("add", segments[-1][1])
+
+            updated = self.update_segment_batch(segments)
+            if updated:
+                self.wait_until_retrievable("update", updated[-1][1])
+                segments = list({**dict(segments), **dict(updated)}.items())
+
+            deleted = self.delete_segment_batch(segments)
+            if deleted:
+                self.wait_until_retrievable("delete", deleted[-1][1], expected=False)
+        except Exception as e:
+            self.api.log_error("segment_tasks", e)
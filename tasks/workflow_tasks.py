@@ -1,75 +1,110 @@
-from locust import TaskSet, task
-import json
+import gevent
 import time
-from typing import Optional
+from typing import List, Optional
+from tasks.base import UserTasks, bearer_headers
+from utils.completion import CompletionTracker
+from utils.queries import QueryMix
+from utils.streaming import iter_sse_events
 
 
-class WorkflowTasks(TaskSet):
+class WorkflowTasks(UserTasks):
     """ワークフロー関連APIのテストタスク"""
 
+    __slots__ = ("api", "headers", "workflow_id", "task_id", "completions")
+
     def __init__(self, parent, api_key):
         super().__init__(parent)
         self.api = parent.api
-        self.api_key = api_key
-        self.headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        self.headers = bearer_headers(api_key)
         self.workflow_id = None
         self.task_id = None
+        self.completions = CompletionTracker.of(parent.environment)  # ワーカー内で共有
 
-    @task(3)
     def run_workflow_blocking(self):
         """シンプルなワークフローの実行"""
-        payload = {"inputs": {"query": "Simple workflow test"}, "response_mode": "blocking", "user": self.api.user_id}
+        query, kind = QueryMix.of(self.user.environment).query("workflow", "Simple workflow test")
+        context = {"mode": "blocking", "query": kind} if kind else {"mode": "blocking"}
+        payload = {"inputs": {"query": query}, "response_mode": "blocking", "user": self.api.user_id}
 
         with self.client.post(
-            "/workflows/run", json=payload, headers=self.headers, name="/workflows/run/simple"
+            "/workflows/run",
+            json=payload,
+            headers=self.headers,
+            name="/workflows/run/simple",
+            context=context,
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 data = response.json()
                 self.workflow_id = data.get("workflow_run_id")
                 self.task_id = data.get("task_id")
 
-    @task(2)
-    def run_workflow_streaming(self):
-        """ストリーミングモードでのワークフロー実行"""
+    def run_workflow_streaming(self, files: Optional[List[dict]] = None, file_input: str = ""):
+        """ストリーミングモードでのワークフロー実行
+
+        files を指定した場合はアップロード済みのファイルを添付し、統計は添付無しと分ける
+        (file_input: ファイルを渡す入力変数名、空の場合はシステム変数 sys.files として渡す)。
+        """
+        query, kind = QueryMix.of(self.user.environment).query("workflow", "Streaming workflow test")
+        context = {"mode": "streaming", "query": kind} if kind else {"mode": "streaming"}
         payload = {
-            "inputs": {"query": "Streaming workflow test"},
+            "inputs": {"query": query},
             "response_mode": "streaming",
             "user": self.api.user_id,
         }
+        if files and file_input:
+            payload["inputs"][file_input] = files
+        elif files:
+            payload["files"] = files
 
-        with self.client.post(
-            "/workflows/run", json=payload, headers=self.headers, name="/workflows/run/streaming", stream=True
-        ) as response:
-            if response.status_code == 200:
-                for line in response.iter_lines():
-                    if line:
-                        data = json.loads(line.decode("utf-8").replace("data: ", ""))
+        started_at = time.time()
+        run_id = None
+        try:
+            with self.client.post(
+                "/workflows/run",
+                json=payload,
+                headers=self.headers,
+                name="/workflows/run/streaming (files)" if files else "/workflows/run/streaming",
+                stream=True,
+                context=context,
+                catch_response=True,
+            ) as response:
+                if response.status_code == 200:
+                    for data in iter_sse_events(response):
                         if data.get("event") == "workflow_started":
-                            self.workflow_id = data.get("workflow_run_id")
+                            run_id = self.workflow_id = data.get("workflow_run_id")
                             self.task_id = data.get("task_id")
+                            self.completions.track(run_id, self.user.host, self.headers, started_at, streaming=True)
+                        elif data.get("event") == "workflow_finished":
+                            self.completions.complete(run_id, (data.get("data") or {}).get("status"))
+            return response
+        finally:
+            # 完了通知の前にストリームが閉じた場合は共有の監視に引き継ぐ
+            if run_id:
+                self.completions.release(run_id)
 
-    @task(2)
     def get_workflow_status(self):
         """ワークフロー実行状態の取得"""
         if not self.workflow_id:
             return
 
         with self.client.get(
-            f"/workflows/run/{self.workflow_id}", headers=self.headers, name="Workflow /workflows/run/:workflow_id"
+            f"/workflows/run/{self.workflow_id}",
+            headers=self.headers,
+            name="Workflow /workflows/run/:workflow_id",
+            catch_response=True,
         ) as response:
             self.api.handle_response(response, "get_workflow_status")
 
-    @task(2)
     def get_workflow_logs(self):
         """ワークフローログの取得"""
         params = {"page": 1, "limit": 20, "keyword": "", "status": "succeeded"}  # succeeded/failed/stopped
 
         with self.client.get(
-            "/workflows/logs", params=params, headers=self.headers, name="/workflows/logs"
+            "/workflows/logs", params=params, headers=self.headers, name="/workflows/logs", catch_response=True
         ) as response:
             self.api.handle_response(response, "get_workflow_logs")
 
-    @task(1)
     def stop_workflow(self):
         """ワークフロー実行の停止"""
         if not self.task_id:
@@ -82,49 +117,140 @@ class WorkflowTasks(TaskSet):
             json=payload,
             headers=self.headers,
             name="Workflow /workflows/tasks/:task_id/stop",
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 self.task_id = None
 
-    @task(1)
     def get_parameters(self) -> Optional[dict]:
         """アプリケーション情報を取得"""
         with self.client.get(
-            "/parameters", headers=self.headers, name="Workflow /parameters", params={"user": self.api.user_id}
+            "/parameters",
+            headers=self.headers,
+            name="Workflow /parameters",
+            params={"user": self.api.user_id},
+            catch_response=True,
         ) as response:
             if response.status_code == 200:
                 return response.json()
             return None
 
-    @task(1)
     def get_meta(self) -> Optional[dict]:
         """アプリケーションのメタ情報を取得"""
         with self.client.get(
-            "/meta", headers=self.headers, name="Workflow /meta", params={"user": self.api.user_id}
+            "/meta", headers=self.headers, name="Workflow /meta", params={"user": self.api.user_id}, catch_response=True
         ) as response:
             if response.status_code == 200:
                 return response.json()
             return None
 
+    def run_and_stop_workflow(self, offset: float, timeout: float = 60, inputs: Optional[dict] = None):
+        """ストリーミング実行を開始し、offset 秒後に停止要求を送って停止までの時間を計測
+
+        停止要求の送信から「ストリームが閉じるまで」と「実行状態が stopped になるまで」を
+        それぞれ request_type="CANCEL" のリクエストとして記録する。停止前に終了した実行は記録しない。
+        """
+        payload = {
+            "inputs": inputs or {"query": "Cancellation test"},
+            "response_mode": "streaming",
+            "user": self.api.user_id,
+        }
+        label = f"@{offset:g}s"
+        stop = {}
+
+        def send_stop(task_id: str):
+            gevent.sleep(offset)
+            stop["sent_at"] = time.time()
+            with self.client.post(
+                f"/workflows/tasks/{task_id}/stop",
+                json={"user": self.api.user_id},
+                headers=self.headers,
+                name="Workflow /workflows/tasks/:task_id/stop",
+                context={"offset": offset},
+                catch_response=True,
+            ) as response:
+                stop["accepted"] = response.status_code == 200
+
+        stopper = None
+        run_id = None
+        with self.client.post(
+            "/workflows/run",
+            json=payload,
+            headers=self.headers,
+            name="/workflows/run/cancel",
+            stream=True,
+            context={"mode": "streaming", "offset": offset},
+            catch_response=True,
+        ) as response:
+            if response.status_code != 200:
+                return
+            try:
+                with gevent.Timeout(timeout):
+                    for data in iter_sse_events(response):
+                        if data.get("event") == "workflow_started" and stopper is None:
+                            run_id = data.get("workflow_run_id")
+                            stopper = gevent.spawn(send_stop, data.get("task_id"))
+            except gevent.Timeout:
+                response.failure(f"Stream did not close within {timeout}s")
+                if stopper is not None:
+                    stopper.kill()
+                return
+            closed_at = time.time()
+
+        if stopper is None:
+            return
+        if "sent_at" not in stop:
+            # 停止要求の前に実行が終わった
+            stopper.kill()
+            return
+        stopper.join()
+        if not stop.get("accepted"):
+            return
+        self._fire_cancel_metric(f"stream closed {label}", closed_at - stop["sent_at"], offset)
+
+        # API から見た実行状態が stopped になるまで短い間隔で確認
+        status = None
+        while time.time() - stop["sent_at"] < timeout:
+            with self.client.get(
+                f"/workflows/run/{run_id}",
+                headers=self.headers,
+                name="Workflow /workflows/run/:workflow_id (cancel)",
+                catch_response=True,
+            ) as response:
+                if response.status_code == 200:
+                    status = response.json().get("status")
+            if status in ("succeeded", "failed", "stopped"):
+                break
+            gevent.sleep(0.1)
+
+        elapsed = time.time() - stop["sent_at"]
+        if status == "stopped":
+            self._fire_cancel_metric(f"status stopped {label}", elapsed, offset)
+        else:
+            self._fire_cancel_metric(
+                f"status stopped {label}", elapsed, offset, Exception(f"Run not stopped (status: {status})")
+            )
+
+    def _fire_cancel_metric(self, name: str, seconds: float, offset: float, exception: Optional[Exception] = None):
+        self.user.environment.events.request.fire(
+            request_type="CANCEL",
+            name=name,
+            response_time=seconds * 1000,
+            response_length=0,
+            exception=exception,
+            context={"offset": offset},
+            user=self.user,
+        )
+
     def _monitor_workflow_completion(self, workflow_id: str, timeout: int = 30) -> bool:
-        """ワークフローの完了を監視"""
+        """ワークフローの完了を監視 (ワーカー内で共有する CompletionTracker の通知を待つ)"""
 
         # 一定確率で実行停止
         if self.user.environment.runner.user_count > 10:
             self.stop_workflow()
 
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            with self.client.get(
-                f"/workflows/run/{workflow_id}", headers=self.headers, name="Workflow /workflows/run/:workflow_id"
-            ) as response:
-                if response.status_code == 200:
-                    data = response.json()
-                    status = data.get("status")
-                    if status in ["succeeded", "failed", "stopped"]:
-                        return status == "succeeded"
-            time.sleep(1)
-        return False
+        status = self.completions.wait(workflow_id, timeout)
+        return status == "succeeded"
 
     def perform_workflow_tasks(self):
         """ワークフロータスクの一連の実行"""
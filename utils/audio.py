@@ -0,0 +1,161 @@
+import io
+import logging
+import math
+import struct
+import time
+import wave
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+
+# MPEG Layer III のビットレート (kbps、インデックス 0 と 15 は対象外)
+MPEG1_LAYER3_KBPS = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MPEG2_LAYER3_KBPS = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+
+SAMPLE_TEXT = "This is a sample sentence for the text to speech benchmark. "
+
+
+@lru_cache(maxsize=None)
+def make_wav(seconds: float, sample_rate: int = 16000, frequency: float = 440.0) -> bytes:
+    """指定した長さの WAV (16bit モノラルの正弦波) を作成"""
+    frames = int(seconds * sample_rate)
+    step = 2 * math.pi * frequency / sample_rate
+    samples = struct.pack(f"<{frames}h", *(int(8000 * math.sin(step * index)) for index in range(frames)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples)
+    return buffer.getvalue()
+
+
+def make_text(length: int) -> str:
+    """指定した文字数の英文"""
+    repeat = length // len(SAMPLE_TEXT) + 1
+    return (SAMPLE_TEXT * repeat)[:length].strip()
+
+
+def mp3_bitrate(data: bytes) -> Optional[int]:
+    """MP3 の最初のフレームヘッダーのビットレート (bps、判定できない場合は None)"""
+    offset = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        # ID3v2 タグの長さは 7bit ずつの syncsafe 整数
+        offset = 10 + ((data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9])
+    for index in range(offset, len(data) - 3):
+        if data[index] != 0xFF or data[index + 1] & 0xE0 != 0xE0:
+            continue
+        version = (data[index + 1] >> 3) & 0x03
+        layer = (data[index + 1] >> 1) & 0x03
+        bitrate_index = data[index + 2] >> 4
+        if version == 1 or layer != 1 or bitrate_index in (0, 15):
+            continue
+        table = MPEG1_LAYER3_KBPS if version == 3 else MPEG2_LAYER3_KBPS
+        return table[bitrate_index] * 1000
+    return None
+
+
+def iter_audio_chunks(response, chunk_size: int = 8192) -> Iterator[bytes]:
+    """音声のレスポンスボディを全体をバッファせずに順に返す
+
+    受信する度に locust の request イベントへ渡す値
+    (first_byte: 最初の音声データまでの ms, audio_bytes: 受信したバイト数, stream_time: 最後のデータまでの ms,
+    bitrate: 最初のフレームのビットレート) を更新する。
+    """
+    request_meta = getattr(response, "request_meta", None)
+    start_time = request_meta.get("start_time") if request_meta else None
+    raw = getattr(response, "_response", None)
+    if raw is not None and hasattr(raw, "readline"):
+        # FastHttpUser: iter_content は UTF-8 として解釈できるデータを str に変換するため、直接読む
+        # (geventhttpclient は chunk_size バイト揃うまで待つため、最初の音声データの時刻は最大 chunk_size 分遅れる)
+        chunks = iter(lambda: raw.read(chunk_size), b"")
+    else:
+        chunks = response.iter_content(chunk_size=chunk_size)
+    received = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if start_time:
+            elapsed = (time.time() - start_time) * 1000
+            if not received:
+                request_meta["first_byte"] = elapsed
+                request_meta["bitrate"] = mp3_bitrate(chunk)
+            request_meta["audio_bytes"] = received + len(chunk)
+            request_meta["stream_time"] = elapsed
+        received += len(chunk)
+        yield chunk
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class AudioStats:
+    """音声 API のリクエスト毎の実時間係数 (RTF)・最初の音声データまでの時間・配信速度の集計
+
+    audio-to-text: RTF = 処理時間 / 入力音声の長さ (context の audio_seconds)
+    text-to-audio: RTF = 最後の音声データまでの時間 / 出力音声の長さ (受信バイト数とビットレートから求める)
+    RTF が 1 未満であれば音声の再生より速く処理できている。
+    集計はリクエストイベントが発生するプロセス毎に行い、試験終了時にログへ出力する。
+    """
+
+    def __init__(self, default_bitrate: int = 128000):
+        self.default_bitrate = default_bitrate  # MP3 のフレームヘッダーからビットレートを判定できない場合の値
+        self.rows: Dict[str, Dict[str, List[float]]] = {}
+
+    def attach(self, environment):
+        environment.events.request.add_listener(self.on_request)
+        environment.events.test_start.add_listener(lambda **kwargs: self.rows.clear())
+        environment.events.test_stop.add_listener(lambda **kwargs: self.log_summary())
+        return self
+
+    def on_request(
+        self,
+        name,
+        response_time,
+        context=None,
+        exception=None,
+        first_byte=None,
+        audio_bytes=None,
+        stream_time=None,
+        bitrate=None,
+        **kwargs,
+    ):
+        if exception is not None or not context:
+            return
+        if context.get("audio_seconds"):
+            self._add(name, "rtf", response_time / 1000 / context["audio_seconds"])
+        elif audio_bytes and stream_time:
+            audio_seconds = audio_bytes * 8 / (bitrate or self.default_bitrate)
+            self._add(name, "rtf", stream_time / 1000 / audio_seconds)
+            self._add(name, "first_byte", first_byte)
+            self._add(name, "bytes_per_second", audio_bytes / (stream_time / 1000))
+
+    def _add(self, name: str, metric: str, value: float):
+        self.rows.setdefault(name, {}).setdefault(metric, []).append(value)
+
+    def summary(self) -> Dict[str, dict]:
+        """エンドポイント毎の件数と、RTF・最初の音声データまでの ms・bytes/s の p50 / p95"""
+        result = {}
+        for name, metrics in sorted(self.rows.items()):
+            row = {"requests": len(metrics.get("rtf", []))}
+            for metric, values in metrics.items():
+                row[metric] = {"p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+            result[name] = row
+        return result
+
+    def log_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        logging.info(f"{'Audio':45s} {'reqs':>6s} {'RTF p50':>8s} {'RTF p95':>8s} {'TTFA p50':>9s} {'KB/s p50':>9s}")
+        for name, row in summary.items():
+            first_byte = row.get("first_byte", {}).get("p50")
+            throughput = row.get("bytes_per_second", {}).get("p50")
+            logging.info(
+                f"{name[:45]:45s} {row['requests']:6d} {row['rtf']['p50']:8.2f} {row['rtf']['p95']:8.2f} "
+                + (f"{first_byte:9.0f} " if first_byte is not None else f"{'-':>9s} ")
+                + (f"{throughput / 1024:9.1f}" if throughput is not None else f"{'-':>9s}")
+            )
@@ -0,0 +1,291 @@
+import json
+import logging
+import os
+import subprocess
+import time
+from typing import Dict, Optional
+
+import gevent
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+COMPOSE_SERVICE_LABEL = "com.docker.compose.service"
+COMPOSE_PROJECT_LABEL = "com.docker.compose.project"
+
+# 読み取る cgroup v2 のファイル (存在しないものは無視する)
+CGROUP_FILES = ["cpu.stat", "memory.current", "io.stat"]
+
+
+def parse_flat_keyed(text: str) -> Dict[str, int]:
+    """cpu.stat などの "key value" 形式"""
+    values = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            values[parts[0]] = int(parts[1])
+    return values
+
+
+def parse_io_stat(text: str) -> Dict[str, int]:
+    """io.stat ("major:minor rbytes=.. wbytes=.. rios=.. wios=.." 形式) の全デバイスの合計"""
+    totals = {"rbytes": 0, "wbytes": 0, "rios": 0, "wios": 0}
+    for line in text.splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+            if key in totals:
+                totals[key] += int(value)
+    return totals
+
+
+def docker_service_cgroups(root: str = CGROUP_ROOT, project: str = "") -> Dict[str, str]:
+    """docker compose のサービス名と cgroup ディレクトリの対応 (docker CLI で1回だけ問い合わせる)"""
+    command = ["docker", "ps", "--no-trunc", "--format", f'{{{{.ID}}}}\t{{{{.Label "{COMPOSE_SERVICE_LABEL}"}}}}']
+    if project:
+        command[2:2] = ["--filter", f"label={COMPOSE_PROJECT_LABEL}={project}"]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.warning(f"Could not list docker containers: {e}")
+        return {}
+
+    services = {}
+    for line in output.splitlines():
+        container_id, _, service = line.partition("\t")
+        if not service:
+            continue
+        # systemd ドライバー / cgroupfs ドライバー
+        for relative in (f"system.slice/docker-{container_id}.scope", f"docker/{container_id}"):
+            path = os.path.join(root, relative)
+            if os.path.isdir(path):
+                # 同じサービスのレプリカは service, service-2, ... とする
+                name, index = service, 2
+                while name in services:
+                    name, index = f"{service}-{index}", index + 1
+                services[name] = path
+                break
+    return services
+
+
+def directory_cgroups(root: str) -> Dict[str, str]:
+    """root 直下で cpu.stat を持つディレクトリをサービスとみなす (テスト用の偽の cgroup ツリー)"""
+    services = {}
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isfile(os.path.join(path, "cpu.stat")):
+            services[name] = path
+    return services
+
+
+class _CgroupFiles:
+    """サービス毎の cgroup ファイルを開いたまま保持し、pread で先頭から読み直す"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fds: Dict[str, int] = {}
+        for name in CGROUP_FILES:
+            try:
+                self.fds[name] = os.open(os.path.join(path, name), os.O_RDONLY)
+            except OSError:
+                pass
+
+    def read(self, name: str) -> Optional[str]:
+        fd = self.fds.get(name)
+        if fd is None:
+            return None
+        try:
+            return os.pread(fd, 65536, 0).decode("ascii", "replace")
+        except OSError:
+            return None  # コンテナが停止した
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+
+
+class CgroupCollector:
+    """cgroup v2 のファイルからコンテナ (docker compose のサービス) 毎の CPU・メモリ・I/O・スロットリングを集計
+
+    services: サービス名と cgroup ディレクトリ (root からの相対パスも可) の対応。
+              省略時は docker CLI で compose のサービスを探し、見つからなければ root 直下のディレクトリを使う。
+    各ファイルは開いたまま pread で読み直し、前回との差分から区間の使用率を求める。
+    """
+
+    def __init__(
+        self,
+        root: str = CGROUP_ROOT,
+        services: Optional[Dict[str, str]] = None,
+        project: str = "",
+        interval: float = 5,
+        path: str = "results/containers.json",
+    ):
+        self.root = root
+        self.services = services
+        self.project = project
+        self.interval = interval
+        self.path = path
+        self.environment = None
+        self.files: Dict[str, _CgroupFiles] = {}
+        self.previous: Dict[str, dict] = {}
+        self.previous_time: Optional[float] = None
+        self.totals: Dict[str, dict] = {}
+        self.latest: Dict[str, dict] = {}
+        self.started_at: Optional[float] = None
+        self._greenlet = None
+
+    def attach(self, environment):
+        """locust のイベントにリスナーを登録"""
+        self.environment = environment
+        environment.events.test_start.add_listener(lambda **kwargs: self.start())
+        environment.events.test_stop.add_listener(lambda **kwargs: self.stop())
+        return self
+
+    def discover(self) -> Dict[str, str]:
+        if self.services:
+            return {name: os.path.join(self.root, path) for name, path in self.services.items()}
+        return docker_service_cgroups(self.root, self.project) or directory_cgroups(self.root)
+
+    def open(self):
+        self.close()
+        self.files = {name: _CgroupFiles(path) for name, path in self.discover().items()}
+        if not self.files:
+            logging.warning(f"No container cgroups found under {self.root}")
+        self.previous = {name: self._read_counters(files) for name, files in self.files.items()}
+        self.previous_time = time.monotonic()
+        self.totals = {
+            name: {
+                "cpu_seconds": 0.0,
+                "throttled_seconds": 0.0,
+                "io_read_bytes": 0,
+                "io_write_bytes": 0,
+                "memory_peak_bytes": 0,
+                "memory_sum": 0.0,
+                "samples": 0,
+            }
+            for name in self.files
+        }
+        self.latest = {}
+
+    def close(self):
+        for files in self.files.values():
+            files.close()
+        self.files = {}
+
+    def _read_counters(self, files: _CgroupFiles) -> dict:
+        counters = {}
+        text = files.read("cpu.stat")
+        if text is not None:
+            counters.update(parse_flat_keyed(text))
+        text = files.read("memory.current")
+        if text is not None and text.strip():
+            counters["memory_current"] = int(text.strip())
+        text = files.read("io.stat")
+        if text is not None:
+            counters.update(parse_io_stat(text))
+        return counters
+
+    def sample(self) -> Dict[str, dict]:
+        """前回からの区間のサービス毎の使用量"""
+        now = time.monotonic()
+        elapsed = max(now - self.previous_time, 1e-9)
+        self.previous_time = now
+        result = {}
+        for name, files in self.files.items():
+            current = self._read_counters(files)
+            previous = self.previous.get(name, {})
+            self.previous[name] = current
+            if not current:
+                continue
+
+            def delta(key: str) -> int:
+                # カウンターが戻った場合 (コンテナの再作成) は現在値を差分とする
+                value = current.get(key, 0) - previous.get(key, 0)
+                return value if value >= 0 else current.get(key, 0)
+
+            periods = delta("nr_periods")
+            row = {
+                "cpu_percent": delta("usage_usec") / 1e6 / elapsed * 100,
+                "throttled_percent": delta("nr_throttled") / periods * 100 if periods else 0.0,
+                "throttled_ms": delta("throttled_usec") / 1000,
+                "memory_bytes": current.get("memory_current", 0),
+                "io_read_bytes_per_second": delta("rbytes") / elapsed,
+                "io_write_bytes_per_second": delta("wbytes") / elapsed,
+            }
+            result[name] = row
+
+            total = self.totals[name]
+            total["cpu_seconds"] += delta("usage_usec") / 1e6
+            total["throttled_seconds"] += delta("throttled_usec") / 1e6
+            total["io_read_bytes"] += delta("rbytes")
+            total["io_write_bytes"] += delta("wbytes")
+            total["memory_peak_bytes"] = max(total["memory_peak_bytes"], row["memory_bytes"])
+            total["memory_sum"] += row["memory_bytes"]
+            total["samples"] += 1
+        self.latest = result
+        return result
+
+    def flat_sample(self) -> Dict[str, float]:
+        """直近の区間の値を "<service>_<metric>" の形式で返す (ソーク試験の時系列用)"""
+        return {
+            f"{name}_{metric}": value
+            for name, row in self.latest.items()
+            for metric, value in row.items()
+            if metric in ("cpu_percent", "memory_bytes", "throttled_percent")
+        }
+
+    def summary(self) -> Dict[str, dict]:
+        """計測期間全体のサービス毎の使用量と CPU 時間の割合"""
+        elapsed = max(time.time() - self.started_at, 1e-9) if self.started_at else 1e-9
+        cpu_total = sum(total["cpu_seconds"] for total in self.totals.values())
+        result = {}
+        for name, total in sorted(self.totals.items(), key=lambda item: -item[1]["cpu_seconds"]):
+            result[name] = {
+                "cpu_seconds": total["cpu_seconds"],
+                "cpu_share": total["cpu_seconds"] / cpu_total if cpu_total else 0.0,
+                "cpu_percent": total["cpu_seconds"] / elapsed * 100,
+                "throttled_seconds": total["throttled_seconds"],
+                "memory_mean_bytes": total["memory_sum"] / total["samples"] if total["samples"] else 0,
+                "memory_peak_bytes": total["memory_peak_bytes"],
+                "io_read_bytes": total["io_read_bytes"],
+                "io_write_bytes": total["io_write_bytes"],
+            }
+        return result
+
+    def start(self):
+        self.stop()
+        self.open()
+        self.started_at = time.time()
+        self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is None:
+            return
+        self._greenlet.kill(block=True)
+        self._greenlet = None
+        self.sample()
+        self.report()
+        self.close()
+
+    def _run(self):
+        while True:
+            gevent.sleep(self.interval)
+            self.sample()
+
+    def report(self):
+        """サービス毎の使用量をログと JSON に出力"""
+        summary = self.summary()
+        if not summary:
+            return
+        logging.info(
+            f"{'Container':24s} {'CPU s':>9s} {'share':>7s} {'CPU %':>7s} {'throttled s':>12s} "
+            f"{'mem mean MB':>12s} {'mem peak MB':>12s} {'read MB':>9s} {'write MB':>9s}"
+        )
+        for name, row in summary.items():
+            logging.info(
+                f"{name[:24]:24s} {row['cpu_seconds']:9.1f} {row['cpu_share']:7.1%} {row['cpu_percent']:7.1f} "
+                f"{row['throttled_seconds']:12.2f} {row['memory_mean_bytes'] / 2**20:12.1f} "
+                f"{row['memory_peak_bytes'] / 2**20:12.1f} {row['io_read_bytes'] / 2**20:9.1f} "
+                f"{row['io_write_bytes'] / 2**20:9.1f}"
+            )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"interval": self.interval, "services": summary}, f, indent=2)
@@ -0,0 +1,207 @@
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import gevent
+from gevent.event import AsyncResult, Event
+from gevent.pool import Pool
+from locust.clients import HttpSession
+
+TERMINAL_STATUSES = ("succeeded", "failed", "stopped")
+POLL_NAME = "Workflow /workflows/run/:workflow_id (poller)"
+
+_trackers = weakref.WeakKeyDictionary()
+
+
+class _Run:
+    __slots__ = ("run_id", "host", "headers", "started_at", "streaming", "next_poll_at", "interval", "result")
+
+    def __init__(self, run_id: str, host: str, headers: dict, started_at: float, streaming: bool):
+        self.run_id = run_id
+        self.host = host
+        self.headers = headers
+        self.started_at = started_at
+        self.streaming = streaming
+        self.next_poll_at = 0.0
+        self.interval = 0.0
+        self.result = AsyncResult()
+
+
+class CompletionTracker:
+    """ワーカー (単体実行時は自身) で共有するワークフロー実行の完了監視
+
+    ユーザー毎に /workflows/run/:id を1秒毎に確認する代わりに、未完了の実行 ID を1つの greenlet がまとめて確認する。
+    確認間隔は実行毎に initial_interval から backoff 倍ずつ max_interval まで伸ばし、同時に送る確認は concurrency 件までとする。
+    ストリームが開いている実行は workflow_finished イベントから完了を判定し、ストリームが途中で閉じた場合のみ確認の対象にする。
+
+    完了を検知すると待機中のユーザーに通知し、実行開始から完了検知までの時間を request_type="COMPLETION" として記録する。
+    確認のリクエストは POLL_NAME の名前と context={"source": "poller"} でユーザーのリクエストと区別する。
+    client_factory を指定すると、確認のリクエストもユーザーと同じ設定・ラッパーの HTTP クライアントで送る。
+    """
+
+    def __init__(
+        self,
+        initial_interval: float = 0.5,
+        max_interval: float = 5,
+        backoff: float = 1.5,
+        concurrency: int = 4,
+        max_age: float = 300,
+        keep_results: int = 10000,
+        client_factory: Optional[Callable[[str], object]] = None,
+    ):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.max_age = max_age
+        self.keep_results = keep_results
+        self.client_factory = client_factory  # ホスト毎の確認用クライアント (ユーザーと同じ設定・ラッパーのもの)
+        self.environment = None
+        self.runs: Dict[str, _Run] = {}
+        self.results: "OrderedDict[str, str]" = OrderedDict()  # 完了済みの実行 ID と状態 (直近 keep_results 件)
+        self._sessions: Dict[str, object] = {}
+        self.listeners: List[Callable[[str, str], None]] = []  # 完了の通知先 (実行 ID, 状態)
+        self._wakeup = Event()
+        self._greenlet = None
+
+    @classmethod
+    def of(cls, environment) -> "CompletionTracker":
+        """environment に登録済みのトラッカー (未登録なら既定値で作成)"""
+        tracker = _trackers.get(environment)
+        if tracker is None:
+            tracker = cls().attach(environment)
+        return tracker
+
+    def attach(self, environment):
+        """locust のイベントにリスナーを登録"""
+        self.environment = environment
+        _trackers[environment] = self
+        environment.events.test_stop.add_listener(lambda **kwargs: self.stop())
+        return self
+
+    def track(self, run_id: str, host: str, headers: dict, started_at: Optional[float] = None, streaming: bool = False):
+        """実行 ID を監視対象に追加 (streaming=True の間は確認せず、complete / release を待つ)"""
+        if not run_id or run_id in self.runs or run_id in self.results:
+            return
+        run = _Run(run_id, host, headers, started_at or time.time(), streaming)
+        run.interval = self.initial_interval
+        run.next_poll_at = time.time() + self.initial_interval
+        self.runs[run_id] = run
+        if self._greenlet is None:
+            self._greenlet = gevent.spawn(self._run)
+        self._wakeup.set()
+
+    def release(self, run_id: str):
+        """ストリームが完了通知の前に閉じた実行を確認の対象にする"""
+        run = self.runs.get(run_id)
+        if run is not None and run.streaming:
+            run.streaming = False
+            run.next_poll_at = time.time()
+            self._wakeup.set()
+
+    def complete(self, run_id: str, status: str, source: str = "stream"):
+        """完了を記録し、待機中のユーザーに通知"""
+        run = self.runs.pop(run_id, None)
+        if run is None:
+            return
+        self.results[run_id] = status
+        while len(self.results) > self.keep_results:
+            self.results.popitem(last=False)
+        self._fire(source, run, Exception("Workflow run failed") if status == "failed" else None)
+        run.result.set(status)
+        for listener in self.listeners:
+            try:
+                listener(run_id, status)
+            except Exception as e:
+                logging.warning(f"Failed to notify completion of {run_id}: {e}")
+
+    def on_remote_completion(self, message: dict):
+        """他のプロセスから通知された完了を記録 (計測は通知元で行うため request イベントは送らない)"""
+        run_id = message.get("run_id")
+        if not run_id or run_id in self.results:
+            return
+        self.results[run_id] = message.get("status")
+        while len(self.results) > self.keep_results:
+            self.results.popitem(last=False)
+        run = self.runs.pop(run_id, None)
+        if run is not None:
+            run.result.set(message.get("status"))
+
+    def wait(self, run_id: str, timeout: Optional[float] = None) -> Optional[str]:
+        """完了まで待って最終状態を返す (タイムアウト時や監視対象外の場合は None)"""
+        if run_id in self.results:
+            return self.results[run_id]
+        run = self.runs.get(run_id)
+        if run is None:
+            return None
+        return run.result.wait(timeout)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill(block=False)
+            self._greenlet = None
+        if self.runs:
+            logging.info(f"Completion tracker stopped with {len(self.runs)} outstanding workflow runs")
+        for run in self.runs.values():
+            run.result.set(None)
+        self.runs = {}
+
+    def _run(self):
+        pool = Pool(self.concurrency)
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            due = [run for run in self.runs.values() if not run.streaming and run.next_poll_at <= now]
+            for run in due:
+                if now - run.started_at > self.max_age:
+                    self.runs.pop(run.run_id, None)
+                    self._fire("poll", run, Exception(f"Not completed within {self.max_age:.0f}s"))
+                    run.result.set(None)
+                    continue
+                pool.spawn(self._poll, run)
+            pool.join()
+
+            pending = [run.next_poll_at for run in self.runs.values() if not run.streaming]
+            delay = max(min(pending) - time.time(), 0) if pending else None
+            self._wakeup.wait(delay)
+
+    def _poll(self, run: _Run):
+        session = self._sessions.get(run.host)
+        if session is None:
+            if self.client_factory is not None:
+                session = self.client_factory(run.host)
+            else:
+                session = HttpSession(run.host, self.environment.events.request, None)
+            self._sessions[run.host] = session
+        status = None
+        try:
+            with session.get(
+                f"/workflows/run/{run.run_id}",
+                headers=run.headers,
+                name=POLL_NAME,
+                context={"source": "poller"},
+                catch_response=True,
+            ) as response:
+                if response.status_code == 200:
+                    status = response.json().get("status")
+        except Exception as e:
+            logging.warning(f"Failed to poll workflow run {run.run_id}: {e}")
+        if run.run_id not in self.runs:
+            return  # 確認中にストリームから完了が通知された
+        if status in TERMINAL_STATUSES:
+            self.complete(run.run_id, status, source="poll")
+            return
+        run.interval = min(run.interval * self.backoff, self.max_interval)
+        run.next_poll_at = time.time() + run.interval
+
+    def _fire(self, source: str, run: _Run, exception: Optional[Exception]):
+        self.environment.events.request.fire(
+            request_type="COMPLETION",
+            name=f"Workflow run ({source})",
+            response_time=(time.time() - run.started_at) * 1000,
+            response_length=0,
+            exception=exception,
+            context={"source": source},
+        )
@@ -0,0 +1,267 @@
+import json
+import logging
+import time
+import weakref
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import gevent
+from gevent.event import Event
+
+from utils.http_client import ClientWrapper
+
+_coordinators = weakref.WeakKeyDictionary()
+
+# 予約方式のトークンバケット (トークンが足りない場合も先に差し引き、不足分が補充されるまでの秒数を返す)
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate) - requested
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+if tokens >= 0 then
+  return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+
+class FixturePool:
+    """プロセス内で共有するフィクスチャ (データセット ID など) のプール
+
+    take は1つの値を取り出して呼び出し元が占有し、使い終わったら release で戻す (同じ値を同時に使わない)。
+    """
+
+    def __init__(self):
+        self.items = deque()
+        self._available = Event()
+
+    def put(self, item: str):
+        self.items.appendleft(item)
+        self._available.set()
+
+    release = put
+
+    def take(self, timeout: Optional[float] = None) -> Optional[str]:
+        """値を1つ取り出す (timeout を指定した場合は追加されるまで待つ、無ければ None)"""
+        deadline = time.time() + timeout if timeout else None
+        while not self.items:
+            if deadline is None or time.time() >= deadline:
+                return None
+            self._available.clear()
+            self._available.wait(deadline - time.time())
+        return self.items.pop()
+
+    def size(self) -> int:
+        return len(self.items)
+
+
+class TokenBucket:
+    """プロセス内のトークンバケット (rate: 1秒あたりの補充数, burst: 上限)"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """トークンを予約し、使えるようになるまでの秒数を返す"""
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate) - tokens
+        self.updated = now
+        return max(-self.tokens / self.rate, 0.0)
+
+
+class LocalCoordinator:
+    """プロセス内で完結する調整 (Redis を使わない単体実行・動作確認用)
+
+    フィクスチャのプール・トークンバケット・通知は同じプロセスのユーザー間でのみ共有される。
+    """
+
+    def __init__(self, prefix: str = "dify-locust"):
+        self.prefix = prefix
+        self.pools: Dict[str, FixturePool] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.subscribers: Dict[str, List[Callable[[dict], None]]] = {}
+        self.seen: Dict[str, set] = {}
+
+    @classmethod
+    def of(cls, environment):
+        """environment に登録済みの調整 (未登録ならプロセス内の調整を作成)"""
+        coordinator = _coordinators.get(environment)
+        if coordinator is None:
+            coordinator = LocalCoordinator().attach(environment)
+        return coordinator
+
+    def attach(self, environment):
+        _coordinators[environment] = self
+        environment.events.quitting.add_listener(lambda **kwargs: self.close())
+        return self
+
+    def close(self):
+        pass
+
+    # フィクスチャ
+    def put(self, pool: str, item: str):
+        self._pool(pool).put(item)
+
+    def take(self, pool: str, timeout: Optional[float] = None) -> Optional[str]:
+        return self._pool(pool).take(timeout)
+
+    def release(self, pool: str, item: str):
+        self._pool(pool).release(item)
+
+    def size(self, pool: str) -> int:
+        return self._pool(pool).size()
+
+    def _pool(self, name: str) -> FixturePool:
+        pool = self.pools.get(name)
+        if pool is None:
+            pool = self.pools[name] = FixturePool()
+        return pool
+
+    def first_seen(self, namespace: str, item: str) -> bool:
+        """item が namespace で初めて使われる場合に True (以降は False)"""
+        seen = self.seen.setdefault(namespace, set())
+        if item in seen:
+            return False
+        seen.add(item)
+        return True
+
+    # レート制限
+    def reserve(self, bucket: str, rate: float, burst: float, tokens: float = 1) -> float:
+        state = self.buckets.get(bucket)
+        if state is None:
+            state = self.buckets[bucket] = TokenBucket(rate, burst)
+        return state.reserve(tokens)
+
+    def acquire(self, bucket: str, rate: float, burst: float, tokens: float = 1) -> float:
+        """トークンを予約し、使えるようになるまで待つ (待った秒数を返す)"""
+        delay = self.reserve(bucket, rate, burst, tokens)
+        if delay > 0:
+            gevent.sleep(delay)
+        return delay
+
+    # 通知
+    def publish(self, channel: str, message: dict):
+        for callback in self.subscribers.get(channel, []):
+            gevent.spawn(callback, message)
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        self.subscribers.setdefault(channel, []).append(callback)
+
+
+class RedisCoordinator(LocalCoordinator):
+    """Redis で全ワーカーのユーザー間の状態を共有する
+
+    フィクスチャのプールは Redis のリスト、トークンバケットは Lua スクリプト (Redis の時刻を使う) で全プロセスから原子的に更新する。
+    通知は Redis の pub/sub で配信し、購読は1つの greenlet で受信してコールバックを呼び出す。
+    キーは全て "<prefix>:" で始まる。
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "dify-locust"):
+        import redis
+
+        super().__init__(prefix)
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.redis.ping()
+        self._token_bucket = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._pubsub = None
+        self._listener = None
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.kill()
+            self._listener = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def put(self, pool: str, item: str):
+        self.redis.lpush(self._key("pool", pool), item)
+
+    def take(self, pool: str, timeout: Optional[float] = None) -> Optional[str]:
+        if timeout:
+            result = self.redis.brpop([self._key("pool", pool)], timeout=timeout)
+            return result[1] if result else None
+        return self.redis.rpop(self._key("pool", pool))
+
+    def release(self, pool: str, item: str):
+        self.put(pool, item)
+
+    def size(self, pool: str) -> int:
+        return self.redis.llen(self._key("pool", pool))
+
+    def first_seen(self, namespace: str, item: str) -> bool:
+        key = self._key("seen", namespace)
+        added, _ = self.redis.pipeline().sadd(key, item).expire(key, 86400).execute()
+        return bool(added)
+
+    def reserve(self, bucket: str, rate: float, burst: float, tokens: float = 1) -> float:
+        return float(self._token_bucket(keys=[self._key("bucket", bucket)], args=[rate, burst, tokens]))
+
+    def publish(self, channel: str, message: dict):
+        self.redis.publish(self._key("channel", channel), json.dumps(message))
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        first = channel not in self.subscribers
+        super().subscribe(channel, callback)
+        if first:
+            if self._pubsub is None:
+                self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(self._key("channel", channel))
+        if self._listener is None:
+            self._listener = gevent.spawn(self._listen)
+
+    def _listen(self):
+        prefix = self._key("channel", "")
+        while True:
+            try:
+                message = self._pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                logging.warning(f"Redis subscription failed: {e}")
+                gevent.sleep(1)
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"][len(prefix) :]
+            data = json.loads(message["data"])
+            for callback in self.subscribers.get(channel, []):
+                try:
+                    callback(data)
+                except Exception as e:
+                    logging.warning(f"Subscriber of {channel} failed: {e}")
+
+
+def create_coordinator(backend: str = "local", url: str = "", prefix: str = "dify-locust") -> LocalCoordinator:
+    """設定に応じた調整 (backend: local / redis)"""
+    if backend == "redis":
+        return RedisCoordinator(url, prefix)
+    if backend != "local":
+        raise ValueError(f"Unknown coordination backend: {backend}")
+    return LocalCoordinator(prefix)
+
+
+class RateLimitedClient(ClientWrapper):
+    """全プロセス共通のトークンバケットで、再試行を含む全ての試行の送信レートを制限するクライアントのラッパー"""
+
+    def __init__(self, client, coordinator: LocalCoordinator, rate: float, burst: float, bucket: str = "requests"):
+        super().__init__(client)
+        self.coordinator = coordinator
+        self.rate = rate
+        self.burst = burst
+        self.bucket = bucket
+
+    def request(self, method: str, url: str, catch_response: bool = False, **kwargs):
+        self.coordinator.acquire(self.bucket, self.rate, self.burst)
+        return self._client.request(method, url, catch_response=catch_response, **kwargs)
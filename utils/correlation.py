@@ -0,0 +1,62 @@
+import re
+import uuid
+from typing import Optional, Tuple
+
+from utils.http_client import ClientWrapper
+
+USER_HEADER = "X-Client-User"
+CONVERSATION_HEADER = "X-Conversation-ID"
+
+CONVERSATION_PATH_PATTERN = re.compile(r"/conversations/([^/?]+)")
+
+
+def request_identifiers(url: str, kwargs: dict) -> Tuple[Optional[str], Optional[str]]:
+    """リクエストのペイロード・クエリ・パスからユーザー ID と会話 ID を取り出す"""
+    user_id = conversation_id = None
+    for source in (kwargs.get("json"), kwargs.get("params"), kwargs.get("data")):
+        if isinstance(source, dict):
+            user_id = user_id or source.get("user")
+            conversation_id = conversation_id or source.get("conversation_id")
+    if not conversation_id:
+        match = CONVERSATION_PATH_PATTERN.search(url)
+        if match:
+            conversation_id = match.group(1)
+    return user_id, conversation_id
+
+
+class CorrelatedClient(ClientWrapper):
+    """全リクエストに相関 ID (とユーザー ID・会話 ID) のヘッダーを付けるクライアントのラッパー
+
+    相関 ID は HTTP リクエスト毎に生成し (429 / 503 の再試行も別の ID になる)、
+    request_id / user_id / conversation_id として request イベントに渡すため、結果ログにも記録される。
+    サーバー側のログ (nginx の $http_x_request_id など) と join_traces.py で結合できる。
+    """
+
+    def __init__(self, client, user, header: str = "X-Request-ID"):
+        super().__init__(client)
+        self.user = user
+        self.header = header
+
+    def request(self, method: str, url: str, catch_response: bool = False, **kwargs):
+        request_id = uuid.uuid4().hex
+        user_id, conversation_id = request_identifiers(url, kwargs)
+        if not user_id and getattr(self.user, "api", None) is not None:
+            user_id = self.user.api.user_id
+
+        headers = dict(kwargs.get("headers") or {})
+        headers[self.header] = request_id
+        if user_id:
+            headers[USER_HEADER] = str(user_id)
+        if conversation_id:
+            headers[CONVERSATION_HEADER] = str(conversation_id)
+        kwargs["headers"] = headers
+
+        response = self._client.request(method, url, catch_response=True, **kwargs)
+        response.request_meta["request_id"] = request_id
+        response.request_meta["user_id"] = user_id
+        response.request_meta["conversation_id"] = conversation_id
+        if catch_response:
+            return response
+        with response:
+            pass
+        return response
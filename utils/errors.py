@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import re
+import time
+import weakref
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import gevent
+
+# 同じ原因のエラーを1つにまとめるため、メッセージ中の ID・アドレス・数値を置き換える
+NORMALIZE_PATTERNS = [
+    (re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"), "<uuid>"),
+    (re.compile(r"0x[0-9a-fA-F]+"), "<addr>"),
+    (re.compile(r"\b[0-9a-fA-F]{16,}\b"), "<hex>"),
+    (re.compile(r"\d+(\.\d+)?"), "<n>"),
+]
+MAX_MESSAGE_LENGTH = 200
+MAX_SAMPLE_LENGTH = 1000
+OTHER_MESSAGE = "<other>"
+
+_aggregators = weakref.WeakKeyDictionary()
+
+
+def normalize_message(message: str) -> str:
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return " ".join(message.split())[:MAX_MESSAGE_LENGTH]
+
+
+class _Group:
+    __slots__ = ("count", "first_seen", "last_seen", "samples")
+
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.first_seen = 0.0
+        self.last_seen = 0.0
+        self.samples = deque(maxlen=sample_size)  # (時刻, 元のメッセージ)
+
+
+class ErrorAggregator:
+    """タスク内の例外の集計
+
+    print と request_type="ERROR" のイベント (response_time=0 で統計のパーセンタイルを歪める) の代わりに、
+    (タスク名, 例外の型, 正規化したメッセージ) 毎の件数と直近 sample_size 件の元のメッセージのみを保持する。
+    record はメモリ上の加算のみを行い、ファイルへの書き出しとログ出力は flush_interval 秒毎に別の greenlet で行う。
+
+    分散実行時はワーカーが前回の報告以降の差分を report_to_master で送り、Master で集計する。
+    集計結果は Web UI の /errors (JSON)、flush_interval 毎のログ、試験終了時の一覧と path の JSON で確認できる。
+    """
+
+    def __init__(
+        self,
+        path: str = "results/errors.json",
+        sample_size: int = 5,
+        flush_interval: float = 10,
+        max_groups: int = 500,
+        top: int = 10,
+    ):
+        self.path = path
+        self.sample_size = sample_size
+        self.flush_interval = flush_interval
+        self.max_groups = max_groups
+        self.top = top
+        self.environment = None
+        self.groups: Dict[Tuple[str, str, str], _Group] = {}
+        self.pending: Dict[Tuple[str, str, str], list] = {}  # Master へ未報告の差分 (件数, サンプル)
+        self.total = 0
+        self._flushed_total = 0
+        self._greenlet = None
+        self._forward = False
+
+    @classmethod
+    def of(cls, environment) -> "ErrorAggregator":
+        """environment に登録済みの集計 (未登録なら既定値で作成)"""
+        aggregator = _aggregators.get(environment)
+        if aggregator is None:
+            aggregator = cls().attach(environment)
+        return aggregator
+
+    def attach(self, environment, web_ui=None):
+        """locust のイベントにリスナーを登録 (ワーカーでは差分を Master に送る)"""
+        from locust.runners import MasterRunner, WorkerRunner
+
+        self.environment = environment
+        _aggregators[environment] = self
+        runner = environment.runner
+        self._forward = isinstance(runner, WorkerRunner)
+        if self._forward:
+            environment.events.report_to_master.add_listener(self.on_report_to_master)
+        else:
+            if isinstance(runner, MasterRunner):
+                environment.events.worker_report.add_listener(self.on_worker_report)
+            environment.events.test_start.add_listener(lambda **kwargs: self.start())
+            environment.events.test_stop.add_listener(lambda **kwargs: self.stop())
+            web_ui = web_ui or getattr(environment, "web_ui", None)
+            if web_ui is not None:
+                web_ui.app.add_url_rule("/errors", "errors", lambda: self.snapshot())
+        return self
+
+    def record(self, task_name: str, error: BaseException, timestamp: Optional[float] = None):
+        """例外を1件記録する (イベントループを止めないようメモリ上の加算のみ)"""
+        self._add(task_name, type(error).__name__, str(error), 1, [(timestamp or time.time(), str(error))])
+
+    def _add(self, task_name: str, error_type: str, message: str, count: int, samples: List[Tuple[float, str]]):
+        key = (task_name, error_type, normalize_message(message))
+        group = self.groups.get(key)
+        if group is None:
+            if len(self.groups) >= self.max_groups:
+                key = (task_name, error_type, OTHER_MESSAGE)
+                group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = _Group(self.sample_size)
+                group.first_seen = samples[0][0] if samples else time.time()
+        group.count += count
+        self.total += count
+        for timestamp, text in samples:
+            group.samples.append((timestamp, text[:MAX_SAMPLE_LENGTH]))
+            group.last_seen = max(group.last_seen, timestamp)
+
+        if self._forward:
+            entry = self.pending.get(key)
+            if entry is None:
+                entry = self.pending[key] = [0, deque(maxlen=self.sample_size)]
+            entry[0] += count
+            entry[1].extend(samples)
+
+    def on_report_to_master(self, client_id, data, **kwargs):
+        data["task_errors"] = [
+            [task_name, error_type, message, count, list(samples)]
+            for (task_name, error_type, message), (count, samples) in self.pending.items()
+        ]
+        self.pending = {}
+
+    def on_worker_report(self, client_id, data, **kwargs):
+        for task_name, error_type, message, count, samples in data.get("task_errors", []):
+            self._add(task_name, error_type, message, count, [tuple(sample) for sample in samples])
+
+    def summary(self) -> List[dict]:
+        """件数の多い順のエラーの一覧"""
+        rows = []
+        for (task_name, error_type, message), group in self.groups.items():
+            rows.append(
+                {
+                    "task": task_name,
+                    "type": error_type,
+                    "message": message,
+                    "count": group.count,
+                    "first_seen": group.first_seen,
+                    "last_seen": group.last_seen,
+                    "samples": [{"timestamp": timestamp, "message": text} for timestamp, text in group.samples],
+                }
+            )
+        return sorted(rows, key=lambda row: -row["count"])
+
+    def snapshot(self) -> dict:
+        return {"total": self.total, "groups": self.summary()}
+
+    def start(self):
+        self.stop()
+        self.groups = {}
+        self.total = self._flushed_total = 0
+        self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill(block=False)
+            self._greenlet = None
+            self.flush()
+            self.log_summary()
+
+    def _run(self):
+        while True:
+            gevent.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(f"Failed to write error summary: {e}")
+
+    def flush(self):
+        """前回以降に増えた件数をログに出し、集計結果を path に書き出す"""
+        if self.total == self._flushed_total:
+            return
+        new = self.total - self._flushed_total
+        self._flushed_total = self.total
+        top = self.summary()[0]
+        logging.warning(
+            f"{new} task errors in the last {self.flush_interval:g}s ({self.total} total, {len(self.groups)} kinds); "
+            f"most frequent: {top['task']} {top['type']}: {top['message']} x{top['count']}"
+        )
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temporary = self.path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            os.replace(temporary, self.path)
+
+    def log_summary(self):
+        if not self.total:
+            return
+        logging.info(f"{'Task errors':30s} {'type':25s} {'count':>7s}  message")
+        for row in self.summary()[: self.top]:
+            logging.info(f"{row['task'][:30]:30s} {row['type'][:25]:25s} {row['count']:7d}  {row['message']}")
+        if len(self.groups) > self.top:
+            logging.info(f"... {len(self.groups) - self.top} more kinds of errors in {self.path}")
+
+
+def load_errors(path: str) -> List[dict]:
+    """ErrorAggregator が書き出した JSON のエラーの一覧 (ファイルが無い場合は空)"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("groups", [])
@@ -0,0 +1,146 @@
+from functools import partial
+from typing import Dict
+
+from locust import FastHttpUser, HttpUser
+from locust.clients import HttpSession, LocustHttpAdapter
+from locust.contrib.fasthttp import FastHttpSession
+from geventhttpclient.client import HTTPClientPool
+from urllib3 import PoolManager
+
+
+class ClientWrapper:
+    """ユーザーの HTTP クライアントを包み、request() で処理を追加するための基底クラス
+
+    get / post などは request() を経由し、それ以外の属性は包んだクライアントに委譲する。
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def request(self, method: str, url: str, catch_response: bool = False, **kwargs):
+        return self._client.request(method, url, catch_response=catch_response, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def options(self, url, **kwargs):
+        return self.request("OPTIONS", url, **kwargs)
+
+
+class TunedHttpSession(HttpSession):
+    """タイムアウトの既定値を持つ requests ベースのセッション"""
+
+    timeout = None
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class TunedHttpUser(HttpUser):
+    """接続プールを調整した requests ベースのユーザー"""
+
+    abstract = True
+    settings: Dict = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = self.create_session(self.environment, self.host, self)
+
+    @classmethod
+    def create_session(cls, environment, host: str, user=None) -> TunedHttpSession:
+        """このクラスのユーザーと同じ設定のセッション (ユーザー以外からの送信にも使う)"""
+        settings = cls.settings
+        session = TunedHttpSession(
+            base_url=host,
+            request_event=environment.events.request,
+            user=user,
+            pool_manager=cls.pool_manager,
+        )
+        session.trust_env = False
+        session.timeout = (settings["connect_timeout"], settings["network_timeout"])
+
+        # 共有プールが無い場合はユーザー毎のプールサイズを設定
+        adapter = partial(LocustHttpAdapter, pool_manager=cls.pool_manager)
+        session.mount("https://", adapter(pool_maxsize=settings["pool_size"]))
+        session.mount("http://", adapter(pool_maxsize=settings["pool_size"]))
+
+        if not settings["keep_alive"]:
+            session.headers["Connection"] = "close"
+        return session
+
+
+class TunedFastHttpUser(FastHttpUser):
+    """geventhttpclient ベースの高速なユーザー"""
+
+    abstract = True
+    settings: Dict = {}
+
+    @classmethod
+    def create_session(cls, environment, host: str, user=None) -> FastHttpSession:
+        """このクラスのユーザーと同じ設定のセッション (ユーザー以外からの送信にも使う)"""
+        return FastHttpSession(
+            base_url=host,
+            request_event=environment.events.request,
+            network_timeout=cls.network_timeout,
+            connection_timeout=cls.connection_timeout,
+            max_redirects=cls.max_redirects,
+            max_retries=cls.max_retries,
+            insecure=cls.insecure,
+            concurrency=cls.concurrency,
+            user=user,
+            client_pool=cls.client_pool,
+            ssl_context_factory=cls.ssl_context_factory,
+            headers=cls.default_headers,
+            proxy_host=cls.proxy_host,
+            proxy_port=cls.proxy_port,
+        )
+
+
+def select_http_user(settings: Dict):
+    """設定に応じて全ユーザークラスの基底となる HTTP ユーザークラスを返す"""
+    if settings["type"] == "fasthttp":
+        attrs = {
+            "abstract": True,
+            "settings": settings,
+            "concurrency": settings["pool_size"],
+            "network_timeout": settings["network_timeout"],
+            "connection_timeout": settings["connect_timeout"],
+        }
+        if not settings["keep_alive"]:
+            attrs["default_headers"] = {"Connection": "close"}
+        if settings["shared_pool"]:
+            # 全ユーザーで 1 つのクライアントプールを共有する
+            attrs["client_pool"] = HTTPClientPool(
+                concurrency=settings["pool_size"],
+                network_timeout=settings["network_timeout"],
+                connection_timeout=settings["connect_timeout"],
+            )
+        return type("DifyFastHttpUser", (TunedFastHttpUser,), attrs)
+
+    if settings["type"] != "requests":
+        raise ValueError(f"Unknown HTTP client type: {settings['type']}")
+
+    attrs = {"abstract": True, "settings": settings}
+    if settings["shared_pool"]:
+        attrs["pool_manager"] = PoolManager(maxsize=settings["pool_size"])
+    return type("DifyHttpUser", (TunedHttpUser,), attrs)
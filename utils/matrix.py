@@ -0,0 +1,165 @@
+import itertools
+import logging
+import os
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+import yaml
+
+# dify/docker-compose.yaml で調整できる主な設定
+COMPOSE_PARAMETERS = [
+    "SERVER_WORKER_AMOUNT",
+    "SERVER_WORKER_CLASS",
+    "CELERY_WORKER_AMOUNT",
+    "SQLALCHEMY_POOL_SIZE",
+    "SANDBOX_WORKER_TIMEOUT",
+    "NGINX_WORKER_PROCESSES",
+]
+
+
+def parse_grid(params: List[str], path: Optional[str] = None) -> Dict[str, List[str]]:
+    """--param (NAME=v1,v2) と YAML ファイル ({NAME: [v1, v2]}) から設定毎の値の一覧を作る"""
+    grid: Dict[str, List[str]] = {}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for name, values in (yaml.safe_load(f) or {}).items():
+                grid[name] = [str(value) for value in (values if isinstance(values, list) else [values])]
+    for param in params:
+        name, separator, values = param.partition("=")
+        if not separator or not values:
+            raise ValueError(f"Invalid parameter (expected NAME=v1,v2): {param}")
+        grid[name] = values.split(",")
+    for name in grid:
+        if name not in COMPOSE_PARAMETERS:
+            logging.warning(f"{name} is not one of the known docker-compose parameters {COMPOSE_PARAMETERS}")
+    return grid
+
+
+def expand_grid(grid: Dict[str, List[str]]) -> List[Dict[str, str]]:
+    """全ての組み合わせ (設定が無い場合は既定値のみの1件)"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def wait_until_ready(url: str, timeout: float = 300, interval: float = 2):
+    """URL が 5xx 以外を返すまで待つ"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return
+        except urllib.error.HTTPError as e:
+            if e.code < 500:
+                return
+        except OSError:
+            pass
+        if time.time() >= deadline:
+            raise TimeoutError(f"{url} was not ready within {timeout:.0f}s")
+        time.sleep(interval)
+
+
+class DockerComposeLauncher:
+    """設定を環境変数として docker compose のコンテナを作り直す
+
+    docker-compose.yaml は ${NAME:-default} で環境変数を参照するため、シェルの環境変数が .env より優先される。
+    """
+
+    def __init__(
+        self,
+        compose_file: str = "dify/docker-compose.yaml",
+        project: str = "",
+        api_host: str = "http://localhost/v1",
+        ready_timeout: float = 300,
+        down: bool = False,
+    ):
+        self.compose_file = compose_file
+        self.project = project
+        self.api_host = api_host
+        self.ready_timeout = ready_timeout
+        self.down = down
+
+    def _compose(self, *args: str, env: Optional[dict] = None):
+        command = ["docker", "compose", "-f", self.compose_file]
+        if self.project:
+            command += ["-p", self.project]
+        subprocess.run(command + list(args), check=True, env={**os.environ, **(env or {})})
+
+    def start(self, params: Dict[str, str]) -> Optional[str]:
+        """設定を反映してスタックを起動する (ユーザークラスのホストをそのまま使うため None を返す)"""
+        self._compose("up", "-d", "--force-recreate", env=params)
+        wait_until_ready(self.api_host.rstrip("/") + "/", self.ready_timeout)
+        return None
+
+    def stop(self):
+        if self.down:
+            self._compose("down")
+
+
+class MockLauncher:
+    """組み合わせ毎にモックサーバーを起動する (マトリクス実行自体の動作確認用)
+
+    モックは docker-compose の設定を解釈しないため、結果の差は負荷生成側の揺らぎのみとなる。
+    """
+
+    def __init__(self, **mock_config):
+        self.mock_config = mock_config
+        self.mock = None
+
+    def start(self, params: Dict[str, str]) -> Optional[str]:
+        """モックを起動し、全ユーザークラスの接続先とするホストを返す"""
+        from benchmarks.harness import MockProcess
+
+        self.mock = MockProcess(**self.mock_config).__enter__()
+        return self.mock.url
+
+    def stop(self):
+        if self.mock is not None:
+            self.mock.__exit__(None, None, None)
+            self.mock = None
+
+
+LAUNCHERS = {"docker": DockerComposeLauncher, "mock": MockLauncher}
+
+
+def summarize_stats(stats, error_rate_limit: float, p95_limit: float) -> dict:
+    """1回の実行の全体の統計 (PERFORMANCE の閾値を満たすかを含む)"""
+    total = stats.total
+    elapsed = max(total.last_request_timestamp - total.start_time, 1e-9) if total.last_request_timestamp else 0
+    failure_ratio = total.fail_ratio
+    p95 = total.get_response_time_percentile(0.95) if total.num_requests else 0
+    return {
+        "requests": total.num_requests,
+        "failures": total.num_failures,
+        "rps": total.num_requests / elapsed if elapsed else 0.0,
+        "failure_ratio": failure_ratio,
+        "p50": total.get_response_time_percentile(0.5) if total.num_requests else 0,
+        "p95": p95,
+        "p99": total.get_response_time_percentile(0.99) if total.num_requests else 0,
+        "meets_slo": bool(total.num_requests and failure_ratio <= error_rate_limit and p95 <= p95_limit),
+    }
+
+
+def rank_results(results: List[dict]) -> List[dict]:
+    """閾値を満たす設定を優先し、RPS の降順 (同じなら p95 の昇順) に並べる"""
+    return sorted(results, key=lambda row: (not row["meets_slo"], -row["rps"], row["p95"]))
+
+
+def render_table(ranked: List[dict], names: List[str]) -> str:
+    """順位表 (Markdown)"""
+    header = ["#"] + names + ["RPS", "p50 (ms)", "p95 (ms)", "p99 (ms)", "failures", "SLO"]
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    for rank, row in enumerate(ranked, start=1):
+        cells = [str(rank)] + [row["params"].get(name, "") for name in names]
+        cells += [
+            f"{row['rps']:.1f}",
+            f"{row['p50']:.0f}",
+            f"{row['p95']:.0f}",
+            f"{row['p99']:.0f}",
+            f"{row['failure_ratio']:.2%}",
+            "ok" if row["meets_slo"] else "NG",
+        ]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
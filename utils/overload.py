@@ -0,0 +1,187 @@
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+import gevent
+
+from utils.http_client import ClientWrapper
+
+SHED_STATUS_CODES = (429, 503)
+OVERLOAD_POLICIES = ["fail_fast", "retry_after", "backoff"]
+
+
+class RequestShed(Exception):
+    """サーバー (API ゲートウェイ / Dify) が過負荷のためリクエストを拒否した"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Request shed by server ({status_code})")
+        self.status_code = status_code
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """Retry-After ヘッダー (秒数または HTTP 日付) を秒数に変換"""
+    value = response.headers.get("Retry-After") if response.headers else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class OverloadPolicy:
+    """429 / 503 を受けた時の振る舞い
+
+    fail_fast: 再試行しない
+    retry_after: Retry-After の秒数だけ待って再試行 (ヘッダーが無ければ base_delay)
+    backoff: 指数バックオフ + full jitter (0 から base_delay * 2^(n-1) の一様乱数) で再試行
+    """
+
+    def __init__(self, policy: str = "fail_fast", max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30):
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy} (expected one of {OVERLOAD_POLICIES})")
+        self.policy = policy
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def retry_delay(self, attempt: int, response) -> Optional[float]:
+        """attempt 回目 (1 始まり) の試行が拒否された後の待ち時間 (None の場合は再試行しない)"""
+        if self.policy == "fail_fast" or attempt > self.max_retries:
+            return None
+        if self.policy == "retry_after":
+            delay = retry_after_seconds(response)
+            return min(self.base_delay if delay is None else delay, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+def _rewind_files(kwargs: dict):
+    """再送のためにアップロードするファイルを先頭に戻す"""
+    files = kwargs.get("files")
+    if not files:
+        return
+    for value in files.values() if isinstance(files, dict) else files:
+        file = value[1] if isinstance(value, tuple) else value
+        if isinstance(file, tuple):
+            file = file[1]
+        if hasattr(file, "seek"):
+            file.seek(0)
+
+
+class OverloadAwareClient(ClientWrapper):
+    """過負荷ポリシーに従って 429 / 503 を再試行する HTTP クライアントのラッパー
+
+    各試行は通常どおり locust の request イベントとして報告され、試行回数が attempt として渡される。
+    拒否された試行は既定で RequestShed を例外とする失敗になり、サーバーエラーと区別して集計できる。
+    """
+
+    def __init__(self, client, policy: OverloadPolicy):
+        super().__init__(client)
+        self.policy = policy
+
+    def request(self, method: str, url: str, catch_response: bool = False, **kwargs):
+        attempt = 1
+        while True:
+            response = self._client.request(method, url, catch_response=True, **kwargs)
+            response.request_meta["attempt"] = attempt
+            if response.status_code not in SHED_STATUS_CODES:
+                break
+            # 呼び出し側で success() / failure() が呼ばれなければ拒否として報告する
+            # 公開の failure() は with ブロックに入った後 (_entered) でなければ LocustError になり、ここでは呼べない。
+            # failure() が設定するのと同じ属性を直接設定する (locust 2.x の HttpSession / FastHttpSession の
+            # ResponseContextManager の実装に依存、2.46 で確認)
+            response._manual_result = RequestShed(response.status_code)
+            delay = self.policy.retry_delay(attempt, response)
+            if delay is None:
+                break
+            with response:
+                response.content  # ストリーミング時も接続を再利用できるよう本文を読み切る
+            gevent.sleep(delay)
+            _rewind_files(kwargs)
+            attempt += 1
+
+        if catch_response:
+            return response
+        with response:
+            pass
+        return response
+
+
+class OverloadStats:
+    """過負荷時の挙動の集計
+
+    requests: 論理リクエスト数 (初回の試行), attempts: 再試行を含む全試行数,
+    shed: 拒否された試行数, succeeded: 成功した試行数
+    retry_amplification = attempts / requests, goodput = succeeded / 経過秒数
+    """
+
+    FIELDS = ["requests", "attempts", "shed", "succeeded"]
+
+    def __init__(self):
+        self.entries: Dict[tuple, List[int]] = {}
+        self.started_at = time.time()
+
+    def attach(self, environment):
+        """locust のイベントにリスナーを登録"""
+        environment.events.request.add_listener(self.on_request)
+        environment.events.test_start.add_listener(lambda **kwargs: self.reset())
+        environment.events.test_stop.add_listener(lambda **kwargs: self.log_summary())
+        return self
+
+    def reset(self):
+        self.entries = {}
+        self.started_at = time.time()
+
+    def on_request(self, request_type, name, exception=None, attempt=None, **kwargs):
+        if attempt is None:
+            return  # クライアントを経由しないイベント (COMPLETION など)
+        entry = self.entries.get((request_type, name))
+        if entry is None:
+            entry = self.entries[(request_type, name)] = [0, 0, 0, 0]
+        if attempt == 1:
+            entry[0] += 1
+        entry[1] += 1
+        if isinstance(exception, RequestShed):
+            entry[2] += 1
+        elif exception is None:
+            entry[3] += 1
+
+    def summary(self) -> Dict[str, dict]:
+        """エンドポイント毎 ("Aggregated" は全体) の集計値"""
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        totals = [sum(entry[index] for entry in self.entries.values()) for index in range(len(self.FIELDS))]
+        rows = {f"{method} {name}": entry for (method, name), entry in sorted(self.entries.items())}
+        rows["Aggregated"] = totals
+        result = {}
+        for label, (requests, attempts, shed, succeeded) in rows.items():
+            result[label] = {
+                "requests": requests,
+                "attempts": attempts,
+                "shed": shed,
+                "succeeded": succeeded,
+                "shed_rate": shed / elapsed,
+                "shed_ratio": shed / attempts if attempts else 0.0,
+                "retry_amplification": attempts / requests if requests else 0.0,
+                "goodput": succeeded / elapsed,
+            }
+        return result
+
+    def log_summary(self):
+        summary = self.summary()
+        if not summary["Aggregated"]["attempts"]:
+            return
+        logging.info(
+            f"{'Overload':60s} {'requests':>9s} {'attempts':>9s} {'shed':>7s} {'shed/s':>8s} "
+            f"{'amplif.':>8s} {'goodput/s':>10s}"
+        )
+        for label, row in summary.items():
+            logging.info(
+                f"{label[:60]:60s} {row['requests']:9d} {row['attempts']:9d} {row['shed']:7d} "
+                f"{row['shed_rate']:8.2f} {row['retry_amplification']:8.2f} {row['goodput']:10.2f}"
+            )
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import gevent
+import numpy as np
+
+from utils.stats import batch_means_interval, bootstrap_percentile_interval
+
+AGGREGATED = "Aggregated"
+
+
+class PrecisionMonitor:
+    """エンドポイント毎のスループットとパーセンタイルの信頼区間、および目標精度に達した時点での停止
+
+    interval 秒毎の区間 (バッチ) に区切って、エンドポイント毎のリクエスト数とレスポンスタイムのヒストグラムを記録する。
+        スループット  バッチ毎の RPS のバッチ平均法による t 区間
+        パーセンタイル バッチを復元抽出するブートストラップの区間 (バッチ内の相関を保つ)
+    全ての対象の相対半幅 (区間の半幅 / 推定値) が target 以下になった時点を収束とし、
+    adaptive の場合はその時点で試験を停止する (LOAD_TEST の duration は上限として働く)。
+    対象は endpoints (未指定の場合は min_requests 件以上のエンドポイントと Aggregated)。
+    統計が集計される Master (単体実行時は自身) で動作させる。結果は path に JSON で保存する。
+    """
+
+    def __init__(
+        self,
+        path: str = "results/precision.json",
+        adaptive: bool = False,
+        interval: float = 10,
+        target: float = 0.05,
+        confidence: float = 0.95,
+        percentiles: Optional[List[float]] = None,
+        endpoints: Optional[List[str]] = None,
+        min_batches: int = 10,
+        min_requests: int = 100,
+        bootstrap: int = 1000,
+    ):
+        self.path = path
+        self.adaptive = adaptive
+        self.interval = interval
+        self.target = target
+        self.confidence = confidence
+        self.percentiles = percentiles or [50, 95, 99]
+        self.endpoints = endpoints or []
+        self.min_batches = min_batches
+        self.min_requests = min_requests
+        self.bootstrap = bootstrap
+        self.environment = None
+        self.batches: Dict[str, List[dict]] = {}  # エンドポイント -> [{"seconds", "requests", "response_times"}]
+        self.converged_at: Optional[float] = None
+        self.stopped_early = False
+        self.started_at: Optional[float] = None
+        self._rng = np.random.default_rng()
+        self._greenlet = None
+        self._previous: Dict[str, tuple] = {}  # 前回のバッチ終了時点のエンドポイント毎の累計
+        self._previous_at = 0.0
+
+    def attach(self, environment):
+        """locust のイベントにリスナーを登録 (ウォームアップ終了時のリセットは locustfile から reset() を呼ぶ)"""
+        self.environment = environment
+        environment.events.test_start.add_listener(lambda **kwargs: self.start())
+        environment.events.test_stop.add_listener(lambda **kwargs: self.stop())
+        environment.events.reset_stats.add_listener(lambda **kwargs: self.reset())
+        return self
+
+    def reset(self):
+        """統計のリセットに合わせて、以降のバッチのみを使う"""
+        self.batches = {}
+        self._previous = {}
+        self._previous_at = time.time()
+
+    def start(self):
+        self.stop()
+        self.batches = {}
+        self.converged_at = None
+        self.stopped_early = False
+        self.started_at = time.time()
+        self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is None:
+            return
+        self._greenlet.kill(block=True)
+        self._greenlet = None
+        self.report()
+
+    def _snapshot(self) -> Dict[str, tuple]:
+        stats = self.environment.stats
+        entries = [(f"{entry.method} {entry.name}", entry) for entry in stats.entries.values()]
+        entries.append((AGGREGATED, stats.total))
+        return {name: (entry.num_requests, dict(entry.response_times)) for name, entry in entries}
+
+    def _run(self):
+        self._previous = self._snapshot()
+        self._previous_at = time.time()
+        while True:
+            gevent.sleep(self.interval)
+            current, now = self._snapshot(), time.time()
+            previous, previous_at = self._previous, self._previous_at
+            for name, (requests, response_times) in current.items():
+                before_requests, before_times = previous.get(name, (0, {}))
+                self.batches.setdefault(name, []).append(
+                    {
+                        "seconds": now - previous_at,
+                        "requests": requests - before_requests,
+                        "response_times": {
+                            key: value - before_times.get(key, 0)
+                            for key, value in response_times.items()
+                            if value > before_times.get(key, 0)
+                        },
+                    }
+                )
+            self._previous, self._previous_at = current, now
+
+            if self.converged_at is None and self._converged(self.intervals()):
+                self.converged_at = now - self.started_at
+                logging.info(f"Precision: all intervals within ±{self.target:.1%} after {self.converged_at:.0f}s")
+                if self.adaptive:
+                    self.stopped_early = True
+                    # test_stop のリスナーからこの greenlet を止めないよう、停止は別の greenlet で行う
+                    gevent.spawn(self.environment.runner.quit)
+                    return
+
+    def _targets(self) -> List[str]:
+        if self.endpoints:
+            return [name for name in self.batches if name in self.endpoints or name.split(" ", 1)[-1] in self.endpoints]
+        return [
+            name
+            for name, batches in self.batches.items()
+            if name == AGGREGATED or sum(batch["requests"] for batch in batches) >= self.min_requests
+        ]
+
+    def intervals(self) -> Dict[str, dict]:
+        """対象のエンドポイント毎の RPS とパーセンタイルの推定値・信頼区間・相対半幅"""
+        result = {}
+        for name in self._targets():
+            batches = self.batches[name]
+            # 最初のリクエストより前のバッチ (立ち上げ中) は除く
+            first = next((index for index, batch in enumerate(batches) if batch["requests"]), len(batches))
+            batches = batches[first:]
+            row = {"batches": len(batches), "requests": sum(batch["requests"] for batch in batches)}
+            if len(batches) < 2:
+                result[name] = row
+                continue
+
+            rps, half_width = batch_means_interval([batch["requests"] / batch["seconds"] for batch in batches])
+            row["rps"] = _interval(rps, rps - half_width, rps + half_width)
+
+            keys = np.array(sorted({key for batch in batches for key in batch["response_times"]}), dtype=float)
+            if len(keys):
+                position = {key: index for index, key in enumerate(keys)}
+                counts = np.zeros((len(batches), len(keys)))
+                for index, batch in enumerate(batches):
+                    for key, count in batch["response_times"].items():
+                        counts[index, position[key]] = count
+                for percentile in self.percentiles:
+                    estimate, low, high = bootstrap_percentile_interval(
+                        keys, counts, percentile / 100, self.confidence, self.bootstrap, self._rng
+                    )
+                    row[f"p{percentile:g}"] = _interval(estimate, low, high)
+            result[name] = row
+        return result
+
+    def _converged(self, intervals: Dict[str, dict]) -> bool:
+        if not intervals:
+            return False
+        for row in intervals.values():
+            if row["batches"] < self.min_batches:
+                return False
+            metrics = [value for key, value in row.items() if isinstance(value, dict)]
+            if not metrics or any(metric["relative"] is None or metric["relative"] > self.target for metric in metrics):
+                return False
+        return True
+
+    def report(self) -> Dict[str, dict]:
+        """信頼区間をログと JSON に出力"""
+        intervals = self.intervals()
+        if not intervals:
+            return intervals
+
+        logging.info(f"Precision ({self.confidence:.0%} intervals, target ±{self.target:.1%})")
+        logging.info(f"{'Endpoint':45s} {'Metric':6s} {'estimate':>10s} {'low':>10s} {'high':>10s} {'±':>7s}")
+        for name, row in intervals.items():
+            for metric, value in row.items():
+                if not isinstance(value, dict):
+                    continue
+                relative = value["relative"]
+                mark = "" if relative is not None and relative <= self.target else "  *"
+                logging.info(
+                    f"{name[:45]:45s} {metric:6s} {value['estimate']:10.1f} {value['low']:10.1f} {value['high']:10.1f} "
+                    + (f"{relative:7.1%}" if relative is not None else f"{'-':>7s}")
+                    + mark
+                )
+        if self.converged_at is None:
+            logging.info("Precision: target not reached (* marks intervals wider than the target)")
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "interval": self.interval,
+                    "confidence": self.confidence,
+                    "target": self.target,
+                    "converged_at": self.converged_at,
+                    "stopped_early": self.stopped_early,
+                    "endpoints": intervals,
+                },
+                f,
+                indent=2,
+            )
+        return intervals
+
+
+def _interval(estimate: float, low: float, high: float) -> dict:
+    half_width = max(estimate - low, high - estimate)
+    # 推定値が 0 の場合は相対値を定義できない (半幅も 0 であれば収束とみなす)
+    relative = half_width / abs(estimate) if estimate else (0.0 if half_width == 0 else None)
+    return {"estimate": estimate, "low": low, "high": high, "relative": relative}
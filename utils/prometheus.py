@@ -0,0 +1,211 @@
+import logging
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+from gevent.pywsgi import WSGIServer
+
+from utils.metrics import MetricsCollector
+
+# ヒストグラムの上限値 (秒)
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+TOKENS_PER_SECOND_BUCKETS = [1, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """ラベル毎の累積前ヒストグラム (バケット毎の件数・合計・件数)"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, labels: Tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+
+class PrometheusExporter:
+    """負荷試験プロセスのメトリクスを OpenMetrics 形式で公開する HTTP エンドポイント
+
+    events.request のリスナーは dict の加算のみを行い、テキストへの変換はスクレイプ時に行う。
+    locust は gevent 上の単一スレッドで動作し、リスナーとスクレイプ処理は同時に実行されないためロックは不要。
+    分散実行時はワーカー毎に起動し (ポートが使用中なら次のポートを使う)、Master では集計済みの RPS とユーザー数のみを公開する。
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 9646):
+        self.host = host
+        self.port = port
+        self.environment = None
+        self.requests: Dict[Tuple, int] = {}
+        self.failures: Dict[Tuple, int] = {}
+        self.response_bytes: Dict[Tuple, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.ttft = Histogram(LATENCY_BUCKETS)
+        self.tokens_per_second = Histogram(TOKENS_PER_SECOND_BUCKETS)
+        self.tokens: Dict[Tuple, int] = {}
+        self.retries: Dict[Tuple, int] = {}
+        self._server = None
+
+    def attach(self, environment):
+        """locust のイベントにリスナーを登録し、HTTP サーバーを起動"""
+        self.environment = environment
+        environment.events.request.add_listener(self.on_request)
+        environment.events.quitting.add_listener(lambda **kwargs: self.stop())
+        self.start()
+        return self
+
+    def on_request(
+        self,
+        request_type,
+        name,
+        response_time,
+        response_length,
+        exception=None,
+        ttft=None,
+        tokens=None,
+        stream_time=None,
+        attempt=None,
+        **kwargs,
+    ):
+        key = (request_type, name)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        if attempt and attempt > 1:
+            self.retries[key] = self.retries.get(key, 0) + 1
+        self.response_bytes[key] = self.response_bytes.get(key, 0) + (response_length or 0)
+        self.latency.observe(key, (response_time or 0) / 1000)
+        if exception is not None:
+            error_key = (request_type, name, type(exception).__name__)
+            self.failures[error_key] = self.failures.get(error_key, 0) + 1
+        if ttft is not None:
+            self.ttft.observe(key, ttft / 1000)
+        if tokens:
+            self.tokens[key] = self.tokens.get(key, 0) + tokens
+            generation_time = (stream_time - ttft) / 1000 if stream_time and ttft is not None else 0
+            if tokens > 1 and generation_time > 0:
+                self.tokens_per_second.observe(key, (tokens - 1) / generation_time)
+
+    def start(self, max_attempts: int = 64):
+        # 同一ホストで複数ワーカーを起動した場合は、空いている次のポートを使う
+        for offset in range(max_attempts):
+            server = WSGIServer((self.host, self.port + offset), self._app, log=None)
+            try:
+                server.start()
+            except OSError:
+                continue
+            self._server = server
+            self.port += offset
+            logging.info(f"Metrics exporter listening on http://{self.host}:{self.port}/metrics")
+            return
+        raise OSError(f"No free port for the metrics exporter in {self.port}-{self.port + max_attempts - 1}")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop(timeout=1)
+            self._server = None
+
+    def _app(self, environ, start_response):
+        if environ.get("PATH_INFO", "/") not in ("/", "/metrics"):
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"not found\n"]
+        openmetrics = "application/openmetrics-text" in environ.get("HTTP_ACCEPT", "")
+        body = self.render(openmetrics).encode("utf-8")
+        content_type = OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE
+        start_response("200 OK", [("Content-Type", content_type), ("Content-Length", str(len(body)))])
+        return [body]
+
+    def render(self, openmetrics: bool = True) -> str:
+        """テキスト形式に変換 (openmetrics=False の場合は Prometheus 0.0.4 形式)"""
+        lines: List[str] = []
+        request_labels = ("method", "name")
+
+        def family(name: str, metric_type: str, help_text: str):
+            # OpenMetrics ではカウンターのファミリー名に _total を付けない
+            family_name = name[: -len("_total")] if openmetrics and name.endswith("_total") else name
+            lines.append(f"# HELP {family_name} {help_text}")
+            lines.append(f"# TYPE {family_name} {metric_type}")
+
+        def samples(name: str, values: Dict[Tuple, float], label_names: Tuple[str, ...]):
+            for labels, value in values.items():
+                lines.append(f"{name}{_labels(label_names, labels)} {_number(value)}")
+
+        def histogram(name: str, help_text: str, data: Histogram):
+            family(name, "histogram", help_text)
+            for labels, (counts, total, count) in data.series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(data.buckets + ["+Inf"], counts):
+                    cumulative += bucket_count
+                    le = f'le="{bound}"' if bound == "+Inf" else f'le="{float(bound)}"'
+                    lines.append(f"{name}_bucket{_labels(request_labels, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(request_labels, labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(request_labels, labels)} {count}")
+
+        family("locust_requests_total", "counter", "Completed requests")
+        samples("locust_requests_total", self.requests, request_labels)
+        family("locust_request_failures_total", "counter", "Failed requests by exception type")
+        samples("locust_request_failures_total", self.failures, request_labels + ("error",))
+        family("locust_request_retries_total", "counter", "Retried attempts after 429/503")
+        samples("locust_request_retries_total", self.retries, request_labels)
+        family("locust_response_bytes_total", "counter", "Response body bytes")
+        samples("locust_response_bytes_total", self.response_bytes, request_labels)
+        histogram("locust_request_duration_seconds", "Request latency", self.latency)
+        histogram("locust_stream_ttft_seconds", "Time to first streamed token", self.ttft)
+        family("locust_stream_tokens_total", "counter", "Streamed tokens (message chunks)")
+        samples("locust_stream_tokens_total", self.tokens, request_labels)
+        histogram("locust_stream_tokens_per_second", "Token rate after the first token", self.tokens_per_second)
+
+        # 集計済みの統計 (Master では全ワーカー分)
+        environment = self.environment
+        if environment is not None:
+            stats = environment.stats
+            family("locust_current_rps", "gauge", "Requests per second over the last seconds")
+            samples(
+                "locust_current_rps",
+                {(entry.method, entry.name): entry.current_rps for entry in stats.entries.values()},
+                request_labels,
+            )
+            runner = environment.runner
+            if runner is not None:
+                family("locust_users", "gauge", "Running users")
+                lines.append(f"locust_users {runner.user_count}")
+
+        # 負荷生成ホストのリソース
+        metrics = MetricsCollector.collect_system_metrics()
+        family("locust_host_cpu_percent", "gauge", "Host CPU utilization")
+        lines.append(f"locust_host_cpu_percent {_number(float(metrics['cpu_percent']))}")
+        family("locust_host_memory_percent", "gauge", "Host memory utilization")
+        lines.append(f"locust_host_memory_percent {_number(float(metrics['memory_percent']))}")
+        if metrics["disk_io"] is not None:
+            family("locust_host_disk_bytes_total", "counter", "Host disk I/O bytes")
+            lines.append(f'locust_host_disk_bytes_total{{direction="read"}} {metrics["disk_io"].read_bytes}')
+            lines.append(f'locust_host_disk_bytes_total{{direction="write"}} {metrics["disk_io"].write_bytes}')
+        family("locust_host_network_bytes_total", "counter", "Host network I/O bytes")
+        lines.append(f'locust_host_network_bytes_total{{direction="sent"}} {metrics["network_io"].bytes_sent}')
+        lines.append(f'locust_host_network_bytes_total{{direction="recv"}} {metrics["network_io"].bytes_recv}')
+
+        family("locust_exporter_scrape_timestamp_seconds", "gauge", "Time of this scrape")
+        lines.append(f"locust_exporter_scrape_timestamp_seconds {_number(time.time())}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
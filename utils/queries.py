@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import random
+import uuid
+import weakref
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+MODES = ("fixed", "unique", "uniform", "zipf")
+FIRST = "first"
+REPEAT = "repeat"
+
+_mixes = weakref.WeakKeyDictionary()
+
+
+def _round_ms(value: float) -> int:
+    """locust と同じ丸め (100ms 未満はそのまま、1000ms 未満は 10ms 単位、以上は 100ms 単位)"""
+    value = int(round(value))
+    if value < 100:
+        return value
+    if value < 1000:
+        return int(round(value, -1))
+    return int(round(value, -2))
+
+
+def _percentile(histogram: Dict[int, int], fraction: float) -> Optional[float]:
+    total = sum(histogram.values())
+    if not total:
+        return None
+    threshold = total * fraction
+    processed = 0
+    for value in sorted(histogram):
+        processed += histogram[value]
+        if processed >= threshold:
+            return float(value)
+    return float(max(histogram))
+
+
+class QueryMix:
+    """クエリ・入力の分布 (キャッシュの効果を分離するため)
+
+    mode:
+        fixed   全リクエストで同じクエリ (従来どおり)
+        unique  毎回異なるクエリ (全て初回)
+        uniform pool_size 種類のクエリから一様に選ぶ
+        zipf    pool_size 種類のクエリから Zipf 分布 (指数 zipf_s) で選ぶ (少数のクエリに偏る)
+
+    クエリの初回・繰り返しは調整 (utils.coordination) の first_seen で判定するため、
+    COORDINATION=redis の場合は全ワーカーを通した初回となる。salt はクエリの文言に含め、実行毎に変えるとサーバー側のキャッシュも初回になる。
+    """
+
+    def __init__(
+        self,
+        mode: str = "fixed",
+        pool_size: int = 1000,
+        zipf_s: float = 1.1,
+        salt: str = "",
+        seed: Optional[int] = None,
+        coordinator=None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown query mix mode: {mode} (expected one of {MODES})")
+        self.mode = mode
+        self.pool_size = pool_size
+        self.salt = salt
+        self.random = random.Random(seed)
+        self.coordinator = coordinator
+        self.cumulative: List[float] = []
+        if mode == "zipf":
+            self.cumulative = list(accumulate(1 / (rank + 1) ** zipf_s for rank in range(pool_size)))
+
+    @classmethod
+    def of(cls, environment) -> "QueryMix":
+        """environment に登録済みの分布 (未登録なら fixed)"""
+        mix = _mixes.get(environment)
+        if mix is None:
+            mix = cls().attach(environment)
+        return mix
+
+    def attach(self, environment):
+        if self.coordinator is None and self.mode != "fixed":
+            from utils.coordination import LocalCoordinator
+
+            self.coordinator = LocalCoordinator.of(environment)
+        _mixes[environment] = self
+        return self
+
+    def _variant(self) -> str:
+        if self.mode == "unique":
+            return uuid.uuid4().hex[:12]
+        if self.mode == "uniform":
+            return str(self.random.randrange(self.pool_size))
+        return str(bisect_left(self.cumulative, self.random.random() * self.cumulative[-1]))
+
+    def query(self, namespace: str, base: str) -> Tuple[str, Optional[str]]:
+        """クエリの文言と、初回 (first) / 繰り返し (repeat) の区別を返す (fixed の場合は区別しない)"""
+        if self.mode == "fixed":
+            return base, None
+        variant = self._variant()
+        text = f"{base} (#{self.salt}{variant})"
+        if self.mode == "unique":
+            return text, FIRST
+        return text, FIRST if self.coordinator.first_seen(f"query:{namespace}:{self.salt}", variant) else REPEAT
+
+
+class QueryStats:
+    """初回・繰り返しのクエリ毎のレイテンシ (と TTFT) の集計
+
+    request イベントの context の "query" (first / repeat) でリクエストを分け、
+    エンドポイント毎に p50 / p95 と、初回に対する繰り返しの短縮率 (キャッシュの効果) を試験終了時に出力する。
+    分散実行時はワーカーが前回の報告以降の件数を report_to_master で送り、Master で集計する。
+    """
+
+    def __init__(self, path: str = "results/query_mix.json"):
+        self.path = path
+        self.latency: Dict[Tuple[str, str], Dict[int, int]] = {}
+        self.ttft: Dict[Tuple[str, str], Dict[int, int]] = {}
+        self.failures: Dict[Tuple[str, str], int] = {}
+        self.pending: Dict[str, dict] = {"latency": {}, "ttft": {}, "failures": {}}
+        self._forward = False
+
+    def attach(self, environment):
+        from locust.runners import MasterRunner, WorkerRunner
+
+        runner = environment.runner
+        self._forward = isinstance(runner, WorkerRunner)
+        if self._forward:
+            environment.events.request.add_listener(self.on_request)
+            environment.events.report_to_master.add_listener(self.on_report_to_master)
+            return self
+        if isinstance(runner, MasterRunner):
+            environment.events.worker_report.add_listener(self.on_worker_report)
+        else:
+            environment.events.request.add_listener(self.on_request)
+        environment.events.test_start.add_listener(lambda **kwargs: self.reset())
+        environment.events.test_stop.add_listener(lambda **kwargs: self.write())
+        return self
+
+    def reset(self):
+        self.latency = {}
+        self.ttft = {}
+        self.failures = {}
+
+    def on_request(self, name, response_time, context=None, exception=None, ttft=None, **kwargs):
+        kind = context.get("query") if context else None
+        if kind is None:
+            return
+        key = (name, kind)
+        if exception is not None:
+            self._add(self.failures, self.pending["failures"], key, 1)
+            return
+        self._observe(self.latency, self.pending["latency"], key, _round_ms(response_time))
+        if ttft is not None:
+            self._observe(self.ttft, self.pending["ttft"], key, _round_ms(ttft))
+
+    def _observe(self, series: dict, pending: dict, key: Tuple[str, str], value: int):
+        histogram = series.setdefault(key, {})
+        histogram[value] = histogram.get(value, 0) + 1
+        if self._forward:
+            histogram = pending.setdefault(key, {})
+            histogram[value] = histogram.get(value, 0) + 1
+
+    def _add(self, series: dict, pending: dict, key: Tuple[str, str], count: int):
+        series[key] = series.get(key, 0) + count
+        if self._forward:
+            pending[key] = pending.get(key, 0) + count
+
+    def on_report_to_master(self, client_id, data, **kwargs):
+        data["query_mix"] = {
+            "latency": [
+                [name, kind, list(histogram.items())] for (name, kind), histogram in self.pending["latency"].items()
+            ],
+            "ttft": [[name, kind, list(histogram.items())] for (name, kind), histogram in self.pending["ttft"].items()],
+            "failures": [[name, kind, count] for (name, kind), count in self.pending["failures"].items()],
+        }
+        self.pending = {"latency": {}, "ttft": {}, "failures": {}}
+
+    def on_worker_report(self, client_id, data, **kwargs):
+        report = data.get("query_mix")
+        if not report:
+            return
+        for series, column in ((self.latency, "latency"), (self.ttft, "ttft")):
+            for name, kind, items in report[column]:
+                histogram = series.setdefault((name, kind), {})
+                for value, count in items:
+                    histogram[value] = histogram.get(value, 0) + count
+        for name, kind, count in report["failures"]:
+            self.failures[(name, kind)] = self.failures.get((name, kind), 0) + count
+
+    def summary(self) -> Dict[str, dict]:
+        """エンドポイント毎の初回・繰り返しの件数・p50・p95・TTFT p50 と、繰り返しでの p50 の短縮率"""
+        result = {}
+        for name in sorted({name for name, _ in list(self.latency) + list(self.failures)}):
+            row = {}
+            for kind in (FIRST, REPEAT):
+                latency = self.latency.get((name, kind), {})
+                ttft = self.ttft.get((name, kind), {})
+                row[kind] = {
+                    "requests": sum(latency.values()),
+                    "failures": self.failures.get((name, kind), 0),
+                    "p50": _percentile(latency, 0.5),
+                    "p95": _percentile(latency, 0.95),
+                    "ttft_p50": _percentile(ttft, 0.5),
+                }
+            first, repeat = row[FIRST]["p50"], row[REPEAT]["p50"]
+            row["repeat_speedup"] = 1 - repeat / first if first and repeat is not None else None
+            result[name] = row
+        return result
+
+    def write(self):
+        summary = self.summary()
+        if not summary:
+            return
+        logging.info(
+            f"{'Query mix':50s} {'first':>7s} {'p50':>7s} {'p95':>7s} {'repeat':>7s} {'p50':>7s} {'p95':>7s} {'saved':>7s}"
+        )
+        for name, row in summary.items():
+            first, repeat = row[FIRST], row[REPEAT]
+            columns = [first["requests"], first["p50"], first["p95"], repeat["requests"], repeat["p50"], repeat["p95"]]
+            saved = f"{row['repeat_speedup']:.0%}" if row["repeat_speedup"] is not None else "-"
+            logging.info(
+                f"{name[:50]:50s} "
+                + " ".join(f"{value:7.0f}" if value is not None else f"{'-':>7s}" for value in columns)
+                + f" {saved:>7s}"
+            )
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
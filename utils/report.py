@@ -0,0 +1,435 @@
+import csv
+import glob
+import html
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.errors import load_errors
+from utils.result_log import load_result_log
+from utils.stats import mann_whitney_u, welch_t_test
+
+AGGREGATED = "Aggregated"
+PERCENTILES = {"p50": 50, "p90": 90, "p95": 95, "p99": 99}
+COMPARED_METRICS = ["p50", "p95", "p99", "avg", "rps", "failure_rate"]
+MAX_TEST_SAMPLES = 20000  # 有意差検定に使うサンプル数の上限
+COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b"]
+
+
+class ResultSet:
+    """1 回分のテスト結果 (Locust CSV またはリクエスト単位ログ)"""
+
+    def __init__(self, label: str, source: str):
+        self.label = label
+        self.source = source
+        self.duration = 0.0
+        self.warmup = 0.0  # 除外したウォームアップ期間 (秒)
+        self.endpoints: Dict[str, Dict[str, float]] = {}
+        self.samples: Dict[str, np.ndarray] = {}
+        self.intervals: Dict[str, Dict[str, np.ndarray]] = {}
+        self.errors: List[dict] = []  # タスク内のエラー (utils.errors)
+
+
+def _float(value: str) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _csv_prefix(path: str) -> Optional[str]:
+    if path.endswith("_stats.csv"):
+        return path[: -len("_stats.csv")]
+    if os.path.isdir(path):
+        found = sorted(glob.glob(os.path.join(path, "*_stats.csv")))
+        return found[0][: -len("_stats.csv")] if found else None
+    if os.path.exists(path + "_stats.csv"):
+        return path
+    return None
+
+
+def load_csv_results(label: str, prefix: str) -> ResultSet:
+    """Locust の --csv 出力 (<prefix>_stats.csv, <prefix>_stats_history.csv) を読み込む"""
+    result = ResultSet(label, "csv")
+    with open(prefix + "_stats.csv", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            count = _float(row["Request Count"])
+            failures = _float(row["Failure Count"])
+            result.endpoints[row["Name"]] = {
+                "count": count,
+                "failures": failures,
+                "failure_rate": failures / count if count else 0.0,
+                "avg": _float(row["Average Response Time"]),
+                "rps": _float(row["Requests/s"]),
+                **{key: _float(row[f"{value}%"]) for key, value in PERCENTILES.items()},
+            }
+
+    history_path = prefix + "_stats_history.csv"
+    if os.path.exists(history_path):
+        rows: Dict[str, List[Tuple[float, float, float, float]]] = {}
+        with open(history_path, encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                rows.setdefault(row["Name"], []).append(
+                    (_float(row["Timestamp"]), _float(row["Requests/s"]), _float(row["50%"]), _float(row["95%"]))
+                )
+        start = min((values[0][0] for values in rows.values() if values), default=0.0)
+        for name, values in rows.items():
+            array = np.array(values, dtype=float)
+            result.intervals[name] = {
+                "time": array[:, 0] - start,
+                "rps": array[:, 1],
+                "p50": array[:, 2],
+                "p95": array[:, 3],
+            }
+            result.duration = max(result.duration, float(array[-1, 0] - start))
+    return result
+
+
+def _summarize(response_times: np.ndarray, failed: np.ndarray, duration: float) -> Dict[str, float]:
+    count = len(response_times)
+    failures = int(failed.sum())
+    summary = {
+        "count": count,
+        "failures": failures,
+        "failure_rate": failures / count if count else 0.0,
+        "avg": float(response_times.mean()) if count else float("nan"),
+        "rps": count / duration if duration else float("nan"),
+    }
+    for key, value in PERCENTILES.items():
+        summary[key] = float(np.percentile(response_times, value)) if count else float("nan")
+    return summary
+
+
+def _intervals(
+    timestamps: np.ndarray, response_times: np.ndarray, start: float, end: float, bin_seconds: float
+) -> Dict:
+    bins = ((timestamps - start) // bin_seconds).astype(np.int64)
+    n_bins = int(bins.max()) + 1 if len(bins) else 0
+    counts = np.bincount(bins, minlength=n_bins)
+    p50 = np.full(n_bins, np.nan)
+    p95 = np.full(n_bins, np.nan)
+    order = np.argsort(bins, kind="stable")
+    sorted_times = response_times[order]
+    edges = np.concatenate(([0], np.cumsum(counts)))
+    for index in range(n_bins):
+        values = sorted_times[edges[index] : edges[index + 1]]
+        if len(values):
+            p50[index], p95[index] = np.percentile(values, [50, 95])
+    # 最後の区間は実行の終了までの実際の長さで割る
+    offsets = np.arange(n_bins) * bin_seconds
+    widths = np.clip(end - start - offsets, 0.001, bin_seconds)
+    return {
+        "time": offsets + widths / 2,
+        "rps": counts / widths,
+        "p50": p50,
+        "p95": p95,
+    }
+
+
+def load_log_results(label: str, path: str, bin_seconds: float = 10.0, include_warmup: bool = False) -> ResultSet:
+    """リクエスト単位ログ (utils.result_log) を読み込む
+
+    ウォームアップ終了時刻が記録されている場合、include_warmup=False ならそれ以前のリクエストを除外する。
+    """
+    result = ResultSet(label, "log")
+    log = load_result_log(path)
+    records = log.records
+    if not include_warmup and len(records) and not np.isnan(log.warmup_ends).all():
+        result.warmup = max(float(np.nanmax(log.warmup_ends) - records["timestamp"].min()), 0.0)
+        records = records[log.after_warmup()]
+    if not len(records):
+        return result
+
+    timestamps = np.asarray(records["timestamp"])
+    response_times = np.asarray(records["response_time"], dtype=float)
+    failed = np.asarray(records["failed"])
+    names = np.asarray(records["name"])
+    start = float(timestamps.min())
+    end = float((timestamps + response_times / 1000).max())  # 最後に完了したリクエストの終了時刻
+    result.duration = end - start
+
+    groups = {AGGREGATED: np.ones(len(records), dtype=bool)}
+    for code in np.unique(names):
+        groups[log.strings["name"][code]] = names == code
+
+    for name, mask in groups.items():
+        result.endpoints[name] = _summarize(response_times[mask], failed[mask], result.duration)
+        result.samples[name] = response_times[mask]
+        result.intervals[name] = _intervals(timestamps[mask], response_times[mask], start, end, bin_seconds)
+    return result
+
+
+def load_results(spec: str, bin_seconds: float = 10.0, include_warmup: bool = False) -> ResultSet:
+    """label=path 形式 (label は省略可) の指定から結果を読み込む"""
+    label, _, path = spec.rpartition("=")
+    path = path.rstrip("/")
+    label = label or os.path.basename(path)
+
+    # 実行毎のディレクトリ、または実行が1回分の RESULT_LOG_DIR
+    log_files = glob.glob(os.path.join(path, "requests-*.json")) or glob.glob(os.path.join(path, "*", "requests-*.json"))
+    if os.path.isdir(path) and log_files:
+        result = load_log_results(label, path, bin_seconds, include_warmup)
+    elif path.endswith(".json") and os.path.exists(path):
+        result = load_log_results(label, path, bin_seconds, include_warmup)
+    else:
+        prefix = _csv_prefix(path)
+        if not prefix:
+            raise FileNotFoundError(f"No Locust CSV or result log found at {path}")
+        result = load_csv_results(label, prefix)
+
+    # 同じディレクトリにタスク内のエラーの集計 (ERROR_LOG_PATH の既定の名前) があれば読み込む
+    directory = path if os.path.isdir(path) else os.path.dirname(path)
+    result.errors = load_errors(os.path.join(directory, "errors.json"))
+    return result
+
+
+def _subsample(values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    if len(values) <= MAX_TEST_SAMPLES:
+        return values
+    return rng.choice(values, MAX_TEST_SAMPLES, replace=False)
+
+
+def compare(baseline: ResultSet, candidate: ResultSet) -> List[Dict]:
+    """エンドポイント毎の差分と有意差 (p 値) を算出"""
+    rng = np.random.default_rng(0)
+    rows = []
+    names = [name for name in baseline.endpoints if name in candidate.endpoints]
+    names.sort(key=lambda name: (name != AGGREGATED, -baseline.endpoints[name]["count"]))
+    for name in names:
+        base = baseline.endpoints[name]
+        cand = candidate.endpoints[name]
+        row = {"name": name, "metrics": {}}
+        for metric in COMPARED_METRICS:
+            delta = cand[metric] - base[metric]
+            ratio = delta / base[metric] if base[metric] else float("nan")
+            row["metrics"][metric] = {
+                "baseline": base[metric],
+                "candidate": cand[metric],
+                "delta": delta,
+                "ratio": ratio,
+            }
+
+        # レイテンシ: 生サンプルがあれば U 検定、無ければ区間毎の p95 を t 検定
+        if name in baseline.samples and name in candidate.samples:
+            _, row["latency_p"] = mann_whitney_u(
+                _subsample(baseline.samples[name], rng), _subsample(candidate.samples[name], rng)
+            )
+        elif name in baseline.intervals and name in candidate.intervals:
+            base_p95 = baseline.intervals[name]["p95"]
+            cand_p95 = candidate.intervals[name]["p95"]
+            _, row["latency_p"] = welch_t_test(base_p95[~np.isnan(base_p95)], cand_p95[~np.isnan(cand_p95)])
+        else:
+            row["latency_p"] = float("nan")
+
+        # スループット: 区間毎の RPS を t 検定
+        if name in baseline.intervals and name in candidate.intervals:
+            _, row["rps_p"] = welch_t_test(baseline.intervals[name]["rps"], candidate.intervals[name]["rps"])
+        else:
+            row["rps_p"] = float("nan")
+        rows.append(row)
+    return rows
+
+
+def svg_line_chart(title: str, series: Dict[str, Tuple[np.ndarray, np.ndarray]], y_label: str) -> str:
+    """複数系列の折れ線グラフを SVG 文字列で返す"""
+    width, height = 640, 260
+    left, right, top, bottom = 60, 150, 30, 40
+    plot_w, plot_h = width - left - right, height - top - bottom
+
+    points = [(x, y) for xs, ys in series.values() for x, y in zip(xs, ys) if np.isfinite(y)]
+    x_max = max((x for x, _ in points), default=1.0) or 1.0
+    y_max = max((y for _, y in points), default=1.0) or 1.0
+
+    def sx(x):
+        return left + plot_w * x / x_max
+
+    def sy(y):
+        return top + plot_h * (1 - y / y_max)
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="sans-serif" '
+        f'font-size="11">',
+        f'<text x="{left}" y="18" font-size="13">{html.escape(title)}</text>',
+        f'<line x1="{left}" y1="{top + plot_h}" x2="{left + plot_w}" y2="{top + plot_h}" stroke="#333"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_h}" stroke="#333"/>',
+        f'<text x="{left - 5}" y="{top + 4}" text-anchor="end">{y_max:.0f}</text>',
+        f'<text x="{left - 5}" y="{top + plot_h}" text-anchor="end">0</text>',
+        f'<text x="{left + plot_w}" y="{top + plot_h + 15}" text-anchor="end">{x_max:.0f}s</text>',
+        f'<text x="12" y="{top + plot_h / 2}" transform="rotate(-90 12 {top + plot_h / 2})" '
+        f'text-anchor="middle">{html.escape(y_label)}</text>',
+    ]
+    for index, (label, (xs, ys)) in enumerate(series.items()):
+        color = COLORS[index % len(COLORS)]
+        coords = " ".join(f"{sx(x):.1f},{sy(y):.1f}" for x, y in zip(xs, ys) if np.isfinite(y))
+        if coords:
+            parts.append(f'<polyline fill="none" stroke="{color}" stroke-width="1.5" points="{coords}"/>')
+        legend_y = top + 14 * index
+        parts.append(
+            f'<rect x="{left + plot_w + 10}" y="{legend_y}" width="10" height="10" fill="{color}"/>'
+            f'<text x="{left + plot_w + 25}" y="{legend_y + 9}">{html.escape(label)}</text>'
+        )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def build_charts(result_sets: List[ResultSet], top_n: int = 6) -> List[Tuple[str, str]]:
+    """全体と主要エンドポイントのレイテンシ推移グラフ (タイトル, SVG) を作成"""
+    baseline = result_sets[0]
+    names = [AGGREGATED] + [
+        name for name, _ in sorted(baseline.endpoints.items(), key=lambda item: -item[1]["count"]) if name != AGGREGATED
+    ][:top_n]
+
+    charts = []
+    throughput = {
+        result.label: (result.intervals[AGGREGATED]["time"], result.intervals[AGGREGATED]["rps"])
+        for result in result_sets
+        if AGGREGATED in result.intervals
+    }
+    if throughput:
+        charts.append(("Throughput", svg_line_chart("Throughput (Aggregated)", throughput, "req/s")))
+    for name in names:
+        series = {
+            result.label: (result.intervals[name]["time"], result.intervals[name]["p95"])
+            for result in result_sets
+            if name in result.intervals
+        }
+        if series:
+            charts.append((f"p95 {name}", svg_line_chart(f"p95 latency: {name}", series, "ms")))
+    return charts
+
+
+def _fmt(value: float, digits: int = 0) -> str:
+    if value is None or not np.isfinite(value):
+        return "-"
+    return f"{value:.{digits}f}"
+
+
+def _fmt_delta(metric: Dict, digits: int = 0) -> str:
+    ratio = metric["ratio"]
+    ratio_text = f" ({ratio:+.1%})" if np.isfinite(ratio) else ""
+    return f"{_fmt(metric['baseline'], digits)} → {_fmt(metric['candidate'], digits)}{ratio_text}"
+
+
+def _fmt_p(p: float, alpha: float) -> str:
+    if not np.isfinite(p):
+        return "-"
+    return f"{p:.3f}{' *' if p < alpha else ''}"
+
+
+def _table_rows(rows: List[Dict], alpha: float) -> List[List[str]]:
+    table = []
+    for row in rows:
+        metrics = row["metrics"]
+        table.append(
+            [
+                row["name"],
+                _fmt_delta(metrics["p50"]),
+                _fmt_delta(metrics["p95"]),
+                _fmt_delta(metrics["p99"]),
+                _fmt_delta(metrics["rps"], 2),
+                f"{_fmt(metrics['failure_rate']['baseline'] * 100, 2)}% → "
+                f"{_fmt(metrics['failure_rate']['candidate'] * 100, 2)}%",
+                _fmt_p(row["latency_p"], alpha),
+                _fmt_p(row["rps_p"], alpha),
+            ]
+        )
+    return table
+
+
+TABLE_HEADER = ["Endpoint", "p50 (ms)", "p95 (ms)", "p99 (ms)", "RPS", "Failures", "p (latency)", "p (RPS)"]
+
+
+def _summary_rows(result_sets: List[ResultSet]) -> List[List[str]]:
+    rows = []
+    for result in result_sets:
+        total = result.endpoints.get(AGGREGATED, {})
+        rows.append(
+            [
+                result.label,
+                result.source,
+                _fmt(total.get("count", float("nan"))),
+                _fmt(result.duration),
+                _fmt(result.warmup),
+                _fmt(total.get("rps", float("nan")), 2),
+                _fmt(total.get("p95", float("nan"))),
+            ]
+        )
+    return rows
+
+
+SUMMARY_HEADER = ["Result set", "Source", "Requests", "Duration (s)", "Warm-up (s)", "RPS", "p95 (ms)"]
+
+
+def _error_rows(result_sets: List[ResultSet], top_n: int = 10) -> List[List[str]]:
+    rows = []
+    for result in result_sets:
+        for error in result.errors[:top_n]:
+            rows.append([result.label, error["task"], error["type"], error["message"], str(error["count"])])
+    return rows
+
+
+ERROR_HEADER = ["Result set", "Task", "Exception", "Message", "Count"]
+
+
+def render_markdown(result_sets: List[ResultSet], alpha: float, chart_dir: str, chart_prefix: str) -> str:
+    """Markdown レポート (グラフは SVG ファイルとして chart_dir に出力)"""
+    baseline = result_sets[0]
+    lines = ["# Load test comparison report", "", f"Baseline: **{baseline.label}**", ""]
+    lines += _markdown_table(SUMMARY_HEADER, _summary_rows(result_sets))
+    for candidate in result_sets[1:]:
+        lines += ["", f"## {baseline.label} → {candidate.label}", ""]
+        lines += _markdown_table(TABLE_HEADER, _table_rows(compare(baseline, candidate), alpha))
+    lines += ["", f"`*` p < {alpha}", ""]
+    error_rows = _error_rows(result_sets)
+    if error_rows:
+        lines += ["## Task errors", ""] + _markdown_table(ERROR_HEADER, error_rows) + [""]
+    lines += ["## Charts", ""]
+
+    os.makedirs(chart_dir, exist_ok=True)
+    for index, (title, svg) in enumerate(build_charts(result_sets)):
+        filename = f"{chart_prefix}-chart{index}.svg"
+        with open(os.path.join(chart_dir, filename), "w", encoding="utf-8") as f:
+            f.write(svg)
+        lines += [f"![{title}]({filename})", ""]
+    return "\n".join(lines)
+
+
+def _markdown_table(header: List[str], rows: List[List[str]]) -> List[str]:
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    lines += ["| " + " | ".join(cell.replace("|", "\\|") for cell in row) + " |" for row in rows]
+    return lines
+
+
+def _html_table(header: List[str], rows: List[List[str]]) -> str:
+    head = "".join(f"<th>{html.escape(cell)}</th>" for cell in header)
+    body = "".join("<tr>" + "".join(f"<td>{html.escape(cell)}</td>" for cell in row) + "</tr>" for row in rows)
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def render_html(result_sets: List[ResultSet], alpha: float) -> str:
+    """グラフを埋め込んだ単一の HTML レポート"""
+    baseline = result_sets[0]
+    sections = [
+        "<h1>Load test comparison report</h1>",
+        f"<p>Baseline: <b>{html.escape(baseline.label)}</b></p>",
+        _html_table(SUMMARY_HEADER, _summary_rows(result_sets)),
+    ]
+    for candidate in result_sets[1:]:
+        sections.append(f"<h2>{html.escape(baseline.label)} → {html.escape(candidate.label)}</h2>")
+        sections.append(_html_table(TABLE_HEADER, _table_rows(compare(baseline, candidate), alpha)))
+    sections.append(f"<p><code>*</code> p &lt; {alpha}</p>")
+    error_rows = _error_rows(result_sets)
+    if error_rows:
+        sections += ["<h2>Task errors</h2>", _html_table(ERROR_HEADER, error_rows)]
+    sections.append("<h2>Charts</h2>")
+    sections += [f"<div>{svg}</div>" for _, svg in build_charts(result_sets)]
+    style = (
+        "body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin:1em 0}"
+        "td,th{border:1px solid #ccc;padding:4px 8px;font-size:13px;text-align:right}"
+        "td:first-child,th:first-child{text-align:left}"
+    )
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Load test comparison report</title>'
+        f"<style>{style}</style></head><body>{''.join(sections)}</body></html>"
+    )
@@ -0,0 +1,373 @@
+import itertools
+import json
+import os
+import socket
+import time
+from typing import Dict, List, Optional
+
+import gevent
+import numpy as np
+from gevent.threadpool import ThreadPool
+
+# 1 リクエスト = 1 レコード (固定長) として追記する
+RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp", "f8"),  # リクエスト開始時刻 (epoch 秒)
+        ("request_type", "u2"),  # strings["request_type"] のインデックス
+        ("name", "u4"),  # strings["name"] のインデックス
+        ("tags", "u4"),  # strings["tags"] のインデックス ("key=value;..." 形式)
+        ("api_key", "u2"),  # strings["api_key"] のインデックス (末尾 4 文字のみ保持)
+        ("response_time", "f4"),  # ms
+        ("ttfb", "f4"),  # ms (ヘッダー受信までの時間、不明な場合は NaN)
+        ("response_length", "i8"),  # bytes
+        ("request_length", "i8"),  # bytes
+        ("status", "i2"),  # HTTP ステータス (応答が無い場合は 0)
+        ("failed", "?"),
+        ("request_id", "S32"),  # 相関 ID (X-Request-ID)
+        ("user", "u4"),  # strings["user"] のインデックス
+        ("conversation", "u4"),  # strings["conversation"] のインデックス
+    ]
+)
+
+STRING_COLUMNS = ["request_type", "name", "tags", "api_key", "user", "conversation"]
+HIGH_CARDINALITY_COLUMNS = ["user", "conversation"]  # 長時間の実行で増え続けるため種類数に上限を設ける
+OVERFLOW_VALUE = "<other>"  # 上限を超えた後に現れた値
+
+_run_counter = itertools.count()
+
+
+def new_run_id() -> str:
+    """結果ログの実行 ID (開始時刻・プロセス ID・プロセス内の連番)"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_run_counter)}"
+
+
+class _StringTable:
+    """文字列を連番のコードに変換する (max_size を超えた後の新しい値は OVERFLOW_VALUE にまとめる)"""
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.codes: Dict = {}
+        self.values: List[str] = []
+        self.max_size = max_size
+        self.overflow = 0  # OVERFLOW_VALUE にまとめた件数
+
+    def code(self, key, value=None) -> int:
+        code = self.codes.get(key)
+        if code is None:
+            if self.max_size is not None and len(self.values) >= self.max_size:
+                self.overflow += 1
+                key = value = OVERFLOW_VALUE
+                code = self.codes.get(key)
+                if code is not None:
+                    return code
+            code = len(self.values)
+            self.codes[key] = code
+            self.values.append(key if value is None else value)
+        return code
+
+
+def _api_key_label(headers) -> str:
+    """リクエストヘッダーから API キーの識別子を取り出す (秘密情報は残さない)"""
+    if not headers:
+        return ""
+    key = headers.get("Authorization") or headers.get("X-Api-Key") or ""
+    return f"...{key[-4:]}" if key else ""
+
+
+def _tags_string(context: dict) -> str:
+    return ";".join(f"{key}={value}" for key, value in sorted(context.items()))
+
+
+class ResultLog:
+    """リクエスト単位の結果をバッチで書き出す列指向ログ
+
+    events.request のリスナーはタプルをバッファに積むだけで、
+    numpy 配列への変換とファイル書き込みは専用の書き込みスレッド (OS スレッド) で順に行う。
+    書き込みが追いつかない場合は待たずにバッチを破棄し、破棄件数を記録する。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 4096,
+        max_pending: int = 16,
+        run_id: Optional[str] = None,
+        schema_interval: float = 10,
+        max_strings: int = 50000,
+    ):
+        self.path = path
+        self.run_id = run_id or new_run_id()  # 分散実行時は Master の ID に置き換える (最初の書き込みより前に限る)
+        self.data_path = None
+        self.schema_path = None
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.schema_interval = schema_interval
+        self.strings = {
+            column: _StringTable(max_strings if column in HIGH_CARDINALITY_COLUMNS else None)
+            for column in STRING_COLUMNS
+        }
+        self.buffer: list = []
+        self.pending = 0
+        self.rows = 0
+        self.dropped = 0
+        self.started_at = time.time()
+        self.metadata: Dict = {}
+        self._file = None
+        self._schema_written_at = 0.0
+        self._writer = ThreadPool(1)
+
+    def attach(self, environment):
+        """locust のイベントにリスナーを登録"""
+        environment.events.request.add_listener(self.on_request)
+        environment.events.test_stop.add_listener(lambda **kwargs: self.flush())
+        environment.events.quitting.add_listener(lambda **kwargs: self.close())
+        return self
+
+    def on_request(
+        self,
+        request_type,
+        name,
+        response_time,
+        response_length,
+        response=None,
+        context=None,
+        exception=None,
+        start_time=None,
+        request_id=None,
+        user_id=None,
+        conversation_id=None,
+        **kwargs,
+    ):
+        status = 0
+        ttfb = np.nan
+        request_length = 0
+        api_key = ""
+        if response is not None:
+            status = getattr(response, "status_code", 0) or 0
+            elapsed = getattr(response, "elapsed", None)
+            if elapsed is not None:
+                ttfb = elapsed.total_seconds() * 1000
+            request = getattr(response, "request", None)
+            body = getattr(request, "body", None) if request is not None else None
+            if body:
+                request_length = len(body)
+            if request is not None:
+                api_key = _api_key_label(getattr(request, "headers", None))
+
+        if context:
+            try:
+                key = tuple(context.items())
+                tags = self.strings["tags"].code(key, _tags_string(context))
+            except TypeError:
+                tags = self.strings["tags"].code(_tags_string(context))
+        else:
+            tags = self.strings["tags"].code((), "")
+
+        self.buffer.append(
+            (
+                start_time or time.time(),
+                self.strings["request_type"].code(request_type),
+                self.strings["name"].code(name),
+                tags,
+                self.strings["api_key"].code(api_key),
+                response_time or 0,
+                ttfb,
+                response_length or 0,
+                request_length,
+                status,
+                exception is not None,
+                request_id or "",
+                self.strings["user"].code(user_id or ""),
+                self.strings["conversation"].code(conversation_id or ""),
+            )
+        )
+        if len(self.buffer) >= self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        batch, self.buffer = self.buffer, []
+        if self.pending >= self.max_pending:
+            self.dropped += len(batch)
+            return
+        self.pending += 1
+        self._writer.spawn(self._write, batch).rawlink(self._written)
+
+    def _open(self):
+        """実行毎のディレクトリにファイルを作成 (同じプロセスで複数回実行しても別の実行として読み込める)"""
+        directory = os.path.join(self.path, self.run_id)
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, f"requests-{socket.gethostname()}-{os.getpid()}")
+        self.data_path = prefix + ".bin"
+        self.schema_path = prefix + ".json"
+        self._file = open(self.data_path, "wb")
+
+    def _write(self, batch: list) -> int:
+        if self._file is None:
+            self._open()
+        records = np.array(batch, dtype=RECORD_DTYPE)
+        self._file.write(records.tobytes())
+        self._file.flush()
+        return len(records)
+
+    def _written(self, result):
+        self.pending -= 1
+        if result.successful():
+            self.rows += result.get()
+        # 実行中 (や異常終了後) でも書き込み済みのレコードを読めるよう、文字列テーブルを定期的に書き出す
+        if self._file is not None and time.time() - self._schema_written_at >= self.schema_interval:
+            self._write_schema()
+
+    def flush(self):
+        """バッファを書き出し、スキーマを更新"""
+        while self.pending:
+            gevent.sleep(0.01)
+        if self.buffer:
+            batch, self.buffer = self.buffer, []
+            self.rows += self._write(batch)
+        if self._file is None:
+            return
+        self._write_schema()
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+        self._writer.kill()
+
+    def _write_schema(self):
+        schema = {
+            "dtype": RECORD_DTYPE.descr,
+            "run_id": self.run_id,
+            "rows": self.rows,
+            "dropped": self.dropped,
+            "overflow": {column: self.strings[column].overflow for column in HIGH_CARDINALITY_COLUMNS},
+            "started_at": self.started_at,
+            "strings": {column: table.values for column, table in self.strings.items()},
+            "metadata": self.metadata,
+        }
+        # 読み込み中のプロセスが書きかけのファイルを読まないよう、置き換えで更新する
+        temp_path = self.schema_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(schema, f, ensure_ascii=False)
+        os.replace(temp_path, self.schema_path)
+        self._schema_written_at = time.time()
+
+
+class ResultLogData:
+    """書き出した結果ログの読み込み (数値列はメモリマップで参照)
+
+    warmup_ends はレコード毎の記録元ファイルのウォームアップ終了時刻 (記録が無い場合は NaN)。
+    """
+
+    def __init__(
+        self,
+        records: np.ndarray,
+        strings: Dict[str, List[str]],
+        metadata: Optional[Dict] = None,
+        warmup_ends: Optional[np.ndarray] = None,
+    ):
+        self.records = records
+        self.strings = strings
+        self.metadata = metadata or {}
+        if warmup_ends is None:
+            warmup_ends = np.full(len(records), float(self.metadata.get("warmup_end") or np.nan))
+        self.warmup_ends = warmup_ends
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def column(self, name: str) -> np.ndarray:
+        """列を取得 (文字列列はデコードした配列を返す)"""
+        values = self.records[name]
+        if name in self.strings:
+            return np.asarray(self.strings[name], dtype=object)[values]
+        return values
+
+    def tags(self) -> List[Dict[str, str]]:
+        """tags 列を dict のリストに変換"""
+        parsed = [dict(item.split("=", 1) for item in value.split(";") if item) for value in self.strings["tags"]]
+        return [parsed[code] for code in self.records["tags"]]
+
+    def after_warmup(self) -> np.ndarray:
+        """記録元ファイルのウォームアップ終了以降のレコードを示すマスク"""
+        return ~(self.records["timestamp"] < self.warmup_ends)
+
+
+def _load_file(schema_path: str):
+    with open(schema_path, encoding="utf-8") as f:
+        schema = json.load(f)
+    dtype = np.dtype([tuple(field) for field in schema["dtype"]])
+    data_path = schema_path[: -len(".json")] + ".bin"
+    # 実行中のログは、スキーマの文字列テーブルが対応している件数までを読む
+    rows = min(os.path.getsize(data_path) // dtype.itemsize, schema.get("rows", float("inf")))
+    records = np.memmap(data_path, dtype=dtype, mode="r", shape=(rows,)) if rows else np.empty(0, dtype=dtype)
+    return records, schema
+
+
+def _schema_paths(directory: str) -> List[str]:
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith("requests-") and name.endswith(".json")
+    )
+
+
+def result_log_runs(path: str) -> List[str]:
+    """RESULT_LOG_DIR 内の実行毎のディレクトリ"""
+    return sorted(
+        os.path.join(path, name)
+        for name in os.listdir(path)
+        if os.path.isdir(os.path.join(path, name)) and _schema_paths(os.path.join(path, name))
+    )
+
+
+def load_result_log(path: str) -> ResultLogData:
+    """結果ログを読み込む (ディレクトリの場合は1回の実行の全ワーカー分を結合)
+
+    RESULT_LOG_DIR を指定した場合は、実行が1回分のみならそれを読み込み、複数ある場合は ValueError とする。
+    """
+    if os.path.isdir(path):
+        schema_paths = _schema_paths(path)
+        if not schema_paths:
+            runs = result_log_runs(path)
+            if len(runs) != 1:
+                listed = ", ".join(os.path.basename(run) for run in runs) or "none"
+                raise ValueError(f"{path} contains result logs of {len(runs)} runs ({listed}); pass one run directory")
+            schema_paths = _schema_paths(runs[0])
+    else:
+        schema_paths = [path if path.endswith(".json") else os.path.splitext(path)[0] + ".json"]
+
+    if len(schema_paths) == 1:
+        records, schema = _load_file(schema_paths[0])
+        return ResultLogData(records, schema["strings"], schema.get("metadata"))
+
+    # ワーカー毎に文字列テーブルが異なるため、結合時にコードを振り直す
+    merged = {column: _StringTable() for column in STRING_COLUMNS}
+    parts = []
+    warmup_ends = []
+    metadata = {}
+    run_ids = set()
+    for schema_path in schema_paths:
+        records, schema = _load_file(schema_path)
+        run_ids.add(schema.get("run_id"))
+        records = np.array(records)
+        for column in STRING_COLUMNS:
+            if column not in schema["strings"]:
+                continue
+            remap = np.array([merged[column].code(value) for value in schema["strings"][column]], dtype=np.int64)
+            if len(remap):
+                records[column] = remap[records[column]]
+        parts.append(records)
+        # ウォームアップ終了時刻はファイル毎に適用する
+        file_metadata = dict(schema.get("metadata") or {})
+        warmup_ends.append(np.full(len(records), float(file_metadata.pop("warmup_end", None) or np.nan)))
+        metadata.update(file_metadata)
+    if len(run_ids) > 1:
+        listed = ", ".join(sorted(str(run_id) for run_id in run_ids))
+        raise ValueError(f"{path} mixes result logs of different runs ({listed})")
+
+    records = np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+    warmup_ends = np.concatenate(warmup_ends) if warmup_ends else np.empty(0)
+    order = np.argsort(records["timestamp"], kind="stable")
+    return ResultLogData(
+        records[order], {column: table.values for column, table in merged.items()}, metadata, warmup_ends[order]
+    )
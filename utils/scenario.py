@@ -0,0 +1,391 @@
+import json
+import os
+import random
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+import gevent
+import yaml
+
+from utils.overload import SHED_STATUS_CODES
+from utils.streaming import iter_sse_events
+
+# ${name} は実行時にユーザー毎の変数、${config.NAME} は読み込み時に Config の値へ置き換える
+TEMPLATE_PATTERN = re.compile(r"\$\{([A-Za-z_][\w.]*)\}")
+SCENARIO_SUFFIXES = (".yml", ".yaml")
+
+
+class ScenarioError(ValueError):
+    """シナリオ定義の誤り"""
+
+
+def _resolve_config(value: str, config, where: str) -> str:
+    def replace(match):
+        name = match.group(1)
+        if not name.startswith("config."):
+            return match.group(0)
+        try:
+            return str(getattr(config, name[len("config.") :]))
+        except AttributeError:
+            raise ScenarioError(f"{where}: unknown config value {name}") from None
+
+    return TEMPLATE_PATTERN.sub(replace, value)
+
+
+def compile_value(value, config=None, where: str = "") -> Callable[[dict], Any]:
+    """テンプレートを含む値を、変数 dict を受け取って値を返す関数に変換する
+
+    文字列全体が ${name} の場合は変数の値をそのまま (型を保ったまま) 返す。
+    テンプレートを含まない部分は定数として、呼び出し毎に同じオブジェクトを返す。
+    """
+    render, _ = _compile(value, config, where)
+    return render
+
+
+def _compile(value, config, where: str) -> Tuple[Callable[[dict], Any], bool]:
+    """(値を返す関数, 定数かどうか)"""
+    if isinstance(value, str):
+        value = _resolve_config(value, config, where)
+        if not TEMPLATE_PATTERN.search(value):
+            return (lambda variables, constant=value: constant), True
+        whole = TEMPLATE_PATTERN.fullmatch(value)
+        if whole:
+            return (lambda variables, name=whole.group(1): variables.get(name)), False
+        template = _format_template(value)
+        return (lambda variables, template=template: template.format_map(variables)), False
+    if isinstance(value, dict):
+        items = [(key, *_compile(item, config, where)) for key, item in value.items()]
+        if all(constant for _, _, constant in items):
+            constant = {key: render({}) for key, render, _ in items}
+            return (lambda variables, constant=constant: constant), True
+        renders = [(key, render) for key, render, _ in items]
+        return (lambda variables, renders=renders: {key: render(variables) for key, render in renders}), False
+    if isinstance(value, list):
+        items = [_compile(item, config, where) for item in value]
+        if all(constant for _, constant in items):
+            constant = [render({}) for render, _ in items]
+            return (lambda variables, constant=constant: constant), True
+        renders = [render for render, _ in items]
+        return (lambda variables, renders=renders: [render(variables) for render in renders]), False
+    return (lambda variables, constant=value: constant), True
+
+
+def _format_template(value: str) -> str:
+    """${name} を str.format の {name} に変換 (それ以外の波括弧はエスケープ)"""
+    parts = []
+    position = 0
+    for match in TEMPLATE_PATTERN.finditer(value):
+        parts.append(value[position : match.start()].replace("{", "{{").replace("}", "}}"))
+        parts.append("{" + match.group(1) + "}")
+        position = match.end()
+    parts.append(value[position:].replace("{", "{{").replace("}", "}}"))
+    return "".join(parts)
+
+
+def compile_path(path: str) -> Tuple:
+    """ "data.0.id" 形式のパスをタプルに変換"""
+    return tuple(int(part) if part.isdigit() else part for part in str(path).split("."))
+
+
+def lookup(data, path: Tuple):
+    for key in path:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def compile_condition(condition) -> Optional[Callable[[dict], bool]]:
+    """when / until の条件
+
+    "name": 変数が真, "!name": 変数が偽, [a, b]: すべて満たす, {name: [v1, v2]}: 変数の値がいずれかに一致
+    """
+    if condition is None:
+        return None
+    if isinstance(condition, str):
+        if condition.startswith("!"):
+            return lambda variables, name=condition[1:]: not variables.get(name)
+        return lambda variables, name=condition: bool(variables.get(name))
+    if isinstance(condition, list):
+        checks = [compile_condition(item) for item in condition]
+        return lambda variables: all(check(variables) for check in checks)
+    if isinstance(condition, dict):
+        expected = [
+            (name, tuple(values) if isinstance(values, list) else (values,)) for name, values in condition.items()
+        ]
+        return lambda variables: all(variables.get(name) in values for name, values in expected)
+    raise ScenarioError(f"Invalid condition: {condition!r}")
+
+
+def compile_think(value) -> Tuple[float, float]:
+    """think time (秒)。数値なら固定、[min, max] なら一様乱数"""
+    if isinstance(value, (list, tuple)):
+        low, high = value
+        return float(low), float(high)
+    return float(value), float(value)
+
+
+def think(low: float, high: float):
+    delay = low if low == high else random.uniform(low, high)
+    if delay > 0:
+        gevent.sleep(delay)
+
+
+class RequestStep:
+    """HTTP リクエスト 1 回分"""
+
+    __slots__ = (
+        "method",
+        "url",
+        "name",
+        "headers",
+        "params",
+        "json",
+        "data",
+        "files",
+        "context",
+        "stream",
+        "expect",
+        "checks",
+        "extract",
+        "set_values",
+        "when",
+    )
+
+    def __init__(self, spec: dict, headers: dict, config, where: str):
+        try:
+            self.method, url = spec["request"].split(None, 1)
+        except ValueError:
+            raise ScenarioError(f"{where}: request must be 'METHOD /path'") from None
+        self.method = self.method.upper()
+        self.url = compile_value(url, config, where)
+        self.name = _resolve_config(spec.get("name", url), config, where)
+        merged = {**headers, **(spec.get("headers") or {})}
+        self.headers = {key: _resolve_config(str(value), config, where) for key, value in merged.items() if value}
+        self.params = compile_value(spec["params"], config, where) if "params" in spec else None
+        self.json = compile_value(spec["json"], config, where) if "json" in spec else None
+        self.data = compile_value(spec["data"], config, where) if "data" in spec else None
+        self.files = _load_files(spec["files"], where) if "files" in spec else None
+        self.context = spec.get("context")
+        self.stream = bool(spec.get("stream", False))
+        expect = spec.get("expect", [200, 201, 204])
+        self.expect = frozenset(expect if isinstance(expect, list) else [expect])
+        self.checks = [(compile_path(path), value) for path, value in (spec.get("check") or {}).items()]
+        self.extract = [(name, compile_path(path)) for name, path in (spec.get("extract") or {}).items()]
+        self.set_values = spec.get("set") or {}
+        self.when = compile_condition(spec.get("when"))
+
+    def run(self, user):
+        variables = user.vars
+        if self.when is not None and not self.when(variables):
+            return
+        kwargs = {"name": self.name, "headers": self.headers, "catch_response": True}
+        if self.params is not None:
+            kwargs["params"] = self.params(variables)
+        if self.json is not None:
+            kwargs["json"] = self.json(variables)
+        if self.data is not None:
+            kwargs["data"] = self.data(variables)
+        if self.files is not None:
+            kwargs["files"] = self.files
+        if self.context is not None:
+            kwargs["context"] = self.context
+        if self.stream:
+            kwargs["stream"] = True
+
+        with user.client.request(self.method, self.url(variables), **kwargs) as response:
+            status = response.status_code
+            if status not in self.expect:
+                if status not in SHED_STATUS_CODES:  # 拒否はクライアント側で RequestShed として計上される
+                    response.failure(f"{self.name} failed: unexpected status ({status})")
+                return
+            if self.stream:
+                for event in iter_sse_events(response):
+                    self._extract(event, variables)
+            elif self.extract or self.checks:
+                try:
+                    data = response.json()
+                except ValueError:
+                    response.failure(f"{self.name} failed: invalid JSON response")
+                    return
+                for path, expected in self.checks:
+                    actual = lookup(data, path)
+                    if actual != expected:
+                        response.failure(f"{self.name} failed: {'.'.join(map(str, path))}={actual!r}")
+                        return
+                self._extract(data, variables)
+        if self.set_values:
+            variables.update(self.set_values)
+
+    def _extract(self, data, variables: dict):
+        for name, path in self.extract:
+            value = lookup(data, path)
+            if value is not None:
+                variables[name] = value
+
+
+class LoopStep:
+    """count 回 (until を満たしたら終了) 繰り返す"""
+
+    __slots__ = ("count", "until", "think", "steps", "when")
+
+    def __init__(self, spec: dict, steps: list):
+        loop = spec["loop"]
+        if not isinstance(loop, dict):
+            loop = {"count": loop}
+        self.count = int(loop.get("count", 1))
+        self.until = compile_condition(loop.get("until"))
+        self.think = compile_think(loop.get("think", 0))
+        self.steps = steps
+        self.when = compile_condition(spec.get("when"))
+
+    def run(self, user):
+        if self.when is not None and not self.when(user.vars):
+            return
+        for index in range(self.count):
+            run_steps(self.steps, user)
+            if self.until is not None and self.until(user.vars):
+                return
+            if index + 1 < self.count:
+                think(*self.think)
+
+
+class ChooseStep:
+    """重みに従っていずれか 1 つの分岐を実行する"""
+
+    __slots__ = ("branches", "cum_weights", "when")
+
+    def __init__(self, spec: dict, branches: List[list], weights: List[float]):
+        self.branches = branches
+        self.cum_weights = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            self.cum_weights.append(total)
+        self.when = compile_condition(spec.get("when"))
+
+    def run(self, user):
+        if self.when is not None and not self.when(user.vars):
+            return
+        run_steps(random.choices(self.branches, cum_weights=self.cum_weights)[0], user)
+
+
+class ThinkStep:
+    """ステップ間の待ち時間"""
+
+    __slots__ = ("low", "high")
+
+    def __init__(self, spec: dict):
+        self.low, self.high = compile_think(spec["think"])
+
+    def run(self, user):
+        think(self.low, self.high)
+
+
+class SetStep:
+    """変数の設定"""
+
+    __slots__ = ("values", "when")
+
+    def __init__(self, spec: dict, config, where: str):
+        self.values = [(name, compile_value(value, config, where)) for name, value in spec["set"].items()]
+        self.when = compile_condition(spec.get("when"))
+
+    def run(self, user):
+        if self.when is not None and not self.when(user.vars):
+            return
+        for name, render in self.values:
+            user.vars[name] = render(user.vars)
+
+
+def run_steps(steps: list, user):
+    for step in steps:
+        step.run(user)
+
+
+def _load_files(spec: dict, where: str) -> dict:
+    """multipart のパートを読み込み時に組み立てる (ファイルの内容はメモリに保持して使い回す)"""
+    files = {}
+    for field, part in spec.items():
+        if "path" in part:
+            if not os.path.exists(part["path"]):
+                raise ScenarioError(f"{where}: file not found: {part['path']}")
+            with open(part["path"], "rb") as f:
+                content = f.read()
+            filename = part.get("filename", os.path.basename(part["path"]))
+        else:
+            content = part.get("content", "")
+            if not isinstance(content, str):
+                content = json.dumps(content)
+            filename = part.get("filename")
+        files[field] = (filename, content, part.get("mime_type", "application/octet-stream"))
+    return files
+
+
+def compile_steps(specs: list, headers: dict, config, where: str) -> list:
+    steps = []
+    for index, spec in enumerate(specs or []):
+        location = f"{where}[{index}]"
+        if not isinstance(spec, dict):
+            raise ScenarioError(f"{location}: step must be a mapping")
+        if "request" in spec:
+            steps.append(RequestStep(spec, headers, config, location))
+        elif "loop" in spec:
+            steps.append(LoopStep(spec, compile_steps(spec.get("steps"), headers, config, location)))
+        elif "choose" in spec:
+            branches = [compile_steps(branch.get("steps"), headers, config, location) for branch in spec["choose"]]
+            weights = [float(branch.get("weight", 1)) for branch in spec["choose"]]
+            steps.append(ChooseStep(spec, branches, weights))
+        elif "think" in spec:
+            steps.append(ThinkStep(spec))
+        elif "set" in spec:
+            steps.append(SetStep(spec, config, location))
+        else:
+            raise ScenarioError(f"{location}: unknown step {sorted(spec)}")
+    return steps
+
+
+class Scenario:
+    """YAML から読み込んだユーザージャーニー (読み込み時にステップオブジェクトへコンパイル済み)"""
+
+    def __init__(self, spec: dict, config, source: str = "<scenario>"):
+        if "name" not in spec or "steps" not in spec:
+            raise ScenarioError(f"{source}: 'name' and 'steps' are required")
+        self.name = spec["name"]
+        self.source = source
+        self.host = _resolve_config(spec.get("host", "${config.API_HOST}"), config, source)
+        self.weight = int(spec.get("weight", 1))
+        self.wait_time = compile_think(spec.get("wait_time", [1, 3]))
+        self.variables = dict(spec.get("variables") or {})
+        headers = spec.get("headers") or {}
+        self.on_start = compile_steps(spec.get("on_start"), headers, config, f"{source}:on_start")
+        self.steps = compile_steps(spec["steps"], headers, config, f"{source}:steps")
+
+    def new_variables(self, **builtins) -> dict:
+        """ユーザー毎の変数 (初期値 + user などの組み込み変数)"""
+        return {**self.variables, **builtins}
+
+    def start(self, user):
+        run_steps(self.on_start, user)
+
+    def run(self, user):
+        run_steps(self.steps, user)
+
+
+def scenario_files(path: str) -> List[str]:
+    """ファイルまたはディレクトリから YAML ファイルの一覧を返す"""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(SCENARIO_SUFFIXES))
+    return [path]
+
+
+def load_scenarios(path: str, config) -> List[Scenario]:
+    """YAML ファイル (1 ファイルに 1 シナリオ、または scenarios: のリスト) を読み込む"""
+    scenarios = []
+    for file_path in scenario_files(path):
+        with open(file_path, encoding="utf-8") as f:
+            document = yaml.safe_load(f) or {}
+        specs = document.get("scenarios", [document]) if isinstance(document, dict) else document
+        scenarios += [Scenario(spec, config, file_path) for spec in specs]
+    return scenarios
@@ -0,0 +1,199 @@
+import csv
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import gevent
+from locust.stats import calculate_response_time_percentile
+
+from utils.metrics import MetricsCollector
+from utils.stats import linear_trend
+
+SERIES_COLUMNS = ["timestamp", "elapsed", "requests", "failures", "rps", "error_rate", "p50", "p95", "p99"]
+
+
+def system_sample() -> Dict[str, float]:
+    """負荷生成ホストの CPU・メモリ使用率"""
+    metrics = MetricsCollector.collect_system_metrics()
+    return {"cpu_percent": float(metrics["cpu_percent"]), "memory_percent": float(metrics["memory_percent"])}
+
+
+def detect_drift(rows: List[dict], metrics: List[str], alpha: float = 0.01, min_change: float = 0.1) -> Dict[str, dict]:
+    """時系列の各指標に直線を当てはめ、有意に増加している指標を判定
+
+    傾きの p 値が alpha 未満かつ、計測期間全体での増加量が開始時点の値の min_change 倍以上の場合に drift とする。
+    """
+    result = {}
+    if len(rows) < 3:
+        return result
+    elapsed = [row["elapsed"] for row in rows]
+    duration = elapsed[-1] - elapsed[0]
+    for metric in metrics:
+        values = [row.get(metric) for row in rows]
+        values = [float("nan") if value in (None, "") else float(value) for value in values]
+        slope, intercept, p_value = linear_trend(elapsed, values)
+        if slope != slope:  # NaN (データ不足)
+            continue
+        start = intercept + slope * elapsed[0]
+        change = slope * duration
+        relative = change / abs(start) if start else (float("inf") if change > 0 else 0.0)
+        result[metric] = {
+            "slope_per_hour": slope * 3600,
+            "start": start,
+            "end": start + change,
+            "relative_change": relative,
+            "p_value": p_value,
+            "drift": bool(slope > 0 and p_value < alpha and relative >= min_change),
+        }
+    return result
+
+
+class SoakMonitor:
+    """長時間試験の時系列記録とドリフト検出
+
+    interval 秒毎に区間内のリクエスト数・エラー率・パーセンタイルと samplers の値を1行として CSV に追記し、
+    試験終了時に metrics の各指標へ直線を当てはめて、レイテンシ・エラー率・メモリの緩やかな増加を検出する。
+    結果は <path> と同じ名前の .json に保存する。統計が集計される Master (単体実行時は自身) で動作させる。
+    """
+
+    def __init__(
+        self,
+        path: str = "results/soak.csv",
+        interval: float = 60,
+        metrics: Optional[List[str]] = None,
+        alpha: float = 0.01,
+        min_change: float = 0.1,
+        fail_on_drift: bool = False,
+    ):
+        self.path = path
+        self.interval = interval
+        self.metrics = metrics or ["p50", "p95", "error_rate", "memory_percent"]
+        self.alpha = alpha
+        self.min_change = min_change
+        self.fail_on_drift = fail_on_drift
+        self.samplers: List[Callable[[], Dict[str, float]]] = [system_sample]
+        self.environment = None
+        self.rows: List[dict] = []
+        self.started_at: Optional[float] = None
+        self._writer = None
+        self._file = None
+        self._greenlet = None
+        self._previous = (0, 0, {})  # 前回の記録時点のリクエスト数・失敗数・レスポンスタイムの分布
+        self._previous_at = 0.0
+
+    def attach(self, environment):
+        """locust のイベントにリスナーを登録 (ウォームアップ終了時のリセットは locustfile から reset() を呼ぶ)"""
+        self.environment = environment
+        environment.events.test_start.add_listener(lambda **kwargs: self.start())
+        environment.events.test_stop.add_listener(lambda **kwargs: self.stop())
+        environment.events.reset_stats.add_listener(lambda **kwargs: self.reset())
+        return self
+
+    def reset(self):
+        """統計のリセットに合わせて、次の区間の基準をリセット時点にする"""
+        self._previous = (0, 0, {})
+        self._previous_at = time.time()
+
+    def start(self):
+        self.stop()
+        self.rows = []
+        self.started_at = time.time()
+        self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is None:
+            return
+        self._greenlet.kill(block=True)
+        self._greenlet = None
+        if self._file is not None:
+            self._file.close()
+            self._file = self._writer = None
+        self.report()
+
+    def _run(self):
+        total = self.environment.stats.total
+        self._previous = (total.num_requests, total.num_failures, dict(total.response_times))
+        self._previous_at = time.time()
+        while True:
+            gevent.sleep(self.interval)
+            previous_requests, previous_failures, previous_times = self._previous
+            requests = total.num_requests - previous_requests
+            failures = total.num_failures - previous_failures
+            response_times = {
+                key: value - previous_times.get(key, 0)
+                for key, value in total.response_times.items()
+                if value > previous_times.get(key, 0)
+            }
+            now = time.time()
+            seconds = now - self._previous_at
+            self._previous = (total.num_requests, total.num_failures, dict(total.response_times))
+            self._previous_at = now
+
+            row = {
+                "timestamp": now,
+                "elapsed": now - self.started_at,
+                "requests": requests,
+                "failures": failures,
+                "rps": requests / seconds if seconds > 0 else 0.0,
+                "error_rate": failures / requests if requests else 0.0,
+            }
+            for percentile in (50, 95, 99):
+                row[f"p{percentile}"] = (
+                    calculate_response_time_percentile(response_times, requests, percentile / 100)
+                    if requests
+                    else float("nan")
+                )
+            for sampler in self.samplers:
+                try:
+                    row.update(sampler())
+                except Exception as e:
+                    logging.warning(f"Soak sampler failed: {e}")
+            self.rows.append(row)
+            self._write(row)
+
+    def _write(self, row: dict):
+        if self._writer is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            fieldnames = SERIES_COLUMNS + [key for key in row if key not in SERIES_COLUMNS]
+            self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, restval="", extrasaction="ignore")
+            self._writer.writeheader()
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def report(self) -> Dict[str, dict]:
+        """ドリフトを判定してログと JSON に出力"""
+        trends = detect_drift(self.rows, self.metrics, self.alpha, self.min_change)
+        if not trends:
+            logging.info(f"Soak: {len(self.rows)} snapshots, not enough data for trend analysis")
+            return trends
+
+        logging.info(f"Soak: {len(self.rows)} snapshots over {self.rows[-1]['elapsed'] / 3600:.2f}h")
+        logging.info(f"{'Metric':20s} {'start':>10s} {'end':>10s} {'change':>8s} {'slope/h':>10s} {'p-value':>9s}")
+        for metric, trend in trends.items():
+            logging.info(
+                f"{metric:20s} {trend['start']:10.3f} {trend['end']:10.3f} {trend['relative_change']:8.1%} "
+                f"{trend['slope_per_hour']:10.3f} {trend['p_value']:9.4f}{'  DRIFT' if trend['drift'] else ''}"
+            )
+        drifting = [metric for metric, trend in trends.items() if trend["drift"]]
+        if drifting:
+            logging.warning(f"Soak: significant upward drift in {', '.join(drifting)}")
+            if self.fail_on_drift and self.environment is not None:
+                self.environment.process_exit_code = 1
+
+        summary_path = os.path.splitext(self.path)[0] + ".json"
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "snapshots": len(self.rows),
+                    "interval": self.interval,
+                    "alpha": self.alpha,
+                    "min_change": self.min_change,
+                    "trends": trends,
+                },
+                f,
+                indent=2,
+            )
+        return trends
@@ -0,0 +1,215 @@
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _betacf(a: float, b: float, x: float, max_iter: int = 200, eps: float = 3e-14) -> float:
+    """不完全ベータ関数の連分数展開"""
+    qab = a + b
+    qap = a + 1.0
+    qam = a - 1.0
+    c = 1.0
+    d = 1.0 - qab * x / qap
+    if abs(d) < 1e-300:
+        d = 1e-300
+    d = 1.0 / d
+    h = d
+    for m in range(1, max_iter + 1):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        if abs(d) < 1e-300:
+            d = 1e-300
+        c = 1.0 + aa / c
+        if abs(c) < 1e-300:
+            c = 1e-300
+        d = 1.0 / d
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        if abs(d) < 1e-300:
+            d = 1e-300
+        c = 1.0 + aa / c
+        if abs(c) < 1e-300:
+            c = 1e-300
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < eps:
+            break
+    return h
+
+
+def betainc(a: float, b: float, x: float) -> float:
+    """正則化不完全ベータ関数 I_x(a, b)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    ln_beta = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+    front = math.exp(ln_beta + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def t_two_sided_p(t: float, df: float) -> float:
+    """t 分布の両側 p 値"""
+    if not math.isfinite(t):
+        return 0.0
+    if df <= 0:
+        return float("nan")
+    return betainc(df / 2.0, 0.5, df / (df + t * t))
+
+
+def t_quantile(confidence: float, df: float) -> float:
+    """両側 confidence の区間を与える t 分布の分位点 (二分法で t_two_sided_p を逆算)"""
+    if df <= 0:
+        return float("nan")
+    alpha = 1.0 - confidence
+    low, high = 0.0, 1.0
+    while t_two_sided_p(high, df) > alpha:
+        high *= 2.0
+    for _ in range(100):
+        middle = (low + high) / 2.0
+        if t_two_sided_p(middle, df) > alpha:
+            low = middle
+        else:
+            high = middle
+        if high - low < 1e-9:
+            break
+    return (low + high) / 2.0
+
+
+def batch_means_interval(values: Sequence[float], confidence: float = 0.95) -> Tuple[float, float]:
+    """バッチ平均法による平均の信頼区間 (平均, 半幅)
+
+    時系列を十分長いバッチに区切ると各バッチの平均はほぼ独立とみなせるため、バッチ平均の t 区間を使う。
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return (float(values.mean()) if len(values) else float("nan")), float("inf")
+    half_width = t_quantile(confidence, len(values) - 1) * values.std(ddof=1) / math.sqrt(len(values))
+    return float(values.mean()), float(half_width)
+
+
+def histogram_percentile(keys: np.ndarray, counts: np.ndarray, fraction: float) -> np.ndarray:
+    """ヒストグラム (昇順の値 keys と件数 counts、counts は複数行可) のパーセンタイル"""
+    cumulative = np.cumsum(counts, axis=-1)
+    target = cumulative[..., -1:] * fraction
+    index = np.minimum((cumulative < target).sum(axis=-1), len(keys) - 1)
+    return keys[index]
+
+
+def bootstrap_percentile_interval(
+    keys: np.ndarray,
+    counts: np.ndarray,
+    fraction: float,
+    confidence: float = 0.95,
+    replicates: int = 1000,
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[float, float, float]:
+    """バッチ単位のブートストラップによるパーセンタイルの信頼区間 (推定値, 下限, 上限)
+
+    counts はバッチ毎のヒストグラム (バッチ数 x keys)。個々のリクエストではなくバッチを復元抽出することで、
+    近い時刻のレスポンスタイムの相関 (負荷の揺らぎ・GC など) を区間に反映する。
+    """
+    rng = rng or np.random.default_rng()
+    batches = len(counts)
+    estimate = float(histogram_percentile(keys, counts.sum(axis=0), fraction))
+    weights = rng.multinomial(batches, np.full(batches, 1.0 / batches), size=replicates)
+    samples = histogram_percentile(keys, weights @ counts, fraction)
+    alpha = 1.0 - confidence
+    low, high = np.quantile(samples, [alpha / 2, 1 - alpha / 2])
+    return estimate, float(low), float(high)
+
+
+def normal_two_sided_p(z: float) -> float:
+    """標準正規分布の両側 p 値"""
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def welch_t_test(a, b) -> Tuple[float, float]:
+    """Welch の t 検定 (t 値, 両側 p 値)"""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if len(a) < 2 or len(b) < 2:
+        return float("nan"), float("nan")
+    var_a = a.var(ddof=1) / len(a)
+    var_b = b.var(ddof=1) / len(b)
+    se = math.sqrt(var_a + var_b)
+    if se == 0:
+        return (0.0, 1.0) if a.mean() == b.mean() else (float("inf"), 0.0)
+    t = (b.mean() - a.mean()) / se
+    df = (var_a + var_b) ** 2 / (
+        (var_a**2 / (len(a) - 1) if var_a else 0.0) + (var_b**2 / (len(b) - 1) if var_b else 0.0)
+    )
+    return t, t_two_sided_p(t, df)
+
+
+def rankdata(values: np.ndarray) -> np.ndarray:
+    """同順位を平均順位とした順位付け"""
+    order = np.argsort(values, kind="mergesort")
+    sorted_values = values[order]
+    boundaries = np.concatenate(([True], sorted_values[1:] != sorted_values[:-1], [True]))
+    index = np.flatnonzero(boundaries)
+    average = (index[:-1] + index[1:] + 1) / 2.0  # 1 始まりの平均順位
+    ranks = np.empty(len(values), dtype=float)
+    ranks[order] = np.repeat(average, np.diff(index))
+    return ranks
+
+
+def mann_whitney_u(a, b) -> Tuple[float, float]:
+    """Mann-Whitney の U 検定 (正規近似, 同順位補正あり)"""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return float("nan"), float("nan")
+    combined = np.concatenate([a, b])
+    ranks = rankdata(combined)
+    u1 = ranks[:n1].sum() - n1 * (n1 + 1) / 2.0
+    mean_u = n1 * n2 / 2.0
+
+    _, counts = np.unique(combined, return_counts=True)
+    n = n1 + n2
+    tie = (counts**3 - counts).sum() / (n * (n - 1)) if n > 1 else 0.0
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie))
+    if sigma == 0:
+        return u1, 1.0
+    z = (u1 - mean_u) / sigma
+    return u1, normal_two_sided_p(z)
+
+
+def linear_trend(x, y) -> Tuple[float, float, float]:
+    """最小二乗法による直線の当てはめ (傾き, 切片, 傾きが 0 であることの両側 p 値)
+
+    時系列の残差は自己相関を持つため、ラグ 1 の自己相関係数 r から有効サンプル数 n (1 - r) / (1 + r) を求めて
+    自由度と標準誤差を補正する (正の自己相関で有意になりすぎることを防ぐ)。
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mask = np.isfinite(x) & np.isfinite(y)
+    x, y = x[mask], y[mask]
+    n = len(x)
+    if n < 3:
+        return float("nan"), float("nan"), float("nan")
+    x_mean, y_mean = x.mean(), y.mean()
+    sxx = ((x - x_mean) ** 2).sum()
+    if sxx == 0:
+        return float("nan"), float("nan"), float("nan")
+    slope = ((x - x_mean) * (y - y_mean)).sum() / sxx
+    intercept = y_mean - slope * x_mean
+    residuals = y - (intercept + slope * x)
+    sse = (residuals**2).sum()
+    if sse == 0:
+        return float(slope), float(intercept), (1.0 if slope == 0 else 0.0)
+
+    r = (residuals[1:] * residuals[:-1]).sum() / sse
+    r = min(max(r, 0.0), 0.99)  # 負の自己相関は補正しない
+    n_eff = max(n * (1 - r) / (1 + r), 3.0)
+    df = n_eff - 2
+    se = math.sqrt(sse / df / sxx)  # 残差分散を有効な自由度で割り、分散を約 n / n_eff 倍にする
+    t = slope / se if se > 0 else float("inf")
+    return float(slope), float(intercept), t_two_sided_p(t, df)
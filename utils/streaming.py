@@ -0,0 +1,87 @@
+import json
+import logging
+import time
+from typing import Iterator, Optional
+
+# 生成テキストの断片を運ぶイベント (1 イベント ≒ 1 トークンとして数える)
+TOKEN_EVENTS = {"message", "agent_message", "text_chunk"}
+
+# 1行 (SSE の data 行) の上限。Dify の message_end は検索結果などのメタデータを含むため余裕を持たせる
+MAX_LINE_BYTES = 1024 * 1024
+
+
+def _iter_lines(response, chunk_size: int = 512, max_line_bytes: int = MAX_LINE_BYTES) -> Iterator[bytes]:
+    """レスポンスボディを行単位で返す (requests / FastHttp 両対応)
+
+    受信途中の行は1つの bytearray に追記し、max_line_bytes を超えた行は読み捨てる
+    (アイドル状態のストリームを多数保持しても、ユーザー毎の受信バッファは上限以内に収まる)。
+    """
+    raw = getattr(response, "_response", None)
+    if raw is not None and hasattr(raw, "readline"):
+        # FastHttpUser: geventhttpclient は read(n) が n バイト揃うまで待つため、行単位で読む
+        # (行のバッファは geventhttpclient 側にあるため、上限を超えた行は読み終えてから捨てる)
+        while True:
+            line = raw.readline(b"\n")
+            if not line:
+                return
+            if len(line) > max_line_bytes:
+                logging.warning(f"Dropped a {len(line)} byte stream line (limit {max_line_bytes})")
+                continue
+            yield line
+    else:
+        buffer = bytearray()
+        discarding = False
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            buffer += chunk
+            start = 0
+            while True:
+                end = buffer.find(b"\n", start)
+                if end < 0:
+                    break
+                if discarding:
+                    discarding = False
+                else:
+                    yield bytes(buffer[start:end])
+                start = end + 1
+            del buffer[:start]
+            if len(buffer) > max_line_bytes:
+                if not discarding:
+                    logging.warning(f"Dropped a stream line longer than {max_line_bytes} bytes")
+                buffer.clear()
+                discarding = True
+        if buffer and not discarding:
+            yield bytes(buffer)
+
+
+def parse_sse_line(line: bytes) -> Optional[dict]:
+    """SSE の data 行を dict に変換 (ping などそれ以外の行は None)"""
+    line = line.strip()
+    if not line.startswith(b"data:"):
+        return None
+    try:
+        return json.loads(line[5:])
+    except json.JSONDecodeError:
+        return None
+
+
+def iter_sse_events(response, chunk_size: int = 512) -> Iterator[dict]:
+    """SSE レスポンスのイベントを順に返す
+
+    トークンを運ぶイベントを受信する度に、locust の request イベントへ渡す値
+    (ttft: 最初のトークンまでの ms, tokens: トークン数, stream_time: 最後のトークンまでの ms) を更新する。
+    """
+    request_meta = getattr(response, "request_meta", None)
+    start_time = request_meta.get("start_time") if request_meta else None
+    tokens = 0
+    for line in _iter_lines(response, chunk_size):
+        event = parse_sse_line(line)
+        if event is None:
+            continue
+        if start_time and event.get("event") in TOKEN_EVENTS:
+            elapsed = (time.time() - start_time) * 1000
+            tokens += 1
+            if tokens == 1:
+                request_meta["ttft"] = elapsed
+            request_meta["tokens"] = tokens
+            request_meta["stream_time"] = elapsed
+        yield event
@@ -0,0 +1,193 @@
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.result_log import load_result_log
+
+# 相関 ID を探すフィールド・属性名 (小文字, "-" と "." は "_" とみなす)
+ID_KEYS = [
+    "request_id",
+    "x_request_id",
+    "http_x_request_id",
+    "http_request_header_x_request_id",
+    "correlation_id",
+]
+PHASE_KEYS = ["phase", "span", "operation", "name", "event", "task"]
+SERVICE_KEYS = ["service", "service_name", "component", "logger"]
+DURATION_KEYS = ["duration_ms", "elapsed_ms", "duration", "elapsed", "latency", "request_time"]
+
+# (フェーズ名, 開始時刻 (epoch 秒, 不明なら None), 所要時間 ms)
+Phase = Tuple[str, Optional[float], float]
+
+
+def _normalize(key: str) -> str:
+    return key.lower().replace("-", "_").replace(".", "_")
+
+
+def _find(record: dict, keys: List[str]):
+    normalized = {_normalize(key): value for key, value in record.items()}
+    for key in keys:
+        value = normalized.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _otlp_value(value: dict):
+    for kind in ("stringValue", "intValue", "doubleValue", "boolValue"):
+        if kind in value:
+            return value[kind]
+    if "arrayValue" in value:
+        values = [_otlp_value(item) for item in value["arrayValue"].get("values", [])]
+        return values[0] if values else None
+    return None
+
+
+def _otlp_attributes(attributes: list) -> dict:
+    return {item["key"]: _otlp_value(item.get("value", {})) for item in attributes or []}
+
+
+def parse_otlp(documents: Iterable[dict]) -> Dict[str, List[Phase]]:
+    """OpenTelemetry の OTLP JSON (collector の file exporter など) からトレース毎のスパンを取り出す"""
+    traces: Dict[str, List[Phase]] = {}
+    trace_ids: Dict[str, str] = {}
+    for document in documents:
+        for resource_spans in document.get("resourceSpans", []):
+            resource = _otlp_attributes(resource_spans.get("resource", {}).get("attributes"))
+            service = resource.get("service.name", "")
+            for scope_spans in resource_spans.get("scopeSpans", resource_spans.get("instrumentationLibrarySpans", [])):
+                for span in scope_spans.get("spans", []):
+                    start = int(span.get("startTimeUnixNano", 0))
+                    end = int(span.get("endTimeUnixNano", start))
+                    name = f"{service}:{span.get('name', '')}" if service else span.get("name", "")
+                    traces.setdefault(span["traceId"], []).append((name, start / 1e9, (end - start) / 1e6))
+                    request_id = _find(_otlp_attributes(span.get("attributes")), ID_KEYS)
+                    if request_id:
+                        trace_ids[span["traceId"]] = str(request_id)
+    return {trace_ids[trace_id]: spans for trace_id, spans in traces.items() if trace_id in trace_ids}
+
+
+def parse_jaeger(document: dict) -> Dict[str, List[Phase]]:
+    """Jaeger の JSON エクスポート ({"data": [trace, ...]}) からトレース毎のスパンを取り出す"""
+    result: Dict[str, List[Phase]] = {}
+    for trace in document.get("data", []):
+        processes = {key: value.get("serviceName", "") for key, value in trace.get("processes", {}).items()}
+        spans = []
+        request_id = None
+        for span in trace.get("spans", []):
+            service = processes.get(span.get("processID"), "")
+            name = f"{service}:{span.get('operationName', '')}" if service else span.get("operationName", "")
+            spans.append((name, span.get("startTime", 0) / 1e6, span.get("duration", 0) / 1000))
+            tags = {tag["key"]: tag.get("value") for tag in span.get("tags", [])}
+            request_id = request_id or _find(tags, ID_KEYS)
+        if request_id:
+            result[str(request_id)] = spans
+    return result
+
+
+def parse_json_lines(
+    lines: Iterable[dict],
+    id_field: Optional[str] = None,
+    phase_field: Optional[str] = None,
+    duration_field: Optional[str] = None,
+    duration_scale: float = 1.0,
+) -> Dict[str, List[Phase]]:
+    """1行1イベントの JSON ログ (nginx の JSON ログ、アプリケーションログなど) を相関 ID 毎にまとめる
+
+    duration_scale は所要時間を ms に変換する係数 (nginx の $request_time のような秒の場合は 1000)。
+    """
+    result: Dict[str, List[Phase]] = {}
+    for record in lines:
+        request_id = record.get(id_field) if id_field else _find(record, ID_KEYS)
+        duration = record.get(duration_field) if duration_field else _find(record, DURATION_KEYS)
+        if not request_id or duration in (None, "", "-"):
+            continue
+        phase = record.get(phase_field) if phase_field else _find(record, PHASE_KEYS)
+        service = _find(record, SERVICE_KEYS)
+        name = f"{service}:{phase}" if service and phase else str(service or phase or "server")
+        result.setdefault(str(request_id), []).append((name, None, float(duration) * duration_scale))
+    return result
+
+
+def load_server_phases(path: str, **options) -> Dict[str, List[Phase]]:
+    """サーバー側のログ・トレースを読み込み、相関 ID 毎のフェーズを返す (形式は内容から判定)"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        documents = [json.loads(text)]
+    except json.JSONDecodeError:
+        documents = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    first = documents[0] if documents else {}
+    if "resourceSpans" in first:
+        return parse_otlp(documents)
+    if isinstance(first, dict) and isinstance(first.get("data"), list) and len(documents) == 1:
+        return parse_jaeger(first)
+    if len(documents) == 1 and isinstance(first, list):
+        documents = first
+    return parse_json_lines(documents, **options)
+
+
+def join_requests(result_log_path: str, phases: Dict[str, List[Phase]], name_filter: str = "") -> List[dict]:
+    """結果ログのリクエストとサーバー側のフェーズを相関 ID で結合"""
+    log = load_result_log(result_log_path)
+    records = log.records
+    if "request_id" not in (records.dtype.names or ()):
+        raise ValueError(f"{result_log_path} was recorded without correlation IDs")
+    names = log.column("name")
+    joined = []
+    for index in np.flatnonzero(records["request_id"] != b""):
+        name = names[index]
+        if name_filter and name_filter not in name:
+            continue
+        request_id = records["request_id"][index].decode("ascii")
+        server = phases.get(request_id)
+        client_ms = float(records["response_time"][index])
+        row = {
+            "request_id": request_id,
+            "timestamp": float(records["timestamp"][index]),
+            "name": name,
+            "status": int(records["status"][index]),
+            "client_ms": client_ms,
+            "matched": server is not None,
+        }
+        if server:
+            # 同じフェーズ名は合計する。トレースは最も長いスパン (ルート) を、
+            # 開始時刻の無いログは各行が順に実行された区間とみなして合計をサーバー側の処理時間とする
+            totals: Dict[str, float] = {}
+            for phase, _, duration in server:
+                totals[phase] = totals.get(phase, 0.0) + duration
+            if all(start is not None for _, start, _ in server):
+                server_ms = max(duration for _, _, duration in server)
+            else:
+                server_ms = sum(duration for _, _, duration in server)
+            row.update(
+                server_ms=server_ms,
+                outside_ms=max(client_ms - server_ms, 0.0),
+                phases=dict(sorted(totals.items(), key=lambda item: -item[1])),
+            )
+        joined.append(row)
+    return joined
+
+
+def endpoint_breakdown(joined: List[dict], top_phases: int = 5) -> Dict[str, dict]:
+    """エンドポイント毎の結合率と、クライアント・サーバー・フェーズ毎の平均時間"""
+    result = {}
+    for name in sorted({row["name"] for row in joined}):
+        rows = [row for row in joined if row["name"] == name]
+        matched = [row for row in rows if row["matched"]]
+        phase_totals: Dict[str, float] = {}
+        for row in matched:
+            for phase, duration in row["phases"].items():
+                phase_totals[phase] = phase_totals.get(phase, 0.0) + duration
+        phases = sorted(phase_totals.items(), key=lambda item: -item[1])[:top_phases]
+        result[name] = {
+            "requests": len(rows),
+            "matched": len(matched),
+            "client_ms": float(np.mean([row["client_ms"] for row in rows])),
+            "server_ms": float(np.mean([row["server_ms"] for row in matched])) if matched else None,
+            "outside_ms": float(np.mean([row["outside_ms"] for row in matched])) if matched else None,
+            "phases": {phase: total / len(matched) for phase, total in phases},
+        }
+    return result
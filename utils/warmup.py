@@ -0,0 +1,162 @@
+import logging
+import os
+import statistics
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+import gevent
+from gevent.event import Event
+from locust.stats import RequestStats, StatsEntry, calculate_response_time_percentile, print_stats, save_stats_json
+
+WARMUP_MODES = ["off", "fixed", "auto"]
+
+
+def _coefficient_of_variation(values: List[float]) -> float:
+    mean = statistics.fmean(values)
+    if mean <= 0:
+        return float("inf")
+    return statistics.pstdev(values) / mean
+
+
+def copy_stats(stats: RequestStats) -> RequestStats:
+    """RequestStats の複製 (reset_all の前に退避する用途)"""
+    copied = RequestStats(use_response_times_cache=False)
+    for (name, method), entry in stats.entries.items():
+        copied.entries[(name, method)] = StatsEntry(copied, name, method)
+        copied.entries[(name, method)].extend(entry)
+    copied.total.extend(stats.total)
+    copied.errors = dict(stats.errors)
+    return copied
+
+
+class WarmupMonitor:
+    """ウォームアップ期間を統計から分離する
+
+    fixed: 全ユーザーの起動完了から指定秒数をウォームアップとする
+    auto: 全ユーザーの起動完了後、一定間隔毎の RPS と中央値レイテンシの変動係数が
+          連続して閾値を下回った時点で定常状態とみなす (max_seconds で打ち切り)
+
+    ウォームアップ終了時に environment.stats を warmup_stats に退避してリセットするため、
+    画面・CSV の集計値は定常状態のみとなる。Master / 単体実行のどちらでも動作する。
+    """
+
+    def __init__(
+        self,
+        mode: str = "auto",
+        seconds: float = 60,
+        window: float = 10,
+        windows: int = 3,
+        rps_cv: float = 0.1,
+        latency_cv: float = 0.2,
+        max_seconds: float = 600,
+    ):
+        if mode not in WARMUP_MODES:
+            raise ValueError(f"Unknown warm-up mode: {mode} (expected one of {WARMUP_MODES})")
+        self.mode = mode
+        self.seconds = seconds
+        self.window = window
+        self.windows = windows
+        self.rps_cv = rps_cv
+        self.latency_cv = latency_cv
+        self.max_seconds = max_seconds
+        self.listeners: List[Callable[[float], None]] = []  # ウォームアップ終了時刻 (epoch 秒) を受け取る
+        self.environment = None
+        self.warmup_stats: Optional[RequestStats] = None
+        self.warmup_end: Optional[float] = None
+        self.started_at: Optional[float] = None
+        self._spawned = Event()
+        self._greenlet = None
+
+    def attach(self, environment):
+        """locust のイベントにリスナーを登録"""
+        self.environment = environment
+        environment.events.test_start.add_listener(lambda **kwargs: self.start())
+        environment.events.spawning_complete.add_listener(lambda **kwargs: self._spawned.set())
+        environment.events.test_stop.add_listener(lambda **kwargs: self.stop())
+        return self
+
+    @property
+    def finished(self) -> bool:
+        return self.warmup_end is not None
+
+    def start(self):
+        if self.mode == "off":
+            return
+        self.stop()
+        self.warmup_stats = None
+        self.warmup_end = None
+        self.started_at = time.time()
+        self._spawned.clear()
+        self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill(block=False)
+            self._greenlet = None
+            if self.finished:
+                self._report()
+            else:
+                logging.warning("Test stopped during warm-up; stats include the warm-up period")
+
+    def _run(self):
+        self._spawned.wait()
+        if self.mode == "fixed":
+            gevent.sleep(self.seconds)
+            self._finish(f"fixed {self.seconds:.0f}s after spawning")
+            return
+
+        spawned_at = time.time()
+        total = self.environment.stats.total
+        previous_count = total.num_requests
+        previous_times = dict(total.response_times)
+        recent = deque(maxlen=self.windows)
+        while True:
+            gevent.sleep(self.window)
+            count = total.num_requests - previous_count
+            response_times = {
+                key: value - previous_times.get(key, 0)
+                for key, value in total.response_times.items()
+                if value > previous_times.get(key, 0)
+            }
+            previous_count = total.num_requests
+            previous_times = dict(total.response_times)
+
+            if count > 0:
+                median = calculate_response_time_percentile(response_times, count, 0.5)
+                recent.append((count / self.window, median))
+            else:
+                recent.clear()
+
+            if len(recent) == self.windows:
+                rps_cv = _coefficient_of_variation([rps for rps, _ in recent])
+                latency_cv = _coefficient_of_variation([median for _, median in recent])
+                if rps_cv <= self.rps_cv and latency_cv <= self.latency_cv:
+                    self._finish(f"steady state (RPS CV {rps_cv:.2f}, latency CV {latency_cv:.2f})")
+                    return
+            if time.time() - spawned_at >= self.max_seconds:
+                logging.warning(f"Steady state not reached within {self.max_seconds:.0f}s, ending warm-up anyway")
+                self._finish("timeout")
+                return
+
+    def _finish(self, reason: str):
+        stats = self.environment.stats
+        self.warmup_stats = copy_stats(stats)
+        stats.reset_all()
+        self.warmup_end = time.time()
+        logging.info(
+            f"Warm-up finished after {self.warmup_end - self.started_at:.0f}s ({reason}), "
+            f"{self.warmup_stats.num_requests} requests moved to warm-up stats"
+        )
+        for listener in self.listeners:
+            listener(self.warmup_end)
+
+    def _report(self):
+        """ウォームアップ期間の統計を出力 (CSV 指定時は <prefix>_warmup.json にも保存)"""
+        logging.info("Warm-up stats (excluded from the results):")
+        print_stats(self.warmup_stats, current=False)
+        options = getattr(self.environment, "parsed_options", None)
+        csv_prefix = getattr(options, "csv_prefix", None)
+        if csv_prefix:
+            os.makedirs(os.path.dirname(os.path.abspath(csv_prefix)), exist_ok=True)
+            save_stats_json(self.warmup_stats, f"{csv_prefix}_warmup")